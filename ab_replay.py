@@ -0,0 +1,335 @@
+"""
+This program replays a corpus of pages through two versions of readability
+and compares how fast they are and what they output.
+
+A version is either a directory holding a readability package, such as
+another checkout, or a git revision of this repository, whose readability
+package is exported into a temporary directory.  Each version runs in its
+own Python process, which imports only that version.  Both processes are
+sent exactly the same pages and the same MockUrlFetch data.  Pages are
+replayed one at a time, and the version that goes first alternates from one
+page to the next, so that neither always runs on a warmer machine.
+
+    $ python ab_replay.py HEAD~1 .
+    $ python ab_replay.py ../readability-old . --case nytimes-000 --repeat 5
+    $ python ab_replay.py HEAD~1 HEAD --jsonl pages.jsonl
+
+The corpus is the regression test data (see regression_test.py), or the
+test cases in the directory given by --data, unless --jsonl is given.  Each
+line of a JSONL dump is an object with the page's 'url' and 'html'.  It may
+also have a 'name', and 'pages', a map from URL to HTML of the pages, such
+as next pages, that fetching should return.
+
+For each page, the report gives both versions' median latency, the change
+from the first version to the second, and how their outputs differ by text
+(see regression_metrics.py).  It ends with each version's throughput and
+peak resident memory, and a summary of the pages whose output changed.
+"""
+from StringIO import StringIO
+from import_benchmark import median
+from regression_metrics import TextDiff
+from regression_test import (
+        TEST_DATA_PATH,
+        iter_readability_tests,
+        load_test_data
+        )
+import argparse
+import cPickle
+import json
+import os
+import os.path
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+
+DEFAULT_REPEAT = 3
+
+# Run in each version's process.  It reports where readability was imported
+# from, then answers each (url, html, base_path, url_map, repeat) task with
+# the times of its runs, the output of the last one, any error and the peak
+# resident memory so far, in kilobytes.  Tasks and answers are pickled over
+# stdin and stdout, so stdout is redirected to keep stray prints off the pipe.
+CHILD_CODE = '''
+import cPickle, logging, resource, sys, time
+sys.path.insert(0, sys.argv[1])
+stdin, stdout = sys.stdin, sys.stdout
+sys.stdout = sys.stderr
+logging.basicConfig()
+import readability
+from readability.urlfetch import MockUrlFetch
+# After the import, since older versions set the root logger to DEBUG.
+logging.getLogger().setLevel(logging.ERROR)
+def peak_rss():
+    # ru_maxrss would include the parent's memory from before the exec.
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except IOError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+cPickle.dump(readability.__file__, stdout, 2)
+stdout.flush()
+while True:
+    try:
+        url, html, base_path, url_map, repeat = cPickle.load(stdin)
+    except EOFError:
+        break
+    fetcher = MockUrlFetch(base_path, url_map)
+    times = []
+    output = error = None
+    for i in range(repeat):
+        start = time.time()
+        try:
+            doc = readability.Document(html, url = url, urlfetch = fetcher)
+            summary = doc.summary()
+            # Older versions return the HTML itself.
+            output = getattr(summary, 'html', summary)
+        except Exception as e:
+            error = '%s: %s' % (type(e).__name__, e)
+        times.append(time.time() - start)
+    cPickle.dump((times, output, error, peak_rss()), stdout, 2)
+    stdout.flush()
+'''
+
+class ReplayCase:
+
+    def __init__(self, name, url, html, base_path, url_map):
+        self.name = name
+        self.url = url
+        self.html = html
+        self.base_path = base_path
+        self.url_map = url_map
+
+class ReplayResult:
+
+    def __init__(self, times, output, error, peak_rss):
+        self.times = times
+        self.output = output
+        self.error = error
+        self.peak_rss = peak_rss
+
+    @property
+    def latency(self):
+        return median(self.times)
+
+def iter_test_data_cases(data_path, cases):
+    files = sorted(os.listdir(data_path))
+    for test in iter_readability_tests(data_path, files, cases):
+        test_data = load_test_data(test)
+        if test_data is None:
+            continue
+        yield ReplayCase(
+                test.name,
+                test.url,
+                test_data.orig_html,
+                os.path.abspath(os.path.join(data_path, test.name)),
+                test.url_map
+                )
+
+def iter_jsonl_cases(jsonl_path, cases, pages_path):
+    '''
+    Yields the pages of a JSONL dump, writing the pages that each one may
+    fetch into a directory under pages_path for MockUrlFetch to read.
+    '''
+    with open(jsonl_path, 'r') as f:
+        for i, line in enumerate(f):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            name = entry.get('name', '%d' % i)
+            if cases is not None and name not in cases:
+                continue
+            base_path = os.path.join(pages_path, '%d' % i)
+            os.mkdir(base_path)
+            url_map = {}
+            for j, (url, html) in enumerate(sorted(entry.get('pages', {}).items())):
+                rel_path = '%d.html' % j
+                with open(os.path.join(base_path, rel_path), 'wb') as page:
+                    page.write(html.encode('utf-8'))
+                url_map[url.encode('utf-8')] = rel_path
+            yield ReplayCase(
+                    name,
+                    entry['url'].encode('utf-8'),
+                    entry['html'].encode('utf-8'),
+                    base_path,
+                    url_map
+                    )
+
+def export_revision(revision, dir_path):
+    '''
+    Writes the readability package as of a git revision of this repository
+    into dir_path.
+    '''
+    here = os.path.dirname(os.path.abspath(__file__))
+    archive = subprocess.check_output(
+            ['git', 'archive', '--format=tar', revision, 'readability'],
+            cwd = here
+            )
+    tarfile.open(fileobj = StringIO(archive)).extractall(dir_path)
+
+def version_path(version, temp_path):
+    '''
+    Returns the directory to import version's readability package from.
+    '''
+    if os.path.isdir(os.path.join(version, 'readability')):
+        return os.path.abspath(version)
+    dir_path = tempfile.mkdtemp(dir = temp_path)
+    export_revision(version, dir_path)
+    return dir_path
+
+class Replayer:
+    '''
+    A process that extracts pages with one version of readability.
+    '''
+
+    def __init__(self, version, path):
+        self.version = version
+        env = dict(os.environ)
+        env.pop('PYTHONPATH', None)
+        self.process = subprocess.Popen(
+                [sys.executable, '-c', CHILD_CODE, path],
+                stdin = subprocess.PIPE,
+                stdout = subprocess.PIPE,
+                cwd = path,
+                env = env
+                )
+        self.module_path = cPickle.load(self.process.stdout)
+        self.results = []
+
+    def replay(self, case, repeat):
+        task = (case.url, case.html, case.base_path, case.url_map, repeat)
+        cPickle.dump(task, self.process.stdin, 2)
+        self.process.stdin.flush()
+        result = ReplayResult(*cPickle.load(self.process.stdout))
+        self.results.append(result)
+        return result
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+
+def output_change(a, b):
+    if a.error or b.error:
+        if a.error == b.error:
+            return 'both failed: %s' % a.error
+        return 'A: %s / B: %s' % (a.error or 'ok', b.error or 'ok')
+    if a.output == b.output:
+        return 'same'
+    diff = TextDiff(a.output, b.output)
+    if not diff.insertions and not diff.deletions:
+        return 'markup only'
+    return 'F1 %.3f, +%d -%d chars' % (
+            diff.score, diff.insertions, diff.deletions)
+
+def percent_change(a, b):
+    if not a:
+        return 0.0
+    return 100.0 * (b - a) / a
+
+def print_totals(label, replayer):
+    total = sum(sum(r.times) for r in replayer.results)
+    runs = sum(len(r.times) for r in replayer.results)
+    peak = max([r.peak_rss for r in replayer.results] or [0])
+    print('%s %s (%s)' % (label, replayer.version, replayer.module_path))
+    print('    %d runs in %.2f s, %.1f pages/s, peak RSS %.1f MB' % (
+        runs,
+        total,
+        runs / total if total else 0.0,
+        peak / 1024.0
+        ))
+    return total
+
+def replay(cases, version_a, version_b, repeat, temp_path):
+    a = Replayer(version_a, version_path(version_a, temp_path))
+    b = Replayer(version_b, version_path(version_b, temp_path))
+    changes = []
+    deltas = []
+    print('%24s %10s %10s %8s  %s' % ('page', 'A ms', 'B ms', 'change', 'output'))
+    try:
+        for i, case in enumerate(cases):
+            first, second = (a, b) if i % 2 == 0 else (b, a)
+            first.replay(case, repeat)
+            second.replay(case, repeat)
+            result_a, result_b = a.results[-1], b.results[-1]
+            delta = percent_change(result_a.latency, result_b.latency)
+            deltas.append(delta)
+            change = output_change(result_a, result_b)
+            if change != 'same':
+                changes.append((case.name, change))
+            print('%24s %10.1f %10.1f %+7.1f%%  %s' % (
+                case.name,
+                result_a.latency * 1000,
+                result_b.latency * 1000,
+                delta,
+                change
+                ))
+    finally:
+        a.close()
+        b.close()
+    if not deltas:
+        print('no pages replayed')
+        return
+    print('')
+    total_a = print_totals('A', a)
+    total_b = print_totals('B', b)
+    print('')
+    print('B vs A: total time %+.1f%%, median page %+.1f%%' % (
+        percent_change(total_a, total_b), median(deltas)))
+    print('output changed on %d of %d pages' % (len(changes), len(deltas)))
+    for name, change in changes:
+        print('%24s  %s' % (name, change))
+
+DESCRIPTION = 'Compare the speed and output of two versions of readability.'
+
+def main():
+    parser = argparse.ArgumentParser(description = DESCRIPTION)
+    parser.add_argument(
+            'version_a',
+            help = 'a directory holding a readability package, or a git '
+                'revision of this repository'
+            )
+    parser.add_argument(
+            'version_b',
+            help = 'the version to compare with version_a'
+            )
+    parser.add_argument(
+            '--data',
+            default = TEST_DATA_PATH,
+            help = 'replay the test cases in this directory '
+                '(default: %(default)s)'
+            )
+    parser.add_argument(
+            '--jsonl',
+            help = 'replay the pages of a JSONL dump instead of the '
+                'regression test data'
+            )
+    parser.add_argument(
+            '--case',
+            action = 'append',
+            help = 'a test case, or a named JSONL page, to replay'
+            )
+    parser.add_argument(
+            '--repeat',
+            type = int,
+            default = DEFAULT_REPEAT,
+            help = 'how many times to extract each page (default: %(default)s)'
+            )
+    args = parser.parse_args()
+    temp_path = tempfile.mkdtemp(prefix = 'ab-replay-')
+    try:
+        if args.jsonl:
+            pages_path = os.path.join(temp_path, 'pages')
+            os.mkdir(pages_path)
+            cases = iter_jsonl_cases(args.jsonl, args.case, pages_path)
+        else:
+            cases = iter_test_data_cases(args.data, args.case)
+        replay(cases, args.version_a, args.version_b, args.repeat, temp_path)
+    finally:
+        shutil.rmtree(temp_path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+This program measures how extraction scales across a pool of threads and a
+pool of processes.
+
+It runs over the pages of the regression test data, repeated as many times as
+asked, with 1, 2, 4, ... workers up to --workers.  Two workloads are timed:
+'parse' only parses and cleans each page (htmls.parse), and lxml parses
+without holding the GIL; 'summary' runs the whole extraction, which spends
+most of its time in Python code that holds it.  Comparing how threads and
+processes scale on each shows how much a deployment can gain from
+batch.extract_batch_threaded.
+
+    $ python batch_benchmark.py
+    $ python batch_benchmark.py --workers 8 --repeat 5 --workload parse
+"""
+from multiprocessing.pool import ThreadPool
+from readability.batch import extract_batch, extract_batch_threaded
+from readability.htmls import parse
+from regression_test import (
+        TEST_DATA_PATH,
+        iter_readability_tests,
+        load_test_data
+        )
+import argparse
+import multiprocessing
+import os
+import time
+
+WORKLOADS = ['parse', 'summary']
+
+def load_pages(repeat, data_path = TEST_DATA_PATH):
+    pages = []
+    names = os.listdir(data_path)
+    for test in iter_readability_tests(data_path, names, None):
+        test_data = load_test_data(test)
+        if test_data is not None:
+            pages.append((test.url, test_data.orig_html))
+    return pages * repeat
+
+def parse_page(page):
+    url, html = page
+    parse(html, url)
+
+def run_parse(pages, workers, use_threads):
+    if use_threads:
+        pool = ThreadPool(workers)
+    else:
+        pool = multiprocessing.Pool(workers)
+    try:
+        pool.map(parse_page, pages)
+    finally:
+        pool.close()
+        pool.join()
+
+def run_summary(pages, workers, use_threads):
+    if use_threads:
+        extract_batch_threaded(pages, threads = workers)
+    else:
+        extract_batch(pages, processes = workers)
+
+def time_run(run, pages, workers, use_threads):
+    start = time.time()
+    run(pages, workers, use_threads)
+    return time.time() - start
+
+def worker_counts(max_workers):
+    counts = []
+    count = 1
+    while count < max_workers:
+        counts.append(count)
+        count *= 2
+    counts.append(max_workers)
+    return counts
+
+def benchmark(workload, pages, max_workers):
+    run = run_parse if workload == 'parse' else run_summary
+    print('%s: %d pages' % (workload, len(pages)))
+    print('%8s %14s %8s %14s %8s' % (
+        'workers', 'threads pg/s', 'speedup', 'procs pg/s', 'speedup'))
+    base = {}
+    for workers in worker_counts(max_workers):
+        row = []
+        for use_threads in [True, False]:
+            elapsed = time_run(run, pages, workers, use_threads)
+            rate = len(pages) / elapsed
+            base.setdefault(use_threads, rate)
+            row.extend([rate, rate / base[use_threads]])
+        print('%8d %14.1f %7.2fx %14.1f %7.2fx' % tuple([workers] + row))
+
+DESCRIPTION = 'Measure how extraction scales across threads and processes.'
+
+def main():
+    parser = argparse.ArgumentParser(description = DESCRIPTION)
+    parser.add_argument(
+            '--workers',
+            type = int,
+            default = multiprocessing.cpu_count(),
+            help = 'the largest pool to try (default: the number of CPUs)'
+            )
+    parser.add_argument(
+            '--repeat',
+            type = int,
+            default = 3,
+            help = 'how many times to process each page (default: %(default)s)'
+            )
+    parser.add_argument(
+            '--data',
+            default = TEST_DATA_PATH,
+            help = 'the directory of test cases to load pages from '
+                '(default: %(default)s)'
+            )
+    parser.add_argument(
+            '--workload',
+            choices = WORKLOADS,
+            action = 'append',
+            help = 'a workload to time (default: all)'
+            )
+    args = parser.parse_args()
+    pages = load_pages(args.repeat, args.data)
+    for workload in args.workload or WORKLOADS:
+        benchmark(workload, pages, args.workers)
+
+if __name__ == '__main__':
+    main()
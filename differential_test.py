@@ -0,0 +1,431 @@
+"""
+This module checks that alternative extraction engines give exactly the same
+results as the reference implementation.
+
+An engine is a set of Document options that selects an alternative code
+path, such as 'scoring_engine': 'numpy' (see vectorized.py).  Every page of
+the regression test data is run through the reference implementation and
+through each engine, along with mutated variants of it:
+
+    shuffle_attributes  every element's attributes in a random order
+    inject_breaks       runs of <br> inserted in random elements and text
+    deepen_nesting      random elements wrapped in dozens of nested divs
+    drop_elements       random elements removed
+
+For each input, the engines must give the reference's candidate scores, to
+the bit, and its best candidate after the ruthless first pass, and the same
+summary confidence and HTML.  Each mismatching input is minimized: elements
+are removed, a level of the tree at a time, for as long as the engine still
+gives the same kind of mismatch.  The input and its minimized version are
+written to differential_test_output/, and the program exits with status 1.
+
+
+Running the test
+----------------
+
+To check every engine whose dependencies are installed:
+
+    $ python differential_test.py
+
+To check one engine on some test cases, with three variants of each
+mutation per page:
+
+    $ python differential_test.py --engine numpy --case nytimes-000 --variants 3
+
+The mutations are random, but seeded by the test case, the mutation and
+--seed, so a run can be repeated exactly.
+
+As the paragraph transforms and sanitize get optimized code paths of their
+own, add the options that select them to ENGINES.
+"""
+from lxml.html import builder as B
+from readability.htmls import parse
+from readability.limits import make_budget
+from readability.readability import (
+        Document,
+        get_rules,
+        get_scoring_func,
+        preprocess,
+        select_best_candidate
+        )
+from regression_test import TEST_DATA_PATH, iter_test_cases
+import argparse
+import copy
+import logging
+import lxml.html
+import os
+import os.path
+import random
+import sys
+
+# The options that select each alternative engine, and the modules they need.
+ENGINES = {
+        'numpy': ({'scoring_engine': 'numpy'}, ['numpy']),
+        }
+
+TEST_OUTPUT_PATH = 'differential_test_output'
+
+DEFAULT_VARIANTS = 1
+DEFAULT_MAX_TESTS = 400
+
+def available_engines():
+    engines = []
+    for name in sorted(ENGINES):
+        options, modules = ENGINES[name]
+        try:
+            for module in modules:
+                __import__(module)
+        except ImportError:
+            logging.info('skipping the %s engine: %s is not installed' % (
+                name, module))
+            continue
+        engines.append(name)
+    return engines
+
+def body_elements(doc):
+    '''
+    Returns the elements under the page's body, which are the ones that
+    mutations change.
+    '''
+    body = doc.find('body')
+    if body is None:
+        body = doc
+    return [e for e in body.iterdescendants() if isinstance(e.tag, basestring)]
+
+def shuffle_attributes(doc, rng):
+    for elem in doc.iter():
+        if not isinstance(elem.tag, basestring) or len(elem.attrib) < 2:
+            continue
+        items = elem.attrib.items()
+        rng.shuffle(items)
+        elem.attrib.clear()
+        for name, value in items:
+            elem.set(name, value)
+
+def inject_breaks(doc, rng):
+    elems = body_elements(doc)
+    for elem in rng.sample(elems, min(len(elems), 10)):
+        breaks = [B.BR() for i in range(rng.randint(2, 5))]
+        words = (elem.text or '').split(' ')
+        if len(words) > 1:
+            # Split the text, as double breaks between sentences do.
+            cut = rng.randint(1, len(words) - 1)
+            elem.text = ' '.join(words[:cut])
+            breaks[-1].tail = ' '.join(words[cut:])
+            position = 0
+        else:
+            position = rng.randint(0, len(elem))
+        for br in reversed(breaks):
+            br.tail = br.tail or '\n'
+            elem.insert(position, br)
+
+def deepen_nesting(doc, rng):
+    elems = body_elements(doc)
+    for elem in rng.sample(elems, min(len(elems), 3)):
+        parent = elem.getparent()
+        if parent is None:
+            continue
+        outer = inner = B.DIV()
+        for i in range(rng.randint(10, 40)):
+            div = B.DIV()
+            inner.append(div)
+            inner = div
+        outer.tail = elem.tail
+        elem.tail = None
+        parent.replace(elem, outer)
+        inner.append(elem)
+
+def drop_elements(doc, rng):
+    elems = body_elements(doc)
+    dropped = rng.sample(elems, len(elems) // 20)
+    # Drop descendants first, so that none is dropped with its ancestor.
+    for elem in reversed(sorted(dropped, key = elems.index)):
+        elem.drop_tree()
+
+MUTATIONS = [
+        ('shuffle_attributes', shuffle_attributes),
+        ('inject_breaks', inject_breaks),
+        ('deepen_nesting', deepen_nesting),
+        ('drop_elements', drop_elements)
+        ]
+
+def mutate(page, mutation, rng):
+    doc = lxml.html.document_fromstring(page)
+    mutation(doc, rng)
+    return lxml.html.tostring(doc)
+
+def candidate_trace(page, url, options):
+    '''
+    Runs the ruthless first pass over page, up to choosing the best
+    candidate.  Returns each candidate's score by its path in the tree, and
+    the path of the best candidate.
+    '''
+    options = Document(page, url = url, **options).options
+    budget = make_budget(options)
+    doc = parse(page, url)
+    preprocess(doc, get_rules(options), budget)
+    candidates = get_scoring_func(options)(doc, options, budget)
+    best = select_best_candidate(candidates)
+    tree = doc.getroottree()
+    scores = dict(
+            (tree.getpath(elem), candidate.content_score)
+            for elem, candidate in candidates.items()
+            )
+    return scores, best and tree.getpath(best.elem)
+
+def summary_result(page, url, options):
+    summary = Document(page, url = url, **options).summary()
+    return summary.confidence, summary.html
+
+def run_safely(func, page, url, options):
+    try:
+        return func(page, url, options)
+    except Exception as e:
+        return 'error: %s: %s' % (type(e).__name__, e)
+
+def describe_scores(expected, actual):
+    paths = sorted(set(expected) | set(actual))
+    differing = [p for p in paths if expected.get(p) != actual.get(p)]
+    path = differing[0]
+    return '%d of %d candidates differ, first %s: %r != %r' % (
+            len(differing),
+            len(paths),
+            path,
+            expected.get(path),
+            actual.get(path)
+            )
+
+class Mismatch:
+
+    def __init__(self, engine, kind, detail):
+        self.engine = engine
+        self.kind = kind
+        self.detail = detail
+
+def compare(page, url, engines):
+    '''
+    Returns the Mismatches between the reference implementation and each
+    engine in engines on page.
+    '''
+    expected_trace = run_safely(candidate_trace, page, url, {})
+    expected_summary = run_safely(summary_result, page, url, {})
+    mismatches = []
+    for engine in engines:
+        options = ENGINES[engine][0]
+        trace = run_safely(candidate_trace, page, url, options)
+        summary = run_safely(summary_result, page, url, options)
+        if isinstance(expected_trace, tuple) and isinstance(trace, tuple):
+            if expected_trace[0] != trace[0]:
+                detail = describe_scores(expected_trace[0], trace[0])
+                mismatches.append(Mismatch(engine, 'scores', detail))
+            if expected_trace[1] != trace[1]:
+                detail = '%s != %s' % (expected_trace[1], trace[1])
+                mismatches.append(Mismatch(engine, 'best candidate', detail))
+        elif expected_trace != trace:
+            detail = '%.60r != %.60r' % (expected_trace, trace)
+            mismatches.append(Mismatch(engine, 'scores', detail))
+        if expected_summary != summary:
+            results = [expected_summary, summary]
+            if not all(isinstance(r, tuple) for r in results):
+                # One of them failed.
+                detail = '%.60r != %.60r' % tuple(results)
+            elif expected_summary[0] != summary[0]:
+                detail = 'confidence %r != %r' % (
+                        expected_summary[0], summary[0])
+            else:
+                detail = 'HTML differs'
+            mismatches.append(Mismatch(engine, 'summary', detail))
+    return mismatches
+
+def remove_elements(doc, indexes):
+    '''
+    Returns a copy of doc without the elements at indexes in doc.iter().
+    '''
+    doc = copy.deepcopy(doc)
+    elems = list(doc.iter())
+    for i in sorted(indexes, reverse = True):
+        if elems[i].getparent() is not None:
+            elems[i].drop_tree()
+    return doc
+
+def element_levels(doc):
+    '''
+    Returns the indexes in doc.iter() of the elements, and comments, at
+    each depth below the root.
+    '''
+    levels = []
+    depths = {}
+    for i, elem in enumerate(doc.iter()):
+        parent = elem.getparent()
+        depth = 0 if parent is None else depths[parent] + 1
+        depths[elem] = depth
+        if depth == 0:
+            continue
+        while len(levels) < depth:
+            levels.append([])
+        levels[depth - 1].append(i)
+    return levels
+
+def minimize(page, fails, max_tests = DEFAULT_MAX_TESTS):
+    '''
+    Returns a page, made from page by removing elements, on which fails is
+    still true.  The tree is reduced a level at a time, from the top: the
+    elements at a level are removed in chunks, which are halved until single
+    elements are tried.  At most max_tests pages are tried.
+    '''
+    doc = lxml.html.document_fromstring(page)
+    tests = 0
+    depth = 0
+    while tests < max_tests:
+        levels = element_levels(doc)
+        if depth >= len(levels):
+            break
+        indexes = levels[depth]
+        size = max(1, len(indexes) // 2)
+        while indexes and tests < max_tests:
+            removed = False
+            for start in range(0, len(indexes), size):
+                if tests >= max_tests:
+                    break
+                chunk = indexes[start:start + size]
+                candidate = remove_elements(doc, chunk)
+                tests += 1
+                if fails(lxml.html.tostring(candidate)):
+                    doc = candidate
+                    removed = True
+                    break
+            if removed:
+                # Indexes have shifted; start the level again.
+                indexes = element_levels(doc)[depth:depth + 1]
+                indexes = indexes[0] if indexes else []
+                size = max(1, min(size, len(indexes) // 2))
+            elif size == 1:
+                break
+            else:
+                size = max(1, size // 2)
+        depth += 1
+    logging.debug('minimized in %d tests' % tests)
+    return lxml.html.tostring(doc)
+
+def mismatch_test(url, engine, kind):
+    def fails(page):
+        return any(
+                m.kind == kind
+                for m in compare(page, url, [engine])
+                )
+    return fails
+
+def write_case(name, page, minimized):
+    if not os.path.isdir(TEST_OUTPUT_PATH):
+        os.makedirs(TEST_OUTPUT_PATH)
+    paths = []
+    for suffix, html in [('.html', page), ('.min.html', minimized)]:
+        path = os.path.join(TEST_OUTPUT_PATH, name + suffix)
+        with open(path, 'wb') as f:
+            f.write(html)
+        paths.append(path)
+    return paths
+
+def iter_inputs(test, page, variants, seed):
+    yield test.name, page
+    for mutation_name, mutation in MUTATIONS:
+        for i in range(variants):
+            name = '%s.%s.%d' % (test.name, mutation_name, i)
+            rng = random.Random('%s:%s' % (name, seed))
+            yield name, mutate(page, mutation, rng)
+
+def run_differential_tests(engines, cases, data_path = TEST_DATA_PATH,
+        variants = DEFAULT_VARIANTS, seed = 0, max_tests = DEFAULT_MAX_TESTS):
+    '''
+    Compares engines with the reference implementation on the test cases
+    and their variants.  Returns the number of mismatching inputs.
+    '''
+    failures = 0
+    for (test, test_data, fetcher) in iter_test_cases(cases, data_path):
+        if test_data is None:
+            continue
+        for name, page in iter_inputs(test, test_data.orig_html, variants, seed):
+            mismatches = compare(page, test.url, engines)
+            if not mismatches:
+                print('%40s: ok' % name)
+                continue
+            failures += 1
+            for m in mismatches:
+                print('%40s: %s %s mismatch: %s' % (
+                    name, m.engine, m.kind, m.detail))
+            first = mismatches[0]
+            fails = mismatch_test(test.url, first.engine, first.kind)
+            minimized = minimize(page, fails, max_tests)
+            paths = write_case(name, page, minimized)
+            print('%40s  %d bytes minimized to %d: %s' % (
+                '', len(page), len(minimized), paths[1]))
+    return failures
+
+DESCRIPTION = 'Check that alternative engines match the reference extraction.'
+
+def main():
+    parser = argparse.ArgumentParser(description = DESCRIPTION)
+    parser.add_argument(
+            '--debug',
+            action = 'store_const',
+            const = True,
+            default = False,
+            help = 'enable debug logging'
+            )
+    parser.add_argument(
+            '--engine',
+            action = 'append',
+            choices = sorted(ENGINES),
+            help = 'an engine to check (default: all that are installed)'
+            )
+    parser.add_argument(
+            '--case',
+            action = 'append',
+            help = 'a test case to run'
+            )
+    parser.add_argument(
+            '--data',
+            default = TEST_DATA_PATH,
+            help = 'run the test cases in this directory (default: %(default)s)'
+            )
+    parser.add_argument(
+            '--variants',
+            type = int,
+            default = DEFAULT_VARIANTS,
+            help = 'the variants of each page to make with each mutation '
+                '(default: %(default)s)'
+            )
+    parser.add_argument(
+            '--seed',
+            type = int,
+            default = 0,
+            help = 'seeds the mutations (default: %(default)s)'
+            )
+    parser.add_argument(
+            '--max-tests',
+            type = int,
+            default = DEFAULT_MAX_TESTS,
+            help = 'the most pages to try when minimizing an input '
+                '(default: %(default)s)'
+            )
+    args = parser.parse_args()
+    level = logging.DEBUG if args.debug else logging.WARNING
+    logging.basicConfig(level = level)
+    engines = args.engine or available_engines()
+    if not engines:
+        print('no engines to check')
+        return
+    failures = run_differential_tests(
+            engines,
+            args.case,
+            args.data,
+            args.variants,
+            args.seed,
+            args.max_tests
+            )
+    if failures:
+        print('%d inputs mismatched' % failures)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
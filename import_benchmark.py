@@ -0,0 +1,97 @@
+"""
+This program measures how long a fresh process takes to import readability
+and to extract its first article.
+
+Short-lived jobs pay both costs on every run, so each sample is taken in a
+new Python process: the time to import the readability package, and then the
+time for the first Document(page).summary() call, which includes anything
+that is only loaded or compiled on first use.
+
+    $ python import_benchmark.py
+    $ python import_benchmark.py --runs 20 --page test_data/basic-multi-page.html
+
+Pass --modules to also list the modules that importing readability loads.
+"""
+import argparse
+import json
+import os.path
+import subprocess
+import sys
+
+DEFAULT_PAGE = os.path.join('test_data', 'nytimes-next-page.html')
+DEFAULT_RUNS = 10
+
+# Run in each child process.  The page is read before the clock starts, so
+# only the import and the first extraction are timed.
+CHILD_CODE = '''
+import json, sys, time
+with open(sys.argv[1], 'rb') as f:
+    page = f.read()
+start = time.time()
+import readability
+imported = time.time()
+modules = sorted(name for name, m in sys.modules.items() if m is not None)
+readability.Document(page).summary()
+done = time.time()
+print(json.dumps({
+        'import': imported - start,
+        'first_call': done - imported,
+        'modules': modules
+        }))
+'''
+
+def run_child(page_path):
+    here = os.path.dirname(os.path.abspath(__file__))
+    output = subprocess.check_output(
+            [sys.executable, '-c', CHILD_CODE, page_path],
+            cwd = here
+            )
+    return json.loads(output.splitlines()[-1])
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+def print_times(name, values):
+    print('%-12s min %7.1f ms   median %7.1f ms   max %7.1f ms' % (
+        name,
+        min(values) * 1000,
+        median(values) * 1000,
+        max(values) * 1000
+        ))
+
+DESCRIPTION = 'Measure readability import time and first-call latency.'
+
+def main():
+    parser = argparse.ArgumentParser(description = DESCRIPTION)
+    parser.add_argument(
+            '--page',
+            default = DEFAULT_PAGE,
+            help = 'the page to extract (default: %(default)s)'
+            )
+    parser.add_argument(
+            '--runs',
+            type = int,
+            default = DEFAULT_RUNS,
+            help = 'the number of processes to sample (default: %(default)s)'
+            )
+    parser.add_argument(
+            '--modules',
+            action = 'store_true',
+            help = 'list the modules loaded by the import'
+            )
+    args = parser.parse_args()
+    page_path = os.path.abspath(args.page)
+    samples = [run_child(page_path) for i in range(args.runs)]
+    print_times('import', [s['import'] for s in samples])
+    print_times('first call', [s['first_call'] for s in samples])
+    print('%d modules loaded' % len(samples[0]['modules']))
+    if args.modules:
+        for name in samples[0]['modules']:
+            print(name)
+
+if __name__ == '__main__':
+    main()
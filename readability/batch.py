@@ -0,0 +1,142 @@
+"""
+This module extracts articles from many pages in a pool of worker processes.
+
+Sending each page's bytes to a worker through a pipe means pickling and
+copying all of them.  Instead, pages are handed over as PageRefs: the path,
+offset and length of the page within a file.  Each worker maps the file into
+memory once and parses the page straight from the mapping, so page bodies
+never pass through the pipe.  Pages given as strings are first written to a
+temporary spill file; pages already stored in a file can be passed as
+PageRefs directly.
+
+    summaries = extract_batch([(url, html), ...], processes = 4)
+
+Where a pool of processes takes too much memory, extract_batch_threaded
+extracts in a pool of threads instead.  lxml releases the GIL while it parses
+and serializes, and each thread has its own parser, so those steps run in
+parallel; scoring and cleaning the tree are Python code and hold the GIL.
+How far a workload scales therefore depends on how much of its time goes to
+parsing.  batch_benchmark.py measures both pools on the regression pages.
+"""
+
+from functools import partial
+from multiprocessing.pool import ThreadPool
+from readability import Document
+import logging
+import mmap
+import multiprocessing
+import os
+import tempfile
+import threading
+
+class PageRef(object):
+    '''
+    Refers to length bytes at offset in the file at path.
+    '''
+
+    def __init__(self, path, offset, length):
+        self.path = path
+        self.offset = offset
+        self.length = length
+
+class SpillFile(object):
+    '''
+    A temporary file that pages are appended to, to be read back by
+    workers as PageRefs.
+    '''
+
+    def __init__(self, dir = None):
+        fd, self.path = tempfile.mkstemp(prefix = 'readability-', dir = dir)
+        self.file = os.fdopen(fd, 'wb')
+        self.size = 0
+
+    def add(self, page):
+        if isinstance(page, unicode):
+            page = page.encode('utf-8')
+        self.file.write(page)
+        ref = PageRef(self.path, self.size, len(page))
+        self.size += len(page)
+        return ref
+
+    def close(self):
+        self.file.close()
+
+    def remove(self):
+        self.file.close()
+        os.remove(self.path)
+
+# The files mapped by this worker process, by path.
+_maps = {}
+_maps_lock = threading.Lock()
+
+def page_view(ref, maps = _maps):
+    '''
+    Returns a buffer over the page that ref refers to, without copying it.
+    The file is mapped once and kept in maps.
+    '''
+    if not ref.length:
+        # Empty files can't be mapped.
+        return ''
+    with _maps_lock:
+        m = maps.get(ref.path)
+        if m is None:
+            with open(ref.path, 'rb') as f:
+                m = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+            maps[ref.path] = m
+    return buffer(m, ref.offset, ref.length)
+
+def extract_page(task, maps = _maps):
+    url, page, output, options = task
+    try:
+        if isinstance(page, PageRef):
+            page = page_view(page, maps)
+        return Document(page, url = url, **options).summary(output)
+    except Exception:
+        # One bad page shouldn't stop the whole batch.
+        logging.exception('could not extract %s' % url)
+        return None
+
+def extract_batch(pages, processes = None, output = 'html', spill_dir = None,
+        chunksize = 1, **options):
+    '''
+    Returns a list with the Summary of each (url, page) pair in pages, in
+    order, or None where extraction failed.  A page may be a string
+    or a PageRef.  The other options are passed to each Document.
+    '''
+    spill = None
+    tasks = []
+    for url, page in pages:
+        if not isinstance(page, PageRef):
+            if spill is None:
+                spill = SpillFile(spill_dir)
+            page = spill.add(page)
+        tasks.append((url, page, output, options))
+    if spill is not None:
+        spill.close()
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(extract_page, tasks, chunksize)
+    finally:
+        pool.close()
+        pool.join()
+        if spill is not None:
+            spill.remove()
+
+def extract_batch_threaded(pages, threads = None, output = 'html',
+        chunksize = 1, **options):
+    '''
+    Like extract_batch, but extracts in a pool of threads, which defaults to
+    one per CPU.  Pages given as strings are used in place, since threads
+    share memory with the caller.  The files of any PageRefs are unmapped
+    once the batch is done.
+    '''
+    tasks = [(url, page, output, options) for url, page in pages]
+    maps = {}
+    pool = ThreadPool(threads)
+    try:
+        return pool.map(partial(extract_page, maps = maps), tasks, chunksize)
+    finally:
+        pool.close()
+        pool.join()
+        for m in maps.values():
+            m.close()
@@ -0,0 +1,90 @@
+from batch import *
+from lxml.html import builder as B
+from lxml.html import tostring
+from readability import Document
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+PARAGRAPH = ('Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed '
+        'do eiusmod tempor incididunt ut labore et dolore magna aliqua. ')
+
+def make_page(heading):
+    return tostring(B.HTML(B.BODY(
+        B.DIV(
+            B.H2(heading),
+            B.P(heading + ', ' + PARAGRAPH * 3),
+            B.P(PARAGRAPH * 4),
+            {'id': 'article'}
+            )
+        )))
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_strings(self):
+        pages = [
+                ('http://example.com/%d' % i, make_page('page %d' % i))
+                for i in range(4)
+                ]
+        summaries = extract_batch(pages, processes = 2, spill_dir = self.dir)
+        self.assertEqual(
+                [Document(page, url = url).summary().html for url, page in pages],
+                [s.html for s in summaries]
+                )
+        # The spill file is removed afterwards.
+        self.assertEqual([], os.listdir(self.dir))
+
+    def test_page_refs(self):
+        page = make_page('first')
+        path = os.path.join(self.dir, 'pages')
+        with open(path, 'wb') as f:
+            f.write('junk' + page)
+        ref = PageRef(path, 4, len(page))
+        summaries = extract_batch(
+                [('http://example.com/', ref), ('http://example.com/', '')],
+                processes = 1,
+                output = 'text'
+                )
+        self.assertEqual(Document(page).summary('text').text, summaries[0].text)
+        self.assertEqual(None, summaries[1])
+
+    def test_threaded(self):
+        mapped = make_page('mapped')
+        path = os.path.join(self.dir, 'pages')
+        with open(path, 'wb') as f:
+            f.write(mapped)
+        pages = [
+                ('http://example.com/%d' % i, make_page('page %d' % i))
+                for i in range(6)
+                ]
+        pages.append(('http://example.com/ref', PageRef(path, 0, len(mapped))))
+        pages.append(('http://example.com/empty', ''))
+        summaries = extract_batch_threaded(pages, threads = 3)
+        expected = [
+                Document(page, url = url).summary().html
+                for url, page in pages[:-2]
+                ]
+        expected.append(
+                Document(mapped, url = 'http://example.com/ref').summary().html)
+        self.assertEqual(expected, [s.html for s in summaries[:-1]])
+        self.assertEqual(None, summaries[-1])
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--debug':
+        del sys.argv[1]
+        logging.basicConfig(level = logging.DEBUG)
+    else:
+        logging.basicConfig(level = logging.INFO)
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+"""
+This module saves the pages whose extraction was slow, or took a lot of
+memory, so that they can be reproduced offline.
+
+Capturing is enabled by the 'capture_dir' option.  A call to summary() is
+captured when it takes more than 'capture_time' seconds, or grows the
+process's resident memory by more than 'capture_rss' bytes.  Without either
+threshold, every call is captured.
+
+Each capture is written as a regression test case (see regression_test.py):
+a spec, name.yaml, and a directory, name/, that holds the raw page and, as
+the benchmark, the HTML that was extracted from it.  A page extracted as
+text or Markdown is extracted again as HTML for the benchmark.  Besides the
+usual fields, the spec records the options, output, time, memory growth and
+stage timings (see limits.Budget) of the extraction.  Extractions that raise
+are captured too, as expected failures: the spec's 'expected_error' holds
+the error, which regression_test.py checks for, and the benchmark is empty.
+The capture directory can be run as it is, or its cases moved into
+regression_test_data/ to make them permanent:
+
+    $ python regression_test.py --data captures --no-report
+    $ python ab_replay.py HEAD~1 . --data captures
+
+Captures are named after the page's host and a digest of the page, so a
+page that is captured again replaces its earlier capture.  The spec is
+written as JSON, which YAML parsers read too, so that this package doesn't
+need PyYAML.  It is written last, so that a half-written capture is never
+loaded.
+"""
+
+from templates import url_host
+import errno
+import hashlib
+import json
+import logging
+import os
+import os.path
+import resource
+import time
+
+PAGE_PATH = 'page.html'
+# These match the names that regression_test.py looks for.
+READABLE_SUFFIX = '.rdbl'
+YAML_EXTENSION = '.yaml'
+
+# The types of the options that are written to the spec.
+OPTION_TYPES = (basestring, bool, int, long, float)
+
+def current_rss():
+    '''
+    Returns the resident memory of this process in bytes.
+    '''
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except (IOError, IndexError, ValueError):
+        # Not Linux.  The peak is the closest measure available; macOS
+        # reports it in bytes.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def capture_name(url, page):
+    host = url_host(url) or 'page'
+    return '%s-%s' % (host, hashlib.sha1(page).hexdigest()[:12])
+
+def capture_options(options):
+    return dict(
+            (k, v) for k, v in options.items()
+            if isinstance(v, OPTION_TYPES) and not k.startswith('capture_')
+            )
+
+def milliseconds(seconds):
+    # Rounded so that YAML reads every value back as a float: it takes
+    # exponents like 1e-05 for strings.
+    return round(seconds * 1000, 3)
+
+def encode(html):
+    if isinstance(html, unicode):
+        return html.encode('utf-8')
+    return html
+
+def benchmark_html(html):
+    '''
+    Returns html in ASCII, with character references for anything else, as
+    the benchmarks in regression_test_data/ are: the markup declares no
+    encoding for them to be read back in.
+    '''
+    if html is None:
+        return ''
+    if isinstance(html, str):
+        html = html.decode('utf-8')
+    return html.encode('ascii', 'xmlcharrefreplace')
+
+def describe_error(error):
+    '''
+    Returns error as it is recorded in a spec's 'expected_error'.
+    '''
+    return '%s: %s' % (type(error).__name__, error)
+
+def write_file(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def write_capture(capture_dir, name, spec, page, benchmark):
+    import tempfile
+    base_path = os.path.join(capture_dir, name)
+    try:
+        os.makedirs(base_path)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    write_file(os.path.join(base_path, PAGE_PATH), page)
+    write_file(os.path.join(base_path, PAGE_PATH + READABLE_SUFFIX), benchmark)
+    fd, temp_path = tempfile.mkstemp(prefix = '.' + name, dir = capture_dir)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(spec, f, indent = 2, sort_keys = True)
+    os.rename(temp_path, os.path.join(capture_dir, name + YAML_EXTENSION))
+
+class CaptureProbe(object):
+    '''
+    Measures one extraction, and captures its page if it passes a threshold.
+    '''
+
+    def __init__(self, options):
+        self.options = options
+        self.start = time.time()
+        self.start_rss = current_rss()
+
+    def exceeded(self, elapsed, rss_growth):
+        time_limit = self.options['capture_time']
+        rss_limit = self.options['capture_rss']
+        if time_limit is None and rss_limit is None:
+            return True
+        return ((time_limit is not None and elapsed > time_limit) or
+                (rss_limit is not None and rss_growth > rss_limit))
+
+    def finish(self, input, output, summary, stages, error = None,
+            extract_html = None):
+        '''
+        Captures input if its extraction passed a threshold.  summary is
+        None if the extraction raised error.  extract_html is called for the
+        article's HTML if output isn't 'html'.  Returns the capture's name,
+        or None if it wasn't captured.
+        '''
+        elapsed = time.time() - self.start
+        rss_growth = current_rss() - self.start_rss
+        if not self.exceeded(elapsed, rss_growth):
+            return None
+        if input is None:
+            # A Document from a snapshot: the raw page is gone.
+            logging.debug('not capturing a snapshot')
+            return None
+        page = encode(input)
+        url = self.options['url']
+        name = capture_name(url, page)
+        if url is None:
+            url = 'http://capture.invalid/%s' % name
+        if summary is None:
+            notes = 'The extraction failed when the page was captured.'
+            truncated = False
+            html = None
+            error = describe_error(error)
+        else:
+            notes = ('The benchmark is the HTML extracted when the page was '
+                    'captured.')
+            truncated = summary.truncated
+            html = summary.html
+        spec = {
+                'url': url,
+                'test_description': 'captured page: %.0f ms, %d KB' % (
+                    elapsed * 1000, rss_growth // 1024),
+                'notes': notes,
+                'url_map': {url: PAGE_PATH},
+                'expected_error': error,
+                'capture': {
+                    'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                    'elapsed_ms': milliseconds(elapsed),
+                    'rss_growth': rss_growth,
+                    'output': output,
+                    'truncated': truncated,
+                    'options': capture_options(self.options),
+                    'stages_ms': dict(
+                        (stage, milliseconds(seconds))
+                        for stage, seconds in stages.items()
+                        )
+                    }
+                }
+        try:
+            if summary is not None and output != 'html':
+                html = extract_html()
+            write_capture(
+                    self.options['capture_dir'],
+                    name,
+                    spec,
+                    page,
+                    benchmark_html(html)
+                    )
+        except StandardError:
+            # A failed capture mustn't fail the extraction.
+            logging.exception('could not capture %s' % url)
+            return None
+        logging.info('captured %s as %s' % (url, name))
+        return name
+
+def start_capture(options):
+    '''
+    Returns a CaptureProbe for an extraction with options, or None if they
+    don't enable capturing.
+    '''
+    if options['capture_dir'] is None:
+        return None
+    return CaptureProbe(options)
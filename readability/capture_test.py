@@ -0,0 +1,132 @@
+from capture import *
+from lxml.etree import ParserError
+from lxml.html import builder as B
+from lxml.html import tostring
+from readability import Document
+from snapshot import make_snapshot
+import json
+import logging
+import os
+import os.path
+import shutil
+import sys
+import tempfile
+import unittest
+
+PARAGRAPH = ('Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed '
+        'do eiusmod tempor incididunt ut labore et dolore magna aliqua. ')
+
+PAGE = tostring(B.HTML(
+    B.HEAD(B.TITLE('Capture test page')),
+    B.BODY(
+        B.DIV(B.A('home', href = 'home.html'), {'id': 'nav'}),
+        B.DIV(B.P(PARAGRAPH * 3), B.P(PARAGRAPH * 2), {'id': 'article'})
+        )
+    ))
+
+URL = 'http://example.com/a/story'
+
+class TestCapture(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _summary(self, input, **options):
+        doc = Document(input, url = URL, capture_dir = self.dir, **options)
+        return doc.summary()
+
+    def test_capture(self):
+        summary = self._summary(PAGE, capture_time = 0, min_text_length = 30)
+        name = capture_name(URL, PAGE)
+        self.assertEqual(
+                sorted([name, name + YAML_EXTENSION]),
+                sorted(os.listdir(self.dir))
+                )
+        with open(os.path.join(self.dir, name + YAML_EXTENSION)) as f:
+            spec = json.load(f)
+        self.assertEqual(URL, spec['url'])
+        self.assertEqual({URL: PAGE_PATH}, spec['url_map'])
+        self.assertEqual(None, spec['expected_error'])
+        capture = spec['capture']
+        self.assertEqual('html', capture['output'])
+        self.assertEqual(
+                {'url': URL, 'min_text_length': 30, 'retry_length': 250},
+                capture['options']
+                )
+        for stage in ['parse', 'preprocess', 'score', 'sanitize', 'serialize']:
+            self.assertTrue(stage in capture['stages_ms'])
+        base_path = os.path.join(self.dir, name)
+        with open(os.path.join(base_path, PAGE_PATH), 'rb') as f:
+            self.assertEqual(PAGE, f.read())
+        with open(os.path.join(base_path, PAGE_PATH + READABLE_SUFFIX), 'rb') as f:
+            self.assertEqual(summary.html, f.read())
+
+    def test_text_output(self):
+        expected = Document(PAGE, url = URL, min_text_length = 30).summary()
+        doc = Document(PAGE, url = URL, capture_dir = self.dir,
+                min_text_length = 30)
+        summary = doc.summary('text')
+        self.assertEqual(None, summary.html)
+        name = capture_name(URL, PAGE)
+        with open(os.path.join(self.dir, name + YAML_EXTENSION)) as f:
+            self.assertEqual('text', json.load(f)['capture']['output'])
+        path = os.path.join(self.dir, name, PAGE_PATH + READABLE_SUFFIX)
+        with open(path, 'rb') as f:
+            self.assertEqual(expected.html, f.read())
+
+    def test_below_thresholds(self):
+        self._summary(PAGE, capture_time = 60, capture_rss = 1 << 30)
+        self.assertEqual([], os.listdir(self.dir))
+
+    def test_without_thresholds(self):
+        self._summary(PAGE)
+        self.assertEqual(2, len(os.listdir(self.dir)))
+
+    def test_failed_extraction(self):
+        # An empty page can't be parsed.
+        page = ' \n'
+        self.assertRaises(
+                ParserError,
+                self._summary,
+                page,
+                capture_time = 0
+                )
+        name = capture_name(URL, page)
+        with open(os.path.join(self.dir, name + YAML_EXTENSION)) as f:
+            spec = json.load(f)
+        self.assertEqual('ParserError: Document is empty',
+                spec['expected_error'])
+        self.assertEqual(
+                'The extraction failed when the page was captured.',
+                spec['notes']
+                )
+        base_path = os.path.join(self.dir, name)
+        with open(os.path.join(base_path, PAGE_PATH), 'rb') as f:
+            self.assertEqual(page, f.read())
+        with open(os.path.join(base_path, PAGE_PATH + READABLE_SUFFIX), 'rb') as f:
+            self.assertEqual('', f.read())
+
+    def test_snapshot(self):
+        doc = Document.from_snapshot(
+                make_snapshot(PAGE, URL),
+                capture_dir = self.dir
+                )
+        doc.summary()
+        self.assertEqual([], os.listdir(self.dir))
+
+    def test_disabled(self):
+        self.assertEqual(None, start_capture(Document(PAGE).options))
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--debug':
+        del sys.argv[1]
+        logging.basicConfig(level = logging.DEBUG)
+    else:
+        logging.basicConfig(level = logging.INFO)
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
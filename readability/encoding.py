@@ -1,7 +1,21 @@
 import re
-import chardet
+
+def page_buffer(page):
+    '''
+    Returns page in a form that re and unicode() read without copying it.
+    Strings and buffer objects, such as buffer() slices and mmaps, are
+    returned as they are.  Python 2 memoryviews have no such form, so they
+    are copied into a string.
+    '''
+    if isinstance(page, memoryview):
+        return page.tobytes()
+    return page
 
 def get_encoding(page):
+    '''
+    Returns the encoding of page, which may be a string or a buffer object.
+    '''
+    page = page_buffer(page)
     text = re.sub('</?[^>]*>\s*', ' ', page)
     if not text.strip() or len(text) < 10:
         return 'ascii'
@@ -15,6 +29,8 @@ def get_encoding(page):
     except UnicodeDecodeError:
         #import traceback;traceback.print_exc()
         pass
+    # chardet is slow to import, and most pages never get this far.
+    import chardet
     res = chardet.detect(text)
     enc = res['encoding']
     #print '->', enc, "%.2f" % res['confidence']
@@ -1,19 +1,52 @@
 from cleaners import normalize_spaces, clean_attributes, html_cleaner
-from encoding import get_encoding
+from encoding import get_encoding, page_buffer
+from lxml import etree
 from lxml.html import tostring
 import logging
 import lxml.html
 import re
-import unittest
+import threading
+import urlparse
 
-logging.getLogger().setLevel(logging.DEBUG)
+class ThreadParsers(threading.local):
+    '''
+    The parsers used by the current thread.  lxml lets only one thread at a
+    time parse with a given parser, so sharing one would serialize parsing
+    across threads even though lxml releases the GIL while it parses.
+    '''
 
-utf8_parser = lxml.html.HTMLParser(encoding='utf-8')
+    def __init__(self):
+        self.utf8 = lxml.html.HTMLParser(encoding='utf-8')
+        # Configured like lxml.html's own default parser.
+        self.html = lxml.html.HTMLParser()
+
+_parsers = ThreadParsers()
+
+def utf8_parser():
+    '''
+    Returns the current thread's parser for UTF-8 encoded pages.
+    '''
+    return _parsers.utf8
+
+def html_parser():
+    '''
+    Returns the current thread's parser for HTML in unicode strings, to use
+    instead of lxml.html's default one, which all threads share.
+    '''
+    return _parsers.html
 
 def build_doc(page):
+    '''
+    Parses page, which may be a string or a buffer object such as a slice
+    of an mmap.  Buffers are decoded in place rather than copied first.
+    '''
+    page = page_buffer(page)
     enc = get_encoding(page)
-    page_enc = page.decode(enc, 'replace').encode('utf-8')
-    doc = lxml.html.document_fromstring(page_enc, parser=utf8_parser)
+    if isinstance(page, basestring):
+        page_enc = page.decode(enc, 'replace').encode('utf-8')
+    else:
+        page_enc = unicode(page, enc, 'replace').encode('utf-8')
+    doc = lxml.html.document_fromstring(page_enc, parser=utf8_parser())
     return doc
 
 def js_re(src, pattern, flags, repl):
@@ -57,6 +90,59 @@ def add_match(collection, text, orig):
         if text.replace('"', '') in orig.replace('"', ''):
             collection.add(text)
 
+# The elements whose text may hold the article's title, in the order in which
+# shorten_title considers them.  Headings only match below the root, while the
+# id and class selectors also match the root itself, like cssselect.
+TITLE_HEADINGS = ['h1', 'h2', 'h3']
+TITLE_IDS = ['title', 'head', 'heading']
+TITLE_CLASSES = [
+        'pageTitle', 'news_title', 'title', 'head', 'heading', 'contentheading',
+        'small_header_red'
+        ]
+
+def class_test(name):
+    return (
+            "contains(concat(' ', normalize-space(@class), ' '), ' %s ')" %
+            name
+            )
+
+TITLE_CANDIDATES_XPATH = etree.XPath(' | '.join([
+        'descendant::%s' % ' | descendant::'.join(TITLE_HEADINGS),
+        'descendant-or-self::*[%s]' % ' or '.join(
+            ["@id = '%s'" % i for i in TITLE_IDS] +
+            [class_test(c) for c in TITLE_CLASSES]
+            )
+        ]))
+
+XML_WHITESPACE_RE = re.compile('[ \t\r\n]+')
+
+def title_candidate_groups(doc):
+    '''
+    Returns a list of lists of elements, one list for each of TITLE_HEADINGS,
+    TITLE_IDS and TITLE_CLASSES in turn, holding the elements that match it
+    in document order.  This runs a single precompiled XPath query instead of
+    a query per heading and per selector.
+    '''
+    headings = dict((tag, []) for tag in TITLE_HEADINGS)
+    ids = dict((i, []) for i in TITLE_IDS)
+    classes = dict((c, []) for c in TITLE_CLASSES)
+    for e in TITLE_CANDIDATES_XPATH(doc):
+        if e.tag in headings and e is not doc:
+            headings[e.tag].append(e)
+        elem_id = e.get('id')
+        if elem_id in ids:
+            ids[elem_id].append(e)
+        elem_class = e.get('class')
+        if elem_class:
+            for name in set(XML_WHITESPACE_RE.split(elem_class)):
+                if name in classes:
+                    classes[name].append(e)
+    return (
+            [headings[tag] for tag in TITLE_HEADINGS] +
+            [ids[i] for i in TITLE_IDS] +
+            [classes[c] for c in TITLE_CLASSES]
+            )
+
 def shorten_title(doc):
     title = orig = get_title(doc)
     if title == '':
@@ -64,20 +150,13 @@ def shorten_title(doc):
 
     candidates = set()
 
-    for item in ['.//h1', './/h2', './/h3']:
-        for e in list(doc.iterfind(item)):
+    for group in title_candidate_groups(doc):
+        for e in group:
             if e.text:
                 add_match(candidates, e.text, orig)
             if e.text_content():
                 add_match(candidates, e.text_content(), orig)
 
-    for item in ['#title', '#head', '#heading', '.pageTitle', '.news_title', '.title', '.head', '.heading', '.contentheading', '.small_header_red']:
-        for e in doc.cssselect(item):
-            if e.text:
-                add_match(candidates, e.text, orig)
-            if e.text_content():
-                add_match(candidates, e.text_content(), orig)
-                
     if candidates:
         title = sorted(candidates, key=len)[-1]
     else:
@@ -119,17 +198,91 @@ def tags(node, *tag_names):
         for e in node.findall('.//%s' % tag_name):
             yield e
 
+def node_keys(root):
+    '''
+    Returns a dict mapping each node in the tree rooted at root to its index in
+    a pre-order traversal of the tree.  Unlike the nodes themselves, these keys
+    are cheap to hash and compare, and they identify the same node in any copy
+    of the tree.  Use nodes_by_key to map keys back to nodes.
+    '''
+    return dict((node, i) for i, node in enumerate(root.iter()))
+
+def nodes_by_key(root):
+    '''
+    Returns the list of nodes in the tree rooted at root, indexed by the keys
+    computed by node_keys.
+    '''
+    return list(root.iter())
+
+# The whitespace characters other than newline that \s matches.
+LINE_WHITESPACE = ' \t\r\f\v'
+SPACES_RE = re.compile('[ \t]{2,}')
+
 def clean(text):
-    text = re.sub('\s*\n\s*', '\n', text)
-    text = re.sub('[ \t]{2,}', ' ', text)
-    return text.strip()
+    '''
+    Strips text and normalizes the whitespace in it: each run of whitespace
+    containing a newline becomes a single newline, and each other run of two
+    or more spaces and tabs becomes a single space.
+    '''
+    text = text.strip()
+    if '\n' in text:
+        lines = [line.strip(LINE_WHITESPACE) for line in text.split('\n')]
+        text = '\n'.join([line for line in lines if line])
+    if '\t' in text or '  ' in text:
+        text = SPACES_RE.sub(' ', text)
+    return text
+
+def clean_length(text):
+    '''
+    Returns len(clean(text)).  The cleaned string is only built if there is
+    whitespace inside text to normalize.
+    '''
+    text = text.strip()
+    if '\n' in text or '\t' in text or '  ' in text:
+        return len(clean(text))
+    return len(text)
+
+def parse_title_doc(input):
+    '''
+    Parses input just far enough to find its title.  Scripts and styles are
+    removed, since their text would otherwise count towards headings, and so
+    are comments and processing instructions, which would split the text of
+    a heading, as html_cleaner does in parse.  The rest of its cleaning,
+    which only drops attributes and elements without text, and the link
+    rewriting done by parse are skipped.
+    '''
+    doc = build_doc(input)
+    etree.strip_elements(doc, 'script', 'style', with_tail = False)
+    etree.strip_tags(doc, etree.Comment, etree.ProcessingInstruction)
+    return doc
 
 def parse(input, url):
+    '''
+    Parses and cleans input.  Links are not made absolute yet, since most of
+    them are thrown away with the rest of the page; instead url is recorded
+    as the tree's base_url, for make_links_absolute to use on whatever is
+    kept.  A <base href> is resolved here, while it is still in the tree.
+    '''
     logging.debug('parse url: %s', url)
     raw_doc = build_doc(input)
     doc = html_cleaner.clean_html(raw_doc)
+    doc.resolve_base_href()
     if url:
-        doc.make_links_absolute(url, resolve_base_href=True)
-    else:
-        doc.resolve_base_href()
+        doc.getroottree().docinfo.URL = url
     return doc
+
+def absolute_url(base_url, href):
+    '''
+    Returns href resolved against base_url, just as make_links_absolute
+    would resolve it, or href itself if base_url is None.
+    '''
+    if base_url is None:
+        return href
+    return urlparse.urljoin(base_url, href.strip())
+
+def make_links_absolute(elem, base_url):
+    '''
+    Makes the links under elem absolute, if base_url is not None.
+    '''
+    if base_url is not None:
+        elem.make_links_absolute(base_url, resolve_base_href = False)
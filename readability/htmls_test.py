@@ -1,8 +1,73 @@
+from copy import deepcopy
 from lxml.html import builder as B
 from htmls import *
+import mmap
 import sys
+import tempfile
+import threading
 import unittest
 
+class TestBuildDoc(unittest.TestCase):
+
+    PAGE = '<html><body><p>caf\xc3\xa9 au lait, s\xc3\xa9rieusement</p></body></html>'
+
+    def _text(self, page):
+        return build_doc(page).text_content()
+
+    def test_buffers(self):
+        expected = self._text(self.PAGE)
+        self.assertEqual(u'caf\xe9 au lait, s\xe9rieusement', expected)
+        self.assertEqual(expected, self._text(buffer('xx' + self.PAGE, 2)))
+        self.assertEqual(expected, self._text(memoryview(self.PAGE)))
+        with tempfile.TemporaryFile() as f:
+            f.write(self.PAGE)
+            f.flush()
+            m = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+            self.assertEqual(expected, self._text(m))
+            m.close()
+
+class TestThreadParsers(unittest.TestCase):
+
+    def test_per_thread(self):
+        self.assertTrue(utf8_parser() is utf8_parser())
+        self.assertTrue(html_parser() is html_parser())
+        other = []
+        def run():
+            other.append((utf8_parser(), html_parser()))
+        thread = threading.Thread(target = run)
+        thread.start()
+        thread.join()
+        self.assertFalse(other[0][0] is utf8_parser())
+        self.assertFalse(other[0][1] is html_parser())
+
+class TestParse(unittest.TestCase):
+
+    def test_links_left_relative(self):
+        doc = parse('<html><body><a href="next.html">x</a></body></html>',
+                'http://example.com/a/page.html')
+        self.assertEqual('http://example.com/a/page.html', doc.base_url)
+        link = doc.find('.//a')
+        self.assertEqual('next.html', link.get('href'))
+        self.assertEqual(
+                'http://example.com/a/next.html',
+                absolute_url(doc.base_url, link.get('href'))
+                )
+
+    def test_base_href(self):
+        doc = parse('<html><head><base href="http://other.com/b/"></head>'
+                '<body><a href="next.html">x</a></body></html>',
+                'http://example.com/a/page.html')
+        self.assertEqual(None, doc.find('.//base'))
+        self.assertEqual(
+                'http://other.com/b/next.html',
+                doc.find('.//a').get('href')
+                )
+
+    def test_no_url(self):
+        doc = parse('<html><body><a href="next.html">x</a></body></html>', None)
+        self.assertEqual(None, doc.base_url)
+        self.assertEqual('next.html', absolute_url(None, 'next.html'))
+
 class TestGetTitle(unittest.TestCase):
 
     def test_no_title(self):
@@ -17,6 +82,104 @@ class TestGetTitle(unittest.TestCase):
                 )
         self.assertEqual('test title', get_title(doc))
 
+class TestShortenTitle(unittest.TestCase):
+
+    def _make_doc(self, *body):
+        return B.HTML(
+                B.HEAD(B.TITLE('Site Name | A Fairly Long Article Title Here')),
+                B.BODY(*body)
+                )
+
+    def test_heading(self):
+        doc = self._make_doc(B.H2('A Fairly Long Article Title Here'))
+        self.assertEqual('A Fairly Long Article Title Here', shorten_title(doc))
+
+    def test_class_and_id(self):
+        doc = self._make_doc(
+                B.DIV('Site Name | A Fairly', {'id': 'heading'}),
+                B.SPAN(
+                    'Long Article Title Here',
+                    {'class': 'big\ttitle'}
+                    )
+                )
+        self.assertEqual('Long Article Title Here', shorten_title(doc))
+
+    def test_groups(self):
+        doc = self._make_doc(
+                B.H1('one'),
+                B.DIV(B.H1('two', {'class': 'title'}), {'id': 'title'})
+                )
+        groups = title_candidate_groups(doc)
+        self.assertEqual(
+                [['one', 'two'], [], [], [''], [], [], [], [], ['two'],
+                    [], [], [], []],
+                [[e.text or '' for e in group] for group in groups]
+                )
+
+    def test_title_doc_matches_parse(self):
+        html = ('<html><head><title>Big Long Title Words Here and more'
+                '</title></head><body><h1>Big Long<!--x--> Title Words Here'
+                '<?pi x?><span>by someone</span></h1>'
+                '<script>var x;</script></body></html>')
+        expected = shorten_title(parse(html, None))
+        self.assertEqual('Big Long Title Words Here', expected)
+        self.assertEqual(expected, shorten_title(parse_title_doc(html)))
+
+class TestClean(unittest.TestCase):
+
+    def _reference(self, text):
+        text = re.sub('\s*\n\s*', '\n', text)
+        text = re.sub('[ \t]{2,}', ' ', text)
+        return text.strip()
+
+    def test_against_reference(self):
+        texts = [
+                '',
+                '  hello  ',
+                'hello \t world',
+                'one\n\n  two \r\n three',
+                ' \n leading and trailing \n ',
+                'tab\tand  spaces\t\t here',
+                u'non\xa0breaking \xa0\n space',
+                'carriage\r  return \x0b\x0c feeds'
+                ]
+        for text in texts:
+            self.assertEqual(self._reference(text), clean(text), repr(text))
+            self.assertEqual(
+                    len(self._reference(text)),
+                    clean_length(text),
+                    repr(text)
+                    )
+
+class TestNodeKeys(unittest.TestCase):
+
+    def _make_doc(self):
+        return B.HTML(
+                B.BODY(
+                    B.DIV(B.P('one'), B.P('two')),
+                    B.DIV(B.P('one'), B.P('two'))
+                    )
+                )
+
+    def test_preorder(self):
+        doc = self._make_doc()
+        keys = node_keys(doc)
+        self.assertEqual(0, keys[doc])
+        self.assertEqual(range(len(keys)), sorted(keys.values()))
+        second_div = doc.find('body')[1]
+        self.assertEqual(5, keys[second_div])
+
+    def test_copy(self):
+        doc = self._make_doc()
+        copy = deepcopy(doc)
+        keys = node_keys(doc)
+        copy_nodes = nodes_by_key(copy)
+        for node, key in keys.items():
+            copy_node = copy_nodes[key]
+            self.assertFalse(copy_node is node)
+            self.assertEqual(node.tag, copy_node.tag)
+            self.assertEqual(node.text, copy_node.text)
+
 def main():
     if len(sys.argv) > 1 and sys.argv[1] == '--debug':
         del sys.argv[1]
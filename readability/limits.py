@@ -0,0 +1,88 @@
+"""
+This module implements the resource limits of a single extraction.
+
+A Budget is created from the 'time_limit' (in seconds), 'max_nodes' and
+'max_bytes' options.  The extraction stages check it cooperatively and cut
+their work short once the time limit has passed: paragraph transforms stop
+rewriting further divs, scoring keeps the candidates found so far, sanitize
+skips its sibling scans and remaining conditional cleaning, and get_article
+does not retry leniently.  Whenever a limit cuts work short, the budget is
+marked as truncated, and so is the resulting Summary.
+
+The budget also records how long each stage of the extraction took, which
+capture.py saves along with slow pages.
+"""
+
+import logging
+import time
+
+class Budget(object):
+
+    def __init__(self, time_limit = None, max_nodes = None, max_bytes = None):
+        if time_limit is None:
+            self.deadline = None
+        else:
+            self.deadline = time.time() + time_limit
+        self.max_nodes = max_nodes
+        self.max_bytes = max_bytes
+        self.truncated = False
+        # The seconds spent in each stage, by name.
+        self.stages = {}
+
+    def record(self, stage, start):
+        '''
+        Adds the time since start to the time spent in stage.
+        '''
+        self.stages[stage] = self.stages.get(stage, 0.0) + time.time() - start
+
+    def expired(self):
+        if self.deadline is None or time.time() < self.deadline:
+            return False
+        if not self.truncated:
+            logging.debug('extraction time limit reached')
+        self.truncated = True
+        return True
+
+def make_budget(options):
+    return Budget(
+            options['time_limit'],
+            options['max_nodes'],
+            options['max_bytes']
+            )
+
+def out_of_time(budget):
+    return budget is not None and budget.expired()
+
+def limit_bytes(page, budget):
+    '''
+    Returns page cut down to the budget's byte limit.  lxml copes with the
+    truncated markup.
+    '''
+    if budget is None or budget.max_bytes is None:
+        return page
+    if len(page) <= budget.max_bytes:
+        return page
+    logging.debug('truncating input of %d bytes' % len(page))
+    budget.truncated = True
+    return page[:budget.max_bytes]
+
+def limit_nodes(doc, budget):
+    '''
+    Removes every node past the budget's node limit, in document order.
+    '''
+    if budget is None or budget.max_nodes is None:
+        return
+    removed = []
+    for i, node in enumerate(doc.iter()):
+        if i >= budget.max_nodes:
+            removed.append(node)
+    if not removed:
+        return
+    logging.debug('dropping %d nodes past the node limit' % len(removed))
+    budget.truncated = True
+    # Nodes come after their ancestors, so dropping in reverse order never
+    # touches a node that has already been dropped along with its parent.
+    for node in reversed(removed):
+        parent = node.getparent()
+        if parent is not None:
+            parent.remove(node)
@@ -2,10 +2,11 @@
 This module implements multi-page article handling.
 """
 
-from htmls import clean, parse, tags
+from htmls import absolute_url, clean, html_parser, parse, tags
 from lxml.html import fragment_fromstring
 from lxml.etree import tostring
 from regexes import REGEXES
+import hashlib
 import logging
 import re
 import urlparse
@@ -19,6 +20,14 @@ MAX_PAGES = 10
 # class used for each of those divs.
 PAGE_CLASS = 'article-page'
 
+# Pages are compared by simhash fingerprints of their paragraph text.  Two
+# pages whose fingerprints differ in at most DUPLICATE_THRESHOLD bits are
+# considered duplicates.  This can be overridden with the
+# 'duplicate_threshold' option.
+FINGERPRINT_BITS = 64
+SHINGLE_SIZE = 3
+DUPLICATE_THRESHOLD = 3
+
 def clean_segment_extension(segments, index, segment):
     if segment.find('.') == -1:
         return segment
@@ -131,12 +140,13 @@ def find_base_url(url):
     logging.debug('base_url: %s' % base_url)
     return base_url
 
-class NextPageCandidate():
+class NextPageCandidate(object):
     '''
     An object that tracks a single href that is a candidate for the location of
     the next page.  Note that this is distinct from the candidates used when
     trying to find the elements containing the article.
     '''
+    __slots__ = ('link_text', 'href', 'score')
 
     def __init__(self, link_text, href):
         self.link_text = link_text
@@ -161,6 +171,9 @@ def eval_href(parsed_urls, url, base_url, link):
         logging.debug('link with no href')
         return None, None, False
 
+    # parse leaves links relative (see htmls.parse), so resolve this one
+    # against the page it came from.
+    raw_href = absolute_url(link.base_url, raw_href)
     logging.debug('evaluating href: %s' % raw_href)
     href = strip_trailing_slash(raw_href)
         
@@ -313,8 +326,10 @@ def find_next_page_url(parsed_urls, url, elem):
     # represent information used to determine if a URL points to the next page
     # in the article.
     candidates = {}
+    debug = logging.getLogger().isEnabledFor(logging.DEBUG)
     for link in links:
-        logging.debug('link: %s' % tostring(link))
+        if debug:
+            logging.debug('link: %s' % tostring(link))
         eval_possible_next_page_link(
                 parsed_urls,
                 url,
@@ -343,26 +358,98 @@ def make_page_elem(page_index, elem):
     elem.attrib['id'] = page_id(page_index)
     elem.attrib['class'] = PAGE_CLASS
 
-def first_paragraph(elem):
-    paragraphs = elem.xpath('.//p')
-    if len(paragraphs) > 0:
-        return paragraphs[0]
-    else:
+def page_text_words(elem):
+    words = []
+    for p in elem.iter('p'):
+        words.extend(clean(p.text_content() or '').lower().split())
+    return words
+
+def hash_shingle(shingle):
+    digest = hashlib.md5(shingle.encode('utf-8')).hexdigest()
+    return int(digest[:FINGERPRINT_BITS / 4], 16)
+
+def page_fingerprint(elem):
+    '''
+    Computes a simhash fingerprint of the paragraph text of a page.  Pages
+    with the same text get the same fingerprint, and pages with nearly the
+    same text get fingerprints that differ in only a few bits.  If the page
+    has no paragraph text, None is returned.
+    '''
+    words = page_text_words(elem)
+    if not words:
         return None
+    size = min(SHINGLE_SIZE, len(words))
+    weights = [0] * FINGERPRINT_BITS
+    for i in range(len(words) - size + 1):
+        h = hash_shingle(u' '.join(words[i:i + size]))
+        for bit in range(FINGERPRINT_BITS):
+            if h & (1 << bit):
+                weights[bit] += 1
+            else:
+                weights[bit] -= 1
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+def hamming_distance(lhs, rhs):
+    return bin(lhs ^ rhs).count('1')
+
+class PageFingerprints():
+    '''
+    An index of the fingerprints of the pages appended to an article so far.
 
-def is_suspected_duplicate(doc, page_doc):
-    page_p = first_paragraph(page_doc)
-    if page_p is None:
+    Fingerprints are split into threshold + 1 bands.  Two fingerprints within
+    the threshold Hamming distance of each other must agree exactly on at
+    least one band, so only the fingerprints sharing a band with the one being
+    looked up need to be compared.
+    '''
+
+    def __init__(self, threshold = None):
+        if threshold is None:
+            threshold = DUPLICATE_THRESHOLD
+        self.threshold = threshold
+        band_count = min(threshold + 1, FINGERPRINT_BITS)
+        self._band_width = -(-FINGERPRINT_BITS // band_count)
+        self._bands = {}
+
+    def _band_keys(self, fingerprint):
+        mask = (1 << self._band_width) - 1
+        for start in range(0, FINGERPRINT_BITS, self._band_width):
+            yield start, (fingerprint >> start) & mask
+
+    def add(self, fingerprint):
+        if fingerprint is None:
+            return
+        for key in self._band_keys(fingerprint):
+            self._bands.setdefault(key, []).append(fingerprint)
+
+    def contains(self, fingerprint):
+        if fingerprint is None:
+            return False
+        for key in self._band_keys(fingerprint):
+            for existing in self._bands.get(key, []):
+                if hamming_distance(existing, fingerprint) <= self.threshold:
+                    return True
         return False
+
+def make_page_fingerprints(doc, threshold = None):
+    fingerprints = PageFingerprints(threshold)
     pages = doc.xpath('//*[contains(@class, $name)]', name = PAGE_CLASS)
-    for existing_page in pages:
-        existing_page_p = first_paragraph(existing_page)
-        if existing_page_p is not None:
-            page_p_content = page_p.xpath('string()')
-            existing_page_p_content = existing_page_p.xpath('string()')
-            if page_p_content == existing_page_p_content:
-                return True
-    return False
+    for page in pages:
+        fingerprints.add(page_fingerprint(page))
+    return fingerprints
+
+def is_suspected_duplicate(doc, page_doc, fingerprints = None):
+    '''
+    Returns True if page_doc looks like a page that has already been appended
+    to doc.  If fingerprints is None, the fingerprints of the pages in doc are
+    computed from scratch.
+    '''
+    if fingerprints is None:
+        fingerprints = make_page_fingerprints(doc)
+    return fingerprints.contains(page_fingerprint(page_doc))
 
 def append_next_page(
         get_article_func,
@@ -370,7 +457,8 @@ def append_next_page(
         page_index,
         page_url,
         doc,
-        options
+        options,
+        fingerprints = None
         ):
     logging.debug('appending next page: %s' % page_url)
 
@@ -386,9 +474,16 @@ def append_next_page(
     orig_page_doc = parse(html, page_url)
     next_page_url = find_next_page_url(parsed_urls, page_url, orig_page_doc)
     page_article = get_article_func(orig_page_doc, options)
-    page_doc = fragment_fromstring(page_article.html)
+    page_doc = fragment_fromstring(page_article.html, parser = html_parser())
     make_page_elem(page_index, page_doc)
-    if not is_suspected_duplicate(doc, page_doc):
+    if fingerprints is None:
+        fingerprints = make_page_fingerprints(
+                doc,
+                options['duplicate_threshold']
+                )
+    fingerprint = page_fingerprint(page_doc)
+    if not fingerprints.contains(fingerprint):
+        fingerprints.add(fingerprint)
         doc.append(page_doc)
         if next_page_url is not None:
             append_next_page(
@@ -397,5 +492,6 @@ def append_next_page(
                     page_index + 1,
                     next_page_url,
                     doc,
-                    options
+                    options,
+                    fingerprints
                     )
@@ -1,23 +1,27 @@
 #!/usr/bin/env python
+from capture import start_capture
 from cleaners import html_cleaner, clean_attributes
 from collections import defaultdict
-from htmls import build_doc, get_body, get_title, shorten_title, tags, clean, parse
+from htmls import build_doc, get_body, get_title, shorten_title, tags, clean, parse, make_links_absolute
+from htmls import clean_length, html_parser, parse_title_doc
+from limits import limit_bytes, limit_nodes, make_budget, out_of_time
 from lxml.etree import tostring, tounicode
 from lxml.html import fragment_fromstring, document_fromstring
 from lxml.html import builder as B
-from lxml.html.diff import htmldiff
 from multi_page import append_next_page, find_next_page_url, make_page_elem
+from multi_page import page_fingerprint, PageFingerprints
 from regexes import REGEXES
-import difflib
+from render import get_renderer
+from rules import DEFAULT_RULES, MAYBE, NEGATIVE, POSITIVE, UNLIKELY, get_rules
+from snapshot import load_snapshot, snapshot_url
+from templates import get_template_cache, make_template, url_host
 import logging
 import os
 import re
 import sys
-import tempfile
+import time
 import urlfetch
-import urllib
 import urlparse
-import webbrowser
 
 def describe(node, depth=1):
     if not hasattr(node, 'tag'):
@@ -42,28 +46,41 @@ def to_int(x):
     return int(x)
 
 def text_length(i):
-    return len(clean(i.text_content() or ""))
+    return clean_length(i.text_content() or "")
 
-def class_weight(e):
+def class_weight(e, rules = DEFAULT_RULES):
     weight = 0
     if e.get('class', None):
-        if REGEXES['negativeRe'].search(e.get('class')):
+        mask = rules.match(e.get('class'))
+        if mask & NEGATIVE:
             weight -= 25
 
-        if REGEXES['positiveRe'].search(e.get('class')):
+        if mask & POSITIVE:
             weight += 25
 
     if e.get('id', None):
-        if REGEXES['negativeRe'].search(e.get('id')):
+        mask = rules.match(e.get('id'))
+        if mask & NEGATIVE:
             weight -= 25
 
-        if REGEXES['positiveRe'].search(e.get('id')):
+        if mask & POSITIVE:
             weight += 25
 
     return weight
 
-def score_node(elem):
-    content_score = class_weight(elem)
+class Candidate(object):
+    '''
+    The score of an element that might contain the article.  Pages can have
+    thousands of these, so they use __slots__ rather than a per-instance dict.
+    '''
+    __slots__ = ('content_score', 'elem')
+
+    def __init__(self, content_score, elem):
+        self.content_score = content_score
+        self.elem = elem
+
+def score_node(elem, rules = DEFAULT_RULES):
+    content_score = class_weight(elem, rules)
     name = elem.tag.lower()
     if name == "div":
         content_score += 5
@@ -73,10 +90,7 @@ def score_node(elem):
         content_score -= 3
     elif name in ["h1", "h2", "h3", "h4", "h5", "h6", "th"]:
         content_score -= 5
-    return { 
-        'content_score': content_score, 
-        'elem': elem
-    }
+    return Candidate(content_score, elem)
 
 def split_into_parts(elem):
     '''
@@ -224,45 +238,46 @@ def squeeze_breaks(parts):
 
     return new_parts
 
-def insert_p(parent, at_elem, parts):
-    '''
-    Inserts a paragraph element generated from a list of parts into the given
-    parent, before the child element at_elem.  The parts may contain elements
-    that are currently children of the parent.
-    '''
-    p = make_paragraph_from_parts(parts)
-    if p is not None:
-        index = parent.index(at_elem)
-        parent.insert(index, p)
-    del parts[:]
+BLOCK_TAGS = frozenset(
+        ['h%d' % i for i in range(1, 7)] +
+        ['blockquote', 'div', 'img', 'p', 'pre', 'table']
+        )
+
+def is_blank(text):
+    return text is None or text.strip() == ''
 
-def append_p(parent, parts):
+def has_only_blocks(elem):
     '''
-    Appends a paragraph element generated from a list of parts to the given
-    parent.  The parts may contain elements that are currently children of the
-    parent.
+    Returns True if elem contains only block elements separated by whitespace.
+    Splitting such an element into paragraphs only drops the whitespace.
     '''
-    p = make_paragraph_from_parts(parts)
-    if p is not None:
-        parent.append(p)
-    del parts[:]
+    if not is_blank(elem.text):
+        return False
+    for child in elem:
+        if child.tag not in BLOCK_TAGS or not is_blank(child.tail):
+            return False
+    return True
 
 def transform_double_breaks_into_paragraphs_elem(elem):
     '''
     Transforms double-breaks that delineate paragraphs into proper paragraph
     elements.  See transform_double_breaks_into_paragraphs.
     '''
+    if has_only_blocks(elem):
+        elem.text = None
+        for child in elem:
+            child.tail = None
+        return
+
     # The algorithm walks the parts of the element looking for double-breaks,
     # accumulating parts with which to construct a paragraphs when they are
-    # encountered.
+    # encountered.  Rather than inserting each paragraph into elem as it is
+    # made, which costs a linear elem.index() lookup per paragraph, we collect
+    # the new list of children and replace elem's children once at the end.
 
     # We enter the BR state once we have seen a break and are looking to see if
     # there is another break immediately following it.
     START, BR = range(2)
-    BLOCK_TAGS = (
-            ['h%d' % i for i in range(1, 7)] +
-            ['blockquote', 'div', 'img', 'p', 'pre', 'table']
-            )
 
     state = START
 
@@ -273,8 +288,18 @@ def transform_double_breaks_into_paragraphs_elem(elem):
     # We use this to accumulate parts that we will put into a paragraph where
     # we see fit.
     acc = []
-    parts = squeeze_breaks(split_into_parts(elem))
-    
+    children = []
+
+    def add_p():
+        p = make_paragraph_from_parts(acc)
+        if p is not None:
+            children.append(p)
+        del acc[:]
+
+    parts = split_into_parts(elem)
+    if len(elem.findall('br')) > 1:
+        parts = squeeze_breaks(parts)
+
     for part in parts:
         if state == START:
             if isinstance(part, basestring):
@@ -284,7 +309,8 @@ def transform_double_breaks_into_paragraphs_elem(elem):
                     first_br = part
                     state = BR
                 elif part.tag in BLOCK_TAGS:
-                    insert_p(elem, part, acc)
+                    add_p()
+                    children.append(part)
                 else:
                     acc.append(part)
         elif state == BR:
@@ -293,21 +319,24 @@ def transform_double_breaks_into_paragraphs_elem(elem):
                 acc.append(part)
             else:
                 if part.tag == 'br':
-                    first_br.drop_tree()
-                    insert_p(elem, part, acc)
-                    part.drop_tree()
+                    add_p()
                 elif part.tag in BLOCK_TAGS:
                     acc.append(first_br)
-                    insert_p(elem, part, acc)
+                    add_p()
+                    children.append(part)
                 else:
                     acc.append(first_br)
                     acc.append(part)
             state = START
             first_br = None
 
-    append_p(elem, acc)
+    # A trailing single break stays where it is, ahead of the last paragraph.
+    if first_br is not None:
+        children.append(first_br)
+    add_p()
+    elem[:] = children
 
-def transform_double_breaks_into_paragraphs(doc):
+def transform_double_breaks_into_paragraphs(doc, budget = None):
     '''
     Modifies doc so that double-breaks (<br><br>) in content delineate
     paragraphs.  Some pages use double-breaks when they really should be using
@@ -356,28 +385,109 @@ def transform_double_breaks_into_paragraphs(doc):
         </div>
     '''
     for div in tags(doc, 'div'):
+        if out_of_time(budget):
+            break
         transform_double_breaks_into_paragraphs_elem(div)
 
-def transform_misused_divs_into_paragraphs(doc):
+def transform_misused_divs_into_paragraphs(doc, budget = None):
     for elem in tags(doc, 'div'):
+        if out_of_time(budget):
+            break
         # transform <div>s that do not contain other block elements into <p>s
         if not REGEXES['divToPElementsRe'].search(unicode(''.join(map(tostring, list(elem))))):
             logging.debug("Altering %s to p" % (describe(elem)))
             elem.tag = "p"
             #print "Fixed element "+describe(elem)
             
-def remove_unlikely_candidates(doc):
+def is_unlikely_candidate(elem, rules = DEFAULT_RULES):
+    s = "%s %s" % (elem.get('class', ''), elem.get('id', ''))
+    #logging.debug(s)
+    mask = rules.match(s)
+    return (mask & UNLIKELY and
+            (not mask & MAYBE) and
+            elem.tag != 'body' and
+            elem.getparent() is not None
+            )
+
+def remove_unlikely_candidates(doc, rules = DEFAULT_RULES):
     for elem in doc.iter():
-        s = "%s %s" % (elem.get('class', ''), elem.get('id', ''))
-        #logging.debug(s)
-        if (REGEXES['unlikelyCandidatesRe'].search(s) and
-                (not REGEXES['okMaybeItsACandidateRe'].search(s)) and
-                elem.tag != 'body' and
-                elem.getparent() is not None
-                ):
+        if is_unlikely_candidate(elem, rules):
             logging.debug("Removing unlikely candidate - %s" % describe(elem))
             elem.drop_tree()
 
+def is_div_to_p_block(tag):
+    '''
+    Returns True if an element with this tag stops a <div> around it from
+    being turned into a <p> by transform_misused_divs_into_paragraphs.
+    '''
+    return (isinstance(tag, basestring) and
+            REGEXES['divToPElementsRe'].match('<' + tag) is not None)
+
+def preprocess(doc, rules = None, budget = None):
+    '''
+    Prepares doc for scoring in a single walk of the tree.  This has the same
+    effect as the separate passes that it replaces, run in this order:
+
+        dropping all <script>s and <style>s
+        setting the id of all <body>s to readabilityBody
+        remove_unlikely_candidates(doc, rules), unless rules is None
+        transform_double_breaks_into_paragraphs(doc, budget)
+        transform_misused_divs_into_paragraphs(doc, budget)
+
+    Elements are dropped and <body>s marked on the way down.  <div>s are
+    transformed on the way back up, once everything below them is final.
+    Splitting a <div> into paragraphs only changes its own children, and
+    whether a <div> becomes a <p> only depends on the tags below it, where a
+    <div> and a <p> count the same.  So the result doesn't depend on
+    transforming the <div>s in document order, and which tags are below each
+    <div> can be collected on the way up instead of serializing its subtree.
+    '''
+    # remove_unlikely_candidates iterates over doc.iter(), which finds the
+    # next element before yielding the current one.  When it drops an element
+    # with children, it goes on into the dropped subtree and stops at its
+    # end, so no later unlikely candidates are removed.
+    remove_unlikely = rules is not None
+    # Each frame holds an element, an iterator over its children, and
+    # whether any element below it so far is_div_to_p_block.
+    stack = [[doc, iter(list(doc)), False]]
+    while stack:
+        frame = stack[-1]
+        for child in frame[1]:
+            tag = child.tag
+            if not isinstance(tag, basestring):
+                continue
+            if tag == 'script' or tag == 'style':
+                child.drop_tree()
+                continue
+            if tag == 'body':
+                child.set('id', 'readabilityBody')
+            if remove_unlikely and is_unlikely_candidate(child, rules):
+                logging.debug("Removing unlikely candidate - %s" % describe(child))
+                child.drop_tree()
+                # Scripts and styles would have been dropped already.
+                for c in child:
+                    if c.tag != 'script' and c.tag != 'style':
+                        remove_unlikely = False
+                        break
+                continue
+            stack.append([child, iter(list(child)), False])
+            break
+        else:
+            stack.pop()
+            elem, has_block = frame[0], frame[2]
+            if elem is doc:
+                continue
+            if elem.tag == 'div' and not out_of_time(budget):
+                transform_double_breaks_into_paragraphs_elem(elem)
+                # Any new paragraphs count too.
+                has_block = has_block or any(
+                        is_div_to_p_block(c.tag) for c in elem)
+                if not has_block:
+                    logging.debug("Altering %s to p" % (describe(elem)))
+                    elem.tag = "p"
+            if has_block or is_div_to_p_block(elem.tag):
+                stack[-1][2] = True
+
 def get_link_density(elem):
     link_length = 0
     for i in elem.findall(".//a"):
@@ -387,13 +497,21 @@ def get_link_density(elem):
     total_length = text_length(elem)
     return float(link_length) / max(total_length, 1)
 
-def score_paragraphs(doc, options):
+def score_paragraphs(doc, options, budget = None):
+    rules = get_rules(options)
+    # These messages are built for every paragraph, so skip them entirely
+    # unless they will be logged.
+    debug = logging.getLogger().isEnabledFor(logging.DEBUG)
     candidates = {}
     #logging.debug(str([describe(node) for node in tags(doc, "div")]))
 
     ordered = []
     for elem in tags(doc, "p", "pre", "td"):
-        logging.debug('Scoring %s' % describe(elem))
+        if out_of_time(budget):
+            # Go with the candidates we have so far.
+            break
+        if debug:
+            logging.debug('Scoring %s' % describe(elem))
         parent_node = elem.getparent()
         if parent_node is None:
             continue 
@@ -407,11 +525,11 @@ def score_paragraphs(doc, options):
             continue
 
         if parent_node not in candidates:
-            candidates[parent_node] = score_node(parent_node)
+            candidates[parent_node] = score_node(parent_node, rules)
             ordered.append(parent_node)
             
         if grand_parent_node is not None and grand_parent_node not in candidates:
-            candidates[grand_parent_node] = score_node(grand_parent_node)
+            candidates[grand_parent_node] = score_node(grand_parent_node, rules)
             ordered.append(grand_parent_node)
 
         content_score = 1
@@ -420,27 +538,42 @@ def score_paragraphs(doc, options):
         #if elem not in candidates:
         #    candidates[elem] = score_node(elem)
             
-        #WTF? candidates[elem]['content_score'] += content_score
-        candidates[parent_node]['content_score'] += content_score
+        #WTF? candidates[elem].content_score += content_score
+        candidates[parent_node].content_score += content_score
         if grand_parent_node is not None:
-            candidates[grand_parent_node]['content_score'] += content_score / 2.0
+            candidates[grand_parent_node].content_score += content_score / 2.0
 
     # Scale the final candidates score based on link density. Good content should have a
     # relatively small link density (5% or less) and be mostly unaffected by this operation.
     for elem in ordered:
         candidate = candidates[elem]
         ld = get_link_density(elem)
-        score = candidate['content_score']
-        logging.debug("Candid: %6.3f %s link density %.3f -> %6.3f" % (score, describe(elem), ld, score*(1-ld)))
-        candidate['content_score'] *= (1 - ld)
+        score = candidate.content_score
+        if debug:
+            logging.debug("Candid: %6.3f %s link density %.3f -> %6.3f" % (score, describe(elem), ld, score*(1-ld)))
+        candidate.content_score *= (1 - ld)
 
     return candidates
 
+def get_scoring_func(options):
+    '''
+    Returns the score_paragraphs implementation selected by the
+    'scoring_engine' option.  All engines produce identical candidates.
+    '''
+    engine = options['scoring_engine']
+    if engine is None or engine == 'python':
+        return score_paragraphs
+    elif engine == 'numpy':
+        import vectorized
+        return vectorized.score_paragraphs
+    else:
+        raise ValueError('unknown scoring engine: %s' % engine)
+
 def select_best_candidate(candidates):
-    sorted_candidates = sorted(candidates.values(), key=lambda x: x['content_score'], reverse=True)
+    sorted_candidates = sorted(candidates.values(), key=lambda x: x.content_score, reverse=True)
     for candidate in sorted_candidates[:5]:
-        elem = candidate['elem']
-        logging.debug("Top 5 : %6.3f %s" % (candidate['content_score'], describe(elem)))
+        elem = candidate.elem
+        logging.debug("Top 5 : %6.3f %s" % (candidate.content_score, describe(elem)))
 
     if len(sorted_candidates) == 0:
         return None
@@ -449,13 +582,36 @@ def select_best_candidate(candidates):
     return best_candidate
 
 def reverse_tags(node, *tag_names):
+    '''
+    Yields the descendants of node with each tag name in turn, in reverse
+    document order, so that descendants come before their ancestors.  Each
+    tag's elements are only looked up once the previous tag's elements have
+    been processed, so elements dropped by then are never yielded.
+    '''
     for tag_name in tag_names:
         for e in reversed(node.findall('.//%s' % tag_name)):
             yield e
 
-def sanitize(node, candidates, options):
+# The descendants counted when conditionally cleaning an element.
+COUNTED_TAGS = ('p', 'img', 'li', 'a', 'embed', 'input')
+
+def descendant_stats(el):
+    '''
+    Counts el's descendants with each of COUNTED_TAGS, and sums the text
+    length of its links, in a single pass over its descendants.
+    '''
+    counts = dict.fromkeys(COUNTED_TAGS, 0)
+    link_length = 0
+    for desc in el.iterdescendants(*COUNTED_TAGS):
+        counts[desc.tag] += 1
+        if desc.tag == 'a':
+            link_length += text_length(desc)
+    return counts, link_length
+
+def sanitize_tree(node, candidates, options, budget = None):
+    rules = get_rules(options)
     for header in tags(node, "h1", "h2", "h3", "h4", "h5", "h6"):
-        if class_weight(header) < 0 or get_link_density(header) > 0.33: 
+        if class_weight(header, rules) < 0 or get_link_density(header) > 0.33: 
             header.drop_tree()
 
     for elem in tags(node, "form", "iframe", "textarea"):
@@ -463,11 +619,13 @@ def sanitize(node, candidates, options):
     allowed = {}
     # Conditionally clean <table>s, <ul>s, and <div>s
     for el in reverse_tags(node, "table", "ul", "div"):
+        if out_of_time(budget):
+            break
         if el in allowed:
             continue
-        weight = class_weight(el)
+        weight = class_weight(el, rules)
         if el in candidates:
-            content_score = candidates[el]['content_score']
+            content_score = candidates[el].content_score
             #print '!',el, '-> %6.3f' % content_score
         else:
             content_score = 0
@@ -477,18 +635,19 @@ def sanitize(node, candidates, options):
             logging.debug("Cleaned %s with score %6.3f and weight %-3s" %
                 (describe(el), content_score, weight, ))
             el.drop_tree()
-        elif el.text_content().count(",") < 10:
-            counts = {}
-            for kind in ['p', 'img', 'li', 'a', 'embed', 'input']:
-                counts[kind] = len(el.findall('.//%s' %kind))
+            continue
+
+        text = el.text_content()
+        if text.count(",") < 10:
+            counts, link_length = descendant_stats(el)
             counts["li"] -= 100
 
-            content_length = text_length(el) # Count the text length excluding any surrounding whitespace
-            link_density = get_link_density(el)
+            content_length = clean_length(text) # Count the text length excluding any surrounding whitespace
+            link_density = float(link_length) / max(content_length, 1)
             parent_node = el.getparent()
             if parent_node is not None:
                 if parent_node in candidates:
-                    content_score = candidates[parent_node]['content_score']
+                    content_score = candidates[parent_node].content_score
                 else:
                     content_score = 0
             #if parent_node is not None:
@@ -581,34 +740,44 @@ def sanitize(node, candidates, options):
     #         #el.attrib = {} #FIXME:Checkout the effects of disabling this
     #         pass
 
+def sanitize(node, candidates, options, budget = None):
+    sanitize_tree(node, candidates, options, budget)
     return clean_attributes(tounicode(node))
 
+def serialize_article(article):
+    unicode_cleaned_article = clean_attributes(tounicode(article))
+    cleaned_doc = fragment_fromstring(
+            unicode_cleaned_article,
+            parser = html_parser()
+            )
+    return tounicode(cleaned_doc)
+
 def get_raw_article(candidates, best_candidate):
     # Now that we have the top candidate, look through its siblings for content that might also be related.
     # Things like preambles, content split by ads that we removed, etc.
 
-    sibling_score_threshold = max([10, best_candidate['content_score'] * 0.2])
+    sibling_score_threshold = max([10, best_candidate.content_score * 0.2])
     article = B.DIV()
     article.attrib['id'] = 'page'
-    best_elem = best_candidate['elem']
+    best_elem = best_candidate.elem
     for sibling in best_elem.getparent().getchildren():
         #if isinstance(sibling, NavigableString): continue#in lxml there no concept of simple text 
         append = False 
         if sibling is best_elem:
             append = True
-        sibling_key = sibling #HashableElement(sibling)
+        sibling_key = sibling
 
         # Print out sibling information for debugging.
         if sibling_key in candidates:
             sibling_candidate = candidates[sibling_key]
             logging.debug(
                     "Sibling: %6.3f %s" %
-                    (sibling_candidate['content_score'], describe(sibling))
+                    (sibling_candidate.content_score, describe(sibling))
                     )
         else:
             logging.debug("Sibling: %s" % describe(sibling))
 
-        if sibling_key in candidates and candidates[sibling_key]['content_score'] >= sibling_score_threshold:
+        if sibling_key in candidates and candidates[sibling_key].content_score >= sibling_score_threshold:
             append = True
 
         if sibling.tag == "p":
@@ -628,26 +797,91 @@ def get_raw_article(candidates, best_candidate):
     #    article.append(best_elem)
     return article
 
-def get_article(doc, options):
+def score_template(doc, options, budget, template_cache, host, score_func):
+    '''
+    Finds the element given by the template for host and scores only the
+    tree under its parent, which holds every node that get_raw_article and
+    sanitize look at.  Returns the element's candidate and the candidates,
+    or (None, None) if there is no template or the page doesn't match it.
+    '''
+    template = template_cache.get(host)
+    if template is None:
+        return None, None
+    elem = template.find(doc, options['retry_length'] or 0)
+    if elem is None or elem.getparent() is None:
+        logging.debug('page does not match the template for %s' % host)
+        return None, None
+    candidates = score_func(elem.getparent(), options, budget)
+    if elem not in candidates:
+        logging.debug('template for %s holds no paragraphs' % host)
+        return None, None
+    logging.debug('using the template for %s' % host)
+    return candidates[elem], candidates
+
+def get_article(doc, options, output = 'html', budget = None):
+    '''
+    Extracts the article from doc.  With the default 'html' output, the
+    returned Summary holds the article's HTML.  With any other output in
+    render.RENDERERS, it holds the article rendered directly from the tree,
+    and the HTML is only serialized when it is needed to decide whether to
+    retry.
+
+    If budget is None, one is made from the options.  See limits.py.
+
+    With the 'template_cache' option, the ruthless pass first tries the
+    template learned for the page's host, and learns a new one when it
+    has to score the page.  See templates.py.
+
+    Links are made absolute in the article only, against the base_url that
+    htmls.parse recorded for doc.
+    '''
+    score_paragraphs_func = get_scoring_func(options)
+    base_url = doc.base_url
+    if budget is None:
+        budget = make_budget(options)
+    limit_nodes(doc, budget)
+    if output != 'html':
+        renderer = get_renderer(output)
+    host = url_host(options['url'])
+    template_cache = None
+    if host is not None:
+        template_cache = get_template_cache(options)
     try:
         ruthless = True
         while True:
-            for i in tags(doc, 'script', 'style'):
-                i.drop_tree()
-            for i in tags(doc, 'body'):
-                i.set('id', 'readabilityBody')
-            if ruthless: 
-                remove_unlikely_candidates(doc)
-            transform_double_breaks_into_paragraphs(doc)
-            transform_misused_divs_into_paragraphs(doc)
-            candidates = score_paragraphs(doc, options)
-            
-            best_candidate = select_best_candidate(candidates)
+            used_template = False
+            learned = None
+            start = time.time()
+            if ruthless:
+                preprocess(doc, get_rules(options), budget)
+            else:
+                preprocess(doc, None, budget)
+            budget.record('preprocess', start)
+            start = time.time()
+            if ruthless and template_cache is not None:
+                best_candidate, candidates = score_template(
+                        doc,
+                        options,
+                        budget,
+                        template_cache,
+                        host,
+                        score_paragraphs_func
+                        )
+                used_template = best_candidate is not None
+            if not used_template:
+                candidates = score_paragraphs_func(doc, options, budget)
+                best_candidate = select_best_candidate(candidates)
+            budget.record('score', start)
+
             if best_candidate:
-                confidence = best_candidate['content_score']
+                confidence = best_candidate.content_score
+                if ruthless and template_cache is not None and not used_template:
+                    # The path must be taken before the candidate is moved
+                    # into the article.
+                    learned = make_template(best_candidate.elem)
                 article = get_raw_article(candidates, best_candidate)
             else:
-                if ruthless:
+                if ruthless and not out_of_time(budget):
                     logging.debug("ruthless removal did not work. ")
                     ruthless = False
                     logging.debug("ended up stripping too much - going for a safer parse")
@@ -655,18 +889,35 @@ def get_article(doc, options):
                     continue
                 else:
                     logging.debug("Ruthless and lenient parsing did not work. Returning raw html")
-                    return Summary(0, None)
-
-            unicode_cleaned_article = sanitize(article, candidates, options)
-            cleaned_doc = fragment_fromstring(unicode_cleaned_article)
-            cleaned_article = tounicode(cleaned_doc)
-
-            of_acceptable_length = len(cleaned_article or '') >= options['retry_length']
-            if ruthless and not of_acceptable_length:
+                    return Summary(0, None, truncated = budget.truncated)
+
+            start = time.time()
+            sanitize_tree(article, candidates, options, budget)
+            make_links_absolute(article, base_url)
+            budget.record('sanitize', start)
+            if ruthless or output == 'html':
+                start = time.time()
+                cleaned_article = serialize_article(article)
+                budget.record('serialize', start)
+                of_acceptable_length = len(cleaned_article or '') >= options['retry_length']
+            if ruthless and not of_acceptable_length and not out_of_time(budget):
+                if used_template:
+                    template_cache.discard(host)
                 ruthless = False
                 continue # try again
+            if learned is not None:
+                template_cache.record(host, learned)
+            if output == 'html':
+                return Summary(
+                        confidence,
+                        cleaned_article,
+                        truncated = budget.truncated
+                        )
             else:
-                return Summary(confidence, cleaned_article)
+                start = time.time()
+                text = renderer(article)
+                budget.record('render', start)
+                return Summary(confidence, None, text, budget.truncated)
     except StandardError as e:
         #logging.exception('error getting summary: ' + str(traceback.format_exception(*sys.exc_info())))
         logging.exception('error getting summary: ' )
@@ -682,11 +933,36 @@ class Summary:
     may not be valid, though we did our best.
     '''
 
-    def __init__(self, confidence, html):
+    def __init__(self, confidence, html, text = None, truncated = False):
         self.confidence = confidence
         self.html = html
+        # The rendered article when a text or markdown output was requested.
+        self.text = text
+        # True if a resource limit cut the extraction short.
+        self.truncated = truncated
 
 class Document:
+    '''
+    Extracts the article from an HTML page.  Besides 'url' and 'urlfetch',
+    options include 'time_limit' (seconds), 'max_nodes' and 'max_bytes' to
+    bound the work done by summary() (see limits.py), 'site_rules' to adjust
+    the keywords used for particular sites (see rules.py), and
+    'template_cache' to reuse where earlier pages from the same site had
+    their article (see templates.py).  'capture_dir', 'capture_time'
+    (seconds) and 'capture_rss' (bytes) save slow pages as regression test
+    cases (see capture.py).
+
+    Document.from_snapshot makes a Document from a snapshot made by
+    snapshot.make_snapshot, which skips parsing the page again.  The
+    snapshot's URL is used unless 'url' is given, and 'max_bytes' does not
+    apply to it.
+
+    Documents are reentrant: any number of threads may extract at once,
+    from different Documents or from the same one, since every call to
+    summary() or content() parses its own tree.  Each thread parses with
+    its own lxml parser (see htmls.utf8_parser), so parsing runs in
+    parallel.  See batch.extract_batch_threaded.
+    '''
     TEXT_LENGTH_THRESHOLD = 25
     RETRY_LENGTH = 250
 
@@ -705,38 +981,100 @@ class Document:
         for k, v in options.items():
             self.options[k] = v
 
+        self.snapshot = None
         self.html = None
 
-    def _html(self, force=False):
-        if force or self.html is None:
-            self.html = parse(self.input, self.options['url'])
-        return self.html
+    @classmethod
+    def from_snapshot(cls, snapshot, **options):
+        '''
+        Returns a Document for the page held by snapshot (see snapshot.py).
+        '''
+        doc = cls(None, **options)
+        doc.snapshot = snapshot
+        if doc.options['url'] is None:
+            doc.options['url'] = snapshot_url(snapshot)
+        return doc
+
+    def _html(self, force=False, budget=None):
+        html = self.html
+        if force or html is None:
+            # Keep the tree in a local, since another thread may replace
+            # self.html before this one returns.
+            if self.snapshot is not None:
+                html = load_snapshot(self.snapshot)
+            else:
+                page = limit_bytes(self.input, budget)
+                html = parse(page, self.options['url'])
+            self.html = html
+        return html
+
+    def _title_doc(self):
+        if self.snapshot is not None:
+            return load_snapshot(self.snapshot)
+        return parse_title_doc(self.input)
     
     def content(self):
-        return get_body(self._html(True))
+        doc = self._html(True)
+        make_links_absolute(doc, doc.base_url)
+        return get_body(doc)
     
     def title(self):
-        return get_title(self._html(True))
+        return get_title(self._title_doc())
 
     def short_title(self):
-        return shorten_title(self._html(True))
+        return shorten_title(self._title_doc())
+
+    def summary(self, output = 'html'):
+        '''
+        Returns a Summary of the article.  output may be 'html', 'text' or
+        'markdown'; for the latter two the result is in Summary.text and
+        Summary.html is None.
+        '''
+        budget = make_budget(self.options)
+        probe = start_capture(self.options)
+        if probe is None:
+            return self._summary(output, budget)
+        try:
+            summary = self._summary(output, budget)
+        except Exception as e:
+            # Pages that fail slowly are captured too, before the error is
+            # raised again.
+            exc_info = sys.exc_info()
+            probe.finish(self.input, output, None, budget.stages, e)
+            raise exc_info[0], exc_info[1], exc_info[2]
+        probe.finish(
+                self.input,
+                output,
+                summary,
+                budget.stages,
+                extract_html = lambda: self._summary(
+                    'html', make_budget(self.options)).html
+                )
+        return summary
 
-    def summary(self):
-        doc = self._html(True)
+    def _summary(self, output, budget):
+        start = time.time()
+        doc = self._html(True, budget)
+        budget.record('parse', start)
         parsed_urls = set()
         url = self.options['url']
         if url is not None:
             parsed_urls.add(url)
-        page_0 = get_article(doc, self.options)
-        if page_0.html:
+        page_0 = get_article(doc, self.options, output, budget)
+        if page_0.html or page_0.text:
             # we fetch page_0 only for now.
             return page_0
+        if page_0.html is None:
+            # Nothing could be extracted.
+            return page_0
         next_page_url = find_next_page_url(parsed_urls, url, doc)
-        page_0_doc = fragment_fromstring(page_0.html)
+        page_0_doc = fragment_fromstring(page_0.html, parser = html_parser())
         page_index = 0
         make_page_elem(page_index, page_0_doc)
         article_doc = B.DIV(page_0_doc)
         article_doc.attrib['id'] = 'article'
+        fingerprints = PageFingerprints(self.options['duplicate_threshold'])
+        fingerprints.add(page_fingerprint(page_0_doc))
         if next_page_url is not None:
             append_next_page(
                     get_article,
@@ -744,36 +1082,11 @@ class Document:
                     page_index + 1,
                     next_page_url,
                     article_doc,
-                    self.options
+                    self.options,
+                    fingerprints
                     )
         return Summary(page_0.confidence, tostring(article_doc))
 
-class HashableElement():
-    def __init__(self, node):
-        self.node = node
-        self._path = None
-
-    def _get_path(self):
-        if self._path is None:
-            reverse_path = []
-            node = self.node
-            while node is not None:
-                node_id = (node.tag, tuple(node.attrib.items()), node.text)
-                reverse_path.append(node_id)
-                node = node.getparent()
-            self._path = tuple(reverse_path)
-        return self._path
-    path = property(_get_path)
-
-    def __hash__(self):
-        return hash(self.path)
-
-    def __eq__(self, other):
-        return self.path == other.path
-
-    def __getattr__(self, tag):
-        return getattr(self.node, tag)
-
 def pretty_print(html):
     doc = document_fromstring(html, remove_blank_text = True)
     print(tostring(doc, pretty_print = True))
@@ -785,6 +1098,13 @@ def parse_args():
     parser.add_option('-v', '--verbose', action = 'store_true')
     parser.add_option('-u', '--url', help = 'load from URL')
     parser.add_option('-f', '--file', help = 'load from file at path')
+    parser.add_option(
+            '-t',
+            '--output',
+            choices = ['html', 'text', 'markdown'],
+            default = 'html',
+            help = 'output format: html, text or markdown'
+            )
     
     parser.add_option(
             '-o',
@@ -848,6 +1168,9 @@ def full_html_from_doc(doc):
     return tostring(html_element)
 
 def open_in_browser(doc):
+    import tempfile
+    import urllib
+    import webbrowser
     html = full_html_from_doc(doc)
     fd, path = tempfile.mkstemp(suffix = '.html')
     file = os.fdopen(fd, 'w')
@@ -859,8 +1182,15 @@ def open_in_browser(doc):
 def show_results(options, doc):
     if options.open_browser:
         open_in_browser(doc)
-    else:
+    elif options.output == 'html':
         print doc.summary().html
+    else:
+        text = doc.summary(options.output).text
+        if text is None:
+            # Nothing could be extracted.
+            print >> sys.stderr, 'no article found'
+        else:
+            print text.encode('utf-8')
 
 def make_doc(file, url, options):
     doc_options = {
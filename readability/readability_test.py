@@ -1,4 +1,12 @@
+from multi_page import find_base_url, is_suspected_duplicate
+from multi_page import page_fingerprint, PageFingerprints
+from limits import Budget
+from lxml.html.diff import htmldiff
 from readability import *
+import difflib
+import os.path
+import subprocess
+import threading
 import unittest
 
 class TestFindBaseUrl(unittest.TestCase):
@@ -211,6 +219,41 @@ class TestIsSuspectedDuplicate(unittest.TestCase):
             page = fragment_fromstring(html)
         self.assertTrue(is_suspected_duplicate(self._article, page))
 
+    def test_near_duplicate(self):
+        with open('test_data/duplicate-page-duplicate.html') as f:
+            html = f.read()
+            page = fragment_fromstring(html)
+        page.find('.//p').text += ' Extra.'
+        self.assertTrue(is_suspected_duplicate(self._article, page))
+
+class TestPageFingerprints(unittest.TestCase):
+
+    def _page(self, *paragraphs):
+        return B.DIV(*[B.P(text) for text in paragraphs])
+
+    def test_no_paragraphs(self):
+        fingerprints = PageFingerprints()
+        fingerprint = page_fingerprint(B.DIV('no paragraphs'))
+        self.assertEqual(None, fingerprint)
+        fingerprints.add(fingerprint)
+        self.assertFalse(fingerprints.contains(fingerprint))
+
+    def test_whitespace_insensitive(self):
+        lhs = page_fingerprint(self._page('Hello   world,\n  how are you'))
+        rhs = page_fingerprint(self._page('hello world, how are you'))
+        self.assertEqual(lhs, rhs)
+
+    def test_threshold(self):
+        fingerprints = PageFingerprints(threshold = 0)
+        fingerprints.add(0)
+        self.assertTrue(fingerprints.contains(0))
+        self.assertFalse(fingerprints.contains(1))
+
+        fingerprints = PageFingerprints(threshold = 3)
+        fingerprints.add(0)
+        self.assertTrue(fingerprints.contains(0x7))
+        self.assertFalse(fingerprints.contains(0xf))
+
 class TestSplitIntoParts(unittest.TestCase):
 
     def test_empty(self):
@@ -309,6 +352,245 @@ class TestTransformDoubleBreaksIntoParagraphs(unittest.TestCase):
     def test_mit(self):
         self._test_one('mit')
 
+    def test_only_blocks(self):
+        elem = B.DIV('\n  ', B.P('one'), '\n', B.DIV('two'), '  ')
+        transform_double_breaks_into_paragraphs_elem(elem)
+        self.assertEqual(
+                '<div><p>one</p><div>two</div></div>',
+                tostring(elem)
+                )
+
+    def test_trailing_break(self):
+        elem = B.DIV('one', B.BR(), ' ', B.BR(), 'two', B.BR())
+        transform_double_breaks_into_paragraphs_elem(elem)
+        self.assertEqual(
+                '<div><p>one</p><br/><p>two</p></div>',
+                tostring(elem)
+                )
+
+class TestPreprocess(unittest.TestCase):
+
+    def _make_doc(self):
+        return B.HTML(B.BODY(
+            B.DIV(
+                'one', B.BR(), B.BR(), 'two', B.SCRIPT('x'),
+                B.DIV(B.SPAN('inline only')),
+                B.DIV(B.P('para'))
+                ),
+            B.DIV(B.STYLE('x'), {'class': 'sidebar'}),
+            B.DIV(B.SPAN('dropped'), {'class': 'comment'}),
+            B.DIV(B.SPAN('kept'), {'class': 'footer'}),
+            ))
+
+    def _separate_passes(self, doc, rules):
+        for i in tags(doc, 'script', 'style'):
+            i.drop_tree()
+        for i in tags(doc, 'body'):
+            i.set('id', 'readabilityBody')
+        if rules is not None:
+            remove_unlikely_candidates(doc, rules)
+        transform_double_breaks_into_paragraphs(doc)
+        transform_misused_divs_into_paragraphs(doc)
+
+    def test_same_as_separate_passes(self):
+        for rules in [DEFAULT_RULES, None]:
+            expected = self._make_doc()
+            self._separate_passes(expected, rules)
+            actual = self._make_doc()
+            preprocess(actual, rules)
+            self.assertEqual(tostring(expected), tostring(actual))
+
+    def test_unlikely_candidates(self):
+        doc = self._make_doc()
+        preprocess(doc, DEFAULT_RULES)
+        html = tostring(doc)
+        # The sidebar is removed, since it only held a style, but removal
+        # stops after the comment, like remove_unlikely_candidates.
+        self.assertFalse('sidebar' in html)
+        self.assertFalse('dropped' in html)
+        self.assertTrue('kept' in html)
+        self.assertTrue('<p><span>inline only</span></p>' in html)
+
+class TestDescendantStats(unittest.TestCase):
+
+    def test_counts(self):
+        elem = B.DIV(
+                B.P('one ', B.A('link'), B.IMG()),
+                B.UL(B.LI(B.A('another link')), B.LI('item'))
+                )
+        counts, link_length = descendant_stats(elem)
+        expected = {'p': 1, 'img': 1, 'li': 2, 'a': 2, 'embed': 0, 'input': 0}
+        self.assertEqual(expected, counts)
+        self.assertEqual(len('link') + len('another link'), link_length)
+
+class TestSummaryOutput(unittest.TestCase):
+
+    def setUp(self):
+        with open('test_data/nytimes-next-page.html', 'r') as f:
+            self._html = f.read()
+
+    def test_text(self):
+        expected = Document(self._html).summary()
+        actual = Document(self._html).summary('text')
+        self.assertEqual(expected.confidence, actual.confidence)
+        self.assertEqual(None, actual.html)
+        self.assertTrue(actual.text.startswith(
+            u'Robert Yager for The New York Times\n\n'))
+        self.assertFalse('<' in actual.text)
+
+    def test_markdown(self):
+        actual = Document(self._html).summary('markdown')
+        self.assertTrue(actual.text.startswith(
+            u'![](http://graphics8.nytimes.com/images/2011/07/10/magazine/'
+            u'10bad_span/10bad_span-articleLarge.jpg)\n\n'
+            u'Robert Yager for The New York Times\n\n'))
+
+    def test_unknown_output(self):
+        doc = Document(self._html)
+        self.assertRaises(ValueError, doc.summary, 'pdf')
+
+    def test_links_absolute(self):
+        para = ('<p>Some text, with a <a href="more.html">link</a> and '
+                '<img src="/img/a.png"> an image, long enough to keep. ' * 4 +
+                '</p>')
+        html = '<html><body><div>%s%s</div></body></html>' % (para, para)
+        summary = Document(html, url = 'http://example.com/a/b.html').summary()
+        self.assertTrue('href="http://example.com/a/more.html"' in summary.html)
+        self.assertTrue('src="http://example.com/img/a.png"' in summary.html)
+        summary = Document(html).summary()
+        self.assertTrue('href="more.html"' in summary.html)
+
+class TestLimits(unittest.TestCase):
+
+    def setUp(self):
+        with open('test_data/nytimes-next-page.html', 'r') as f:
+            self._html = f.read()
+
+    def test_no_limits(self):
+        summary = Document(self._html).summary()
+        self.assertFalse(summary.truncated)
+
+    def test_generous_limits(self):
+        options = {
+                'time_limit': 60,
+                'max_nodes': 100000,
+                'max_bytes': len(self._html)
+                }
+        expected = Document(self._html).summary()
+        actual = Document(self._html, **options).summary()
+        self.assertFalse(actual.truncated)
+        self.assertEqual(expected.html, actual.html)
+
+    def test_time_limit(self):
+        summary = Document(self._html, time_limit = 0).summary()
+        self.assertTrue(summary.truncated)
+
+    def test_max_bytes(self):
+        summary = Document(self._html, max_bytes = 20000).summary()
+        self.assertTrue(summary.truncated)
+
+    def test_max_nodes(self):
+        doc = B.DIV(B.P('one'), B.P('two', B.B('three')), B.P('four'))
+        budget = Budget(max_nodes = 3)
+        limit_nodes(doc, budget)
+        self.assertTrue(budget.truncated)
+        self.assertEqual('<div><p>one</p><p>two</p></div>', tostring(doc))
+
+try:
+    import vectorized
+except ImportError:
+    vectorized = None
+
+@unittest.skipUnless(vectorized, 'numpy is not installed')
+class TestVectorizedScoring(unittest.TestCase):
+
+    def _test_one(self, path):
+        with open(path, 'r') as f:
+            doc = parse(f.read(), None)
+        transform_double_breaks_into_paragraphs(doc)
+        transform_misused_divs_into_paragraphs(doc)
+        options = defaultdict(lambda: None)
+        expected = score_paragraphs(doc, options)
+        actual = vectorized.score_paragraphs(doc, options)
+        self.assertEqual(expected.keys(), actual.keys())
+        for elem, candidate in expected.items():
+            self.assertEqual(
+                    candidate.content_score,
+                    actual[elem].content_score
+                    )
+
+    def test_basic(self):
+        self._test_one('test_data/basic-multi-page.html')
+
+    def test_nytimes(self):
+        self._test_one('test_data/nytimes-next-page.html')
+
+    def test_mit(self):
+        self._test_one('test_data/double-breaks-mit-original.html')
+
+    def test_summary(self):
+        with open('test_data/nytimes-next-page.html', 'r') as f:
+            html = f.read()
+        expected = Document(html).summary()
+        actual = Document(html, scoring_engine = 'numpy').summary()
+        self.assertEqual(expected.confidence, actual.confidence)
+        self.assertEqual(expected.html, actual.html)
+
+class TestReentrancy(unittest.TestCase):
+
+    PAGES = [
+            'test_data/nytimes-next-page.html',
+            'test_data/basic-multi-page.html',
+            'test_data/double-breaks-mit-original.html',
+            ]
+
+    def _run_threads(self, count, target):
+        threads = [threading.Thread(target = target) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def test_threads(self):
+        pages = []
+        for path in self.PAGES:
+            with open(path, 'r') as f:
+                pages.append(f.read())
+        expected = [Document(page).summary().html for page in pages]
+        shared = [Document(page) for page in pages]
+        results = []
+        def run():
+            for i in range(3):
+                for j, page in enumerate(pages):
+                    results.append((j, Document(page).summary().html))
+                    results.append((j, shared[j].summary().html))
+        self._run_threads(6, run)
+        self.assertEqual(6 * 3 * len(pages) * 2, len(results))
+        for j, html in results:
+            self.assertEqual(expected[j], html)
+
+class TestImport(unittest.TestCase):
+
+    CHECK = (
+            'import logging, sys\n'
+            'import readability\n'
+            'print logging.getLogger().level\n'
+            'print " ".join(sorted(m for m in sys.modules if sys.modules[m]))\n'
+            )
+
+    def test_no_side_effects(self):
+        package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output = subprocess.check_output(
+                [sys.executable, '-c', self.CHECK],
+                cwd = package_dir
+                )
+        level, modules = output.splitlines()
+        self.assertEqual(str(logging.WARNING), level)
+        modules = set(modules.split())
+        for name in ['chardet', 'difflib', 'lxml.html.diff', 'subprocess',
+                'tempfile', 'urllib2', 'webbrowser']:
+            self.assertFalse(name in modules, name)
+
 def main():
     if len(sys.argv) > 1 and sys.argv[1] == '--debug':
         del sys.argv[1]
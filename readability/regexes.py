@@ -4,12 +4,25 @@ Regular expressions used by readability processing.
 
 import re
 
+# The keyword lists tested against class names, ids and link text.  See
+# rules.py for matching all of them at once.
+KEYWORDS = {
+    'unlikelyCandidates': ['combx', 'comment', 'community', 'disqus', 'extra', 'foot', 'header', 'menu', 'remark', 'rss', 'shoutbox', 'sidebar', 'sponsor', 'ad-break', 'agegate', 'pagination', 'pager', 'popup', 'tweet', 'twitter'],
+    'okMaybeItsACandidate': ['and', 'article', 'body', 'column', 'main', 'shadow'],
+    'positive': ['article', 'body', 'content', 'entry', 'hentry', 'main', 'page', 'pagination', 'post', 'text', 'blog', 'story'],
+    'negative': ['combx', 'comment', 'com-', 'contact', 'foot', 'footer', 'footnote', 'masthead', 'media', 'meta', 'outbrain', 'promo', 'related', 'scroll', 'shoutbox', 'sidebar', 'sponsor', 'shopping', 'tags', 'tool', 'widget'],
+    'extraneous': ['print', 'archive', 'comment', 'discuss', 'email', 'e-mail', 'share', 'reply', 'all', 'login', 'sign', 'single'],
+}
+
+def keywords_re(keywords):
+    return re.compile('|'.join([re.escape(k) for k in keywords]), re.I)
+
 REGEXES = {
-    'unlikelyCandidatesRe': re.compile('combx|comment|community|disqus|extra|foot|header|menu|remark|rss|shoutbox|sidebar|sponsor|ad-break|agegate|pagination|pager|popup|tweet|twitter',re.I),
-    'okMaybeItsACandidateRe': re.compile('and|article|body|column|main|shadow',re.I),
-    'positiveRe': re.compile('article|body|content|entry|hentry|main|page|pagination|post|text|blog|story',re.I),
-    'negativeRe': re.compile('combx|comment|com-|contact|foot|footer|footnote|masthead|media|meta|outbrain|promo|related|scroll|shoutbox|sidebar|sponsor|shopping|tags|tool|widget',re.I),
-    'extraneous': re.compile(r'print|archive|comment|discuss|e[\-]?mail|share|reply|all|login|sign|single', re.I),
+    'unlikelyCandidatesRe': keywords_re(KEYWORDS['unlikelyCandidates']),
+    'okMaybeItsACandidateRe': keywords_re(KEYWORDS['okMaybeItsACandidate']),
+    'positiveRe': keywords_re(KEYWORDS['positive']),
+    'negativeRe': keywords_re(KEYWORDS['negative']),
+    'extraneous': keywords_re(KEYWORDS['extraneous']),
     'divToPElementsRe': re.compile('<(a|blockquote|dl|div|img|ol|p|pre|table|ul)',re.I),
     'nextLink': re.compile(r'(next|weiter|continue|>[^\|]$)', re.I), # Match: next, continue, >, >>, but not >|, as those usually mean last.
     'prevLink': re.compile(r'(prev|earl|old|new|<)', re.I),
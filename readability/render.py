@@ -0,0 +1,307 @@
+"""
+This module renders an extracted article as plain text or Markdown.
+
+The renderers walk the article tree directly, so no HTML needs to be
+serialized or re-parsed.  Block elements become paragraphs separated by blank
+lines, <br>s become line breaks, and whitespace within a paragraph is
+collapsed.
+"""
+
+from cleaners import normalize_spaces
+import re
+
+BLOCK_TAGS = frozenset([
+    'address', 'article', 'blockquote', 'dd', 'div', 'dl', 'dt', 'figcaption',
+    'figure', 'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header',
+    'hr', 'li', 'ol', 'p', 'pre', 'section', 'table', 'tr', 'ul'
+    ])
+
+SKIP_TAGS = frozenset(['head', 'noscript', 'script', 'style', 'title'])
+
+# Table cells are inline, but need a space between them.
+CELL_TAGS = frozenset(['td', 'th'])
+
+HEADING_LEVELS = dict(('h%d' % i, i) for i in range(1, 7))
+
+# Marks a <br> in the accumulated inline text.  Source newlines are just
+# whitespace, and lxml never allows NUL characters in text, so this can't be
+# confused with any of the text itself.
+BREAK = u'\x00'
+
+# The characters that have a meaning anywhere in Markdown text, and the line
+# starts that make a heading, block quote or list item.
+MARKDOWN_SPECIAL = re.compile(ur'([\\`*_\[\]<])')
+MARKDOWN_LINE_START = re.compile(ur'^(?:([#>+=-])|(\d+)([.)]))')
+# The characters that need a link destination wrapped in <>.
+DESTINATION_SPECIAL = re.compile(ur'[\s()<>]')
+
+class TextRenderer(object):
+    '''
+    Renders an element tree as plain text.  Subclasses override render_block
+    and render_inline to add markup for particular tags, and add_text and
+    format_line to escape text.
+    '''
+
+    def __init__(self):
+        self.blocks = []
+        self.inline = []
+
+    def render(self, elem):
+        self.walk(elem)
+        self.flush()
+        return u'\n\n'.join(self.blocks)
+
+    def render_contents(self, elem):
+        self.walk_children(elem)
+        self.flush()
+        return u'\n\n'.join(self.blocks)
+
+    def flush(self, prefix = u''):
+        '''
+        Turns the accumulated inline text into a block.  Returns False if
+        there was no text to add.
+        '''
+        text = u''.join(self.inline)
+        del self.inline[:]
+        lines = [
+                self.format_line(normalize_spaces(line))
+                for line in text.split(BREAK)
+                ]
+        text = u'\n'.join(lines).strip(u'\n')
+        if not text:
+            return False
+        self.blocks.append(prefix + text)
+        return True
+
+    def walk(self, elem):
+        tag = elem.tag
+        if not isinstance(tag, basestring) or tag in SKIP_TAGS:
+            return
+        if tag == 'br':
+            self.inline.append(BREAK)
+        elif tag in BLOCK_TAGS:
+            self.flush()
+            self.render_block(elem)
+            self.flush()
+        else:
+            self.render_inline(elem)
+            if tag in CELL_TAGS:
+                self.inline.append(u' ')
+
+    def walk_children(self, elem):
+        if elem.text:
+            self.add_text(elem.text)
+        for child in elem:
+            self.walk(child)
+            if child.tail:
+                self.add_text(child.tail)
+
+    def add_text(self, text):
+        self.inline.append(text)
+
+    def format_line(self, line):
+        return line
+
+    def render_block(self, elem):
+        self.walk_children(elem)
+
+    def render_inline(self, elem):
+        self.walk_children(elem)
+
+    def inline_text(self, elem):
+        '''
+        Renders the children of an inline element and returns the result
+        instead of adding it to the current block.
+        '''
+        start = len(self.inline)
+        self.walk_children(elem)
+        text = u''.join(self.inline[start:])
+        del self.inline[start:]
+        return text
+
+def escape_markdown(text):
+    return MARKDOWN_SPECIAL.sub(ur'\\\1', text)
+
+def escape_line_start(line):
+    '''
+    Escapes the marker that would make line a heading, block quote or list
+    item.
+    '''
+    match = MARKDOWN_LINE_START.match(line)
+    if match is None:
+        return line
+    if match.group(1):
+        return u'\\' + line
+    end = match.end(2)
+    return line[:end] + u'\\' + line[end:]
+
+def format_destination(url):
+    '''
+    Returns url as the destination of a Markdown link or image.
+    '''
+    if DESTINATION_SPECIAL.search(url):
+        return u'<%s>' % re.sub(ur'([\\<>])', ur'\\\1', url)
+    return url
+
+def longest_run(text, char):
+    runs = re.findall(re.escape(char) + u'+', text)
+    return max([len(run) for run in runs] or [0])
+
+def list_start(elem):
+    try:
+        return int(elem.get('start', 1))
+    except ValueError:
+        return 1
+
+class MarkdownRenderer(TextRenderer):
+    '''
+    Renders an element tree as Markdown.  Headings, lists, block quotes,
+    preformatted text, links, images and emphasis are preserved, and any
+    other text that Markdown would take for markup is escaped.
+    '''
+
+    INLINE_MARKERS = {
+        'b': u'**',
+        'strong': u'**',
+        'em': u'*',
+        'i': u'*',
+        }
+
+    def add_text(self, text):
+        self.inline.append(escape_markdown(text))
+
+    def format_line(self, line):
+        return escape_line_start(line)
+
+    def render_nested(self, elem):
+        '''
+        Renders the contents of elem as a separate document.
+        '''
+        return self.__class__().render_contents(elem)
+
+    def render_block(self, elem):
+        tag = elem.tag
+        if tag in HEADING_LEVELS:
+            self.walk_children(elem)
+            # A heading must stay on one line.
+            self.inline[:] = [text.replace(BREAK, u' ') for text in self.inline]
+            self.flush(u'#' * HEADING_LEVELS[tag] + u' ')
+        elif tag == 'pre':
+            text = elem.text_content().strip(u'\n')
+            if text:
+                fence = u'`' * max(3, longest_run(text, u'`') + 1)
+                self.blocks.append(u'%s\n%s\n%s' % (fence, text, fence))
+        elif tag == 'blockquote':
+            quoted = self.render_nested(elem)
+            if quoted:
+                lines = [(u'> ' + line).rstrip() for line in quoted.split(u'\n')]
+                self.blocks.append(u'\n'.join(lines))
+        elif tag == 'hr':
+            self.blocks.append(u'---')
+        elif tag in ('ol', 'ul'):
+            self.render_list(elem)
+        elif tag == 'li':
+            # An item outside of any list.
+            self.render_item(elem, u'- ')
+        else:
+            self.walk_children(elem)
+
+    def render_list(self, elem):
+        ordered = elem.tag == 'ol'
+        number = list_start(elem)
+        if elem.text:
+            self.add_text(elem.text)
+        for child in elem:
+            if child.tag == 'li':
+                self.flush()
+                if ordered:
+                    self.render_item(child, u'%d. ' % number)
+                    number += 1
+                else:
+                    self.render_item(child, u'- ')
+            else:
+                self.walk(child)
+            if child.tail:
+                self.add_text(child.tail)
+
+    def render_item(self, elem, marker):
+        '''
+        Renders a list item, with its lines after the first, including any
+        nested lists, indented under its marker.
+        '''
+        text = self.render_nested(elem)
+        if not text:
+            return
+        indent = u' ' * len(marker)
+        lines = text.split(u'\n')
+        lines[1:] = [indent + line if line else line for line in lines[1:]]
+        self.blocks.append(marker + u'\n'.join(lines))
+
+    def wrap_inline(self, elem, fmt):
+        '''
+        Renders the children of elem into fmt, keeping any whitespace around
+        them outside of the markup.
+        '''
+        self.wrap_text(self.inline_text(elem), fmt)
+
+    def wrap_text(self, text, fmt):
+        stripped = text.strip()
+        if not stripped:
+            self.inline.append(text)
+            return
+        start = text.index(stripped)
+        self.inline.append(text[:start])
+        self.inline.append(fmt % stripped)
+        self.inline.append(text[start + len(stripped):])
+
+    def render_code(self, elem):
+        # Code spans are literal, so their text isn't escaped: the fence is
+        # made longer than any run of backticks in it instead.
+        text = elem.text_content()
+        fence = u'`' * (longest_run(text, u'`') + 1)
+        stripped = text.strip()
+        if stripped.startswith(u'`') or stripped.endswith(u'`'):
+            fmt = fence + u' %s ' + fence
+        else:
+            fmt = fence + u'%s' + fence
+        self.wrap_text(text, fmt)
+
+    def render_inline(self, elem):
+        tag = elem.tag
+        if tag == 'a':
+            href = elem.get('href')
+            if href:
+                destination = format_destination(href).replace(u'%', u'%%')
+                self.wrap_inline(elem, u'[%s](' + destination + u')')
+            else:
+                self.walk_children(elem)
+        elif tag == 'img':
+            src = elem.get('src')
+            if src:
+                alt = escape_markdown(normalize_spaces(elem.get('alt')))
+                self.inline.append(
+                        u'![%s](%s)' % (alt, format_destination(src)))
+        elif tag == 'code':
+            self.render_code(elem)
+        elif tag in self.INLINE_MARKERS:
+            marker = self.INLINE_MARKERS[tag]
+            self.wrap_inline(elem, marker + u'%s' + marker)
+        else:
+            self.walk_children(elem)
+
+def render_text(elem):
+    return TextRenderer().render(elem)
+
+def render_markdown(elem):
+    return MarkdownRenderer().render(elem)
+
+RENDERERS = {
+    'text': render_text,
+    'markdown': render_markdown,
+    }
+
+def get_renderer(output):
+    try:
+        return RENDERERS[output]
+    except KeyError:
+        raise ValueError('unknown output: %s' % output)
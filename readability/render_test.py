@@ -0,0 +1,122 @@
+from lxml.html import builder as B
+from lxml.html import fragment_fromstring
+from render import *
+import logging
+import sys
+import unittest
+
+class TestRenderText(unittest.TestCase):
+
+    def test_paragraphs(self):
+        elem = B.DIV(
+                B.H1('A  title'),
+                B.P('First\n   paragraph, ', B.A('a link', href = '/x'), '.'),
+                B.P('Second', B.BR(), 'line')
+                )
+        self.assertEqual(
+                u'A title\n\nFirst paragraph, a link.\n\nSecond\nline',
+                render_text(elem)
+                )
+
+    def test_table_cells(self):
+        elem = fragment_fromstring(
+                '<table><tr><td>one</td><td>two</td></tr></table>')
+        self.assertEqual(u'one two', render_text(elem))
+
+    def test_empty(self):
+        self.assertEqual(u'', render_text(B.DIV(B.P(' '), B.DIV())))
+
+class TestRenderMarkdown(unittest.TestCase):
+
+    def test_headings_and_inline(self):
+        elem = B.DIV(
+                B.H2('Heading'),
+                B.P('Some ', B.B('bold '), 'and ', B.A('a link', href = '/x'))
+                )
+        self.assertEqual(
+                u'## Heading\n\nSome **bold** and [a link](/x)',
+                render_markdown(elem)
+                )
+
+    def test_lists(self):
+        elem = B.DIV(
+                B.UL(B.LI('one'), B.LI('two')),
+                B.OL(B.LI('first'), B.LI('second'))
+                )
+        self.assertEqual(
+                u'- one\n\n- two\n\n1. first\n\n2. second',
+                render_markdown(elem)
+                )
+
+    def test_blockquote_and_pre(self):
+        elem = B.DIV(
+                B.BLOCKQUOTE(B.P('quoted'), B.P('text')),
+                B.PRE('x = 1\n  y = 2\n')
+                )
+        self.assertEqual(
+                u'> quoted\n>\n> text\n\n```\nx = 1\n  y = 2\n```',
+                render_markdown(elem)
+                )
+
+    def test_escaping(self):
+        elem = fragment_fromstring(
+                '<div><p>2 * 3, snake_case, `x`, [1] and a\\b &lt;tag&gt;</p>'
+                '<p># not a heading</p>'
+                '<p>1. not a list<br>- nor this<br>&gt; nor a quote</p></div>')
+        self.assertEqual(
+                u'2 \\* 3, snake\\_case, \\`x\\`, \\[1\\] and a\\\\b \\<tag>'
+                u'\n\n\\# not a heading'
+                u'\n\n1\\. not a list\n\\- nor this\n\\> nor a quote',
+                render_markdown(elem)
+                )
+
+    def test_nested_lists(self):
+        elem = fragment_fromstring(
+                '<ul><li>one<ul><li>a</li><li>b<ol><li>x</li></ol></li></ul>'
+                '</li><li>two</li></ul>')
+        self.assertEqual(
+                u'- one\n\n  - a\n\n  - b\n\n    1. x\n\n- two',
+                render_markdown(elem)
+                )
+
+    def test_ordered_list_start(self):
+        elem = fragment_fromstring(
+                '<ol start="7"><li>seven</li> <!-- x --> <li>eight</li></ol>')
+        self.assertEqual(u'7. seven\n\n8. eight', render_markdown(elem))
+
+    def test_images_and_links(self):
+        elem = fragment_fromstring(
+                '<div><p><img alt="a [b]  c" src="/a b(1).png">'
+                '<img src="/x.png"></p>'
+                '<p><a href="/a_(b)">link_text</a></p></div>')
+        self.assertEqual(
+                u'![a \\[b\\] c](</a b(1).png>)![](/x.png)'
+                u'\n\n[link\\_text](</a_(b)>)',
+                render_markdown(elem)
+                )
+
+    def test_heading_break(self):
+        elem = fragment_fromstring('<h2>one<br>two</h2>')
+        self.assertEqual(u'## one two', render_markdown(elem))
+
+    def test_code(self):
+        elem = fragment_fromstring(
+                '<p>use <code>a`b*c</code> and <code>`x</code></p>')
+        self.assertEqual(
+                u'use ``a`b*c`` and `` `x ``',
+                render_markdown(elem)
+                )
+
+    def test_unknown_output(self):
+        self.assertRaises(ValueError, get_renderer, 'pdf')
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--debug':
+        del sys.argv[1]
+        logging.basicConfig(level = logging.DEBUG)
+    else:
+        logging.basicConfig(level = logging.INFO)
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
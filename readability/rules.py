@@ -0,0 +1,157 @@
+"""
+This module matches class names, ids and link text against all of the keyword
+lists in regexes.KEYWORDS at once.
+
+A RuleSet compiles every keyword into a single pattern that is scanned once
+per string, and returns a bitmask of the categories with a matching keyword.
+Results are cached per string, since the same class names and ids recur
+throughout a page.
+
+Site rules adjust the keyword lists for particular hosts.  They are loaded
+from a JSON file mapping host names to per-category keywords to add or
+remove:
+
+    {
+        "example.com": {
+            "positive": {"add": ["story-body"]},
+            "negative": {"remove": ["media"]}
+        }
+    }
+
+Every site's RuleSet is compiled when the file is loaded, and a host also
+uses the rules of its parent domains, so the above applies to
+www.example.com too.  Pass the file's path, or a SiteRules object from
+load_site_rules, as the 'site_rules' option.
+"""
+
+from regexes import KEYWORDS
+import json
+import re
+import urlparse
+
+CATEGORIES = [
+        'unlikelyCandidates',
+        'okMaybeItsACandidate',
+        'positive',
+        'negative',
+        'extraneous'
+        ]
+CATEGORY_BITS = dict((c, 1 << i) for i, c in enumerate(CATEGORIES))
+
+UNLIKELY = CATEGORY_BITS['unlikelyCandidates']
+MAYBE = CATEGORY_BITS['okMaybeItsACandidate']
+POSITIVE = CATEGORY_BITS['positive']
+NEGATIVE = CATEGORY_BITS['negative']
+EXTRANEOUS = CATEGORY_BITS['extraneous']
+
+# The number of strings whose masks are cached before the cache is reset.
+CACHE_SIZE = 10000
+
+class RuleSet(object):
+    '''
+    Matches strings against a dict of keyword lists keyed by category.
+    '''
+
+    def __init__(self, keywords):
+        self.keywords = keywords
+        masks = {}
+        for category, words in keywords.items():
+            for word in words:
+                word = word.lower()
+                masks[word] = masks.get(word, 0) | CATEGORY_BITS[category]
+
+        # At each position, the pattern matches the longest keyword found
+        # there.  Every other keyword found at that position is a prefix of
+        # it, so each keyword's mask includes the categories of its prefixes.
+        self._masks = {}
+        for word in masks:
+            mask = 0
+            for prefix, prefix_mask in masks.items():
+                if word.startswith(prefix):
+                    mask |= prefix_mask
+            self._masks[word] = mask
+        words = sorted(masks, key = len, reverse = True)
+        self._re = re.compile(
+                '(?=(%s))' % '|'.join([re.escape(w) for w in words]),
+                re.I
+                )
+        self._cache = {}
+
+    def match(self, s):
+        '''
+        Returns the bitmask of the categories with a keyword in s.
+        '''
+        try:
+            return self._cache[s]
+        except KeyError:
+            pass
+        mask = 0
+        for m in self._re.finditer(s):
+            mask |= self._masks[m.group(1).lower()]
+        if len(self._cache) >= CACHE_SIZE:
+            self._cache.clear()
+        self._cache[s] = mask
+        return mask
+
+    def override(self, changes):
+        '''
+        Returns a new RuleSet with keywords added to or removed from
+        categories, as given by a dict of the form used in site rules files.
+        '''
+        keywords = dict((c, list(words)) for c, words in self.keywords.items())
+        for category, change in changes.items():
+            if category not in CATEGORY_BITS:
+                raise ValueError('unknown rules category: %s' % category)
+            words = keywords.setdefault(category, [])
+            removed = set(w.lower() for w in change.get('remove', []))
+            words[:] = [w for w in words if w.lower() not in removed]
+            words.extend(change.get('add', []))
+        return RuleSet(keywords)
+
+DEFAULT_RULES = RuleSet(dict((c, KEYWORDS[c]) for c in CATEGORIES))
+
+class SiteRules(object):
+    '''
+    Holds a RuleSet for each host with site rules.
+    '''
+
+    def __init__(self, sites, default = DEFAULT_RULES):
+        self.default = default
+        self.sites = dict(
+                (host.lower(), default.override(changes))
+                for host, changes in sites.items()
+                )
+
+    def for_host(self, host):
+        if not host:
+            return self.default
+        parts = host.lower().split('.')
+        for i in range(len(parts)):
+            rules = self.sites.get('.'.join(parts[i:]))
+            if rules is not None:
+                return rules
+        return self.default
+
+    def for_url(self, url):
+        if url is None:
+            return self.default
+        return self.for_host(urlparse.urlsplit(url).hostname)
+
+def load_site_rules(path):
+    with open(path, 'r') as f:
+        return SiteRules(json.load(f))
+
+_loaded_site_rules = {}
+
+def get_rules(options):
+    '''
+    Returns the RuleSet to use for a document, given its options.
+    '''
+    site_rules = options['site_rules']
+    if site_rules is None:
+        return DEFAULT_RULES
+    if isinstance(site_rules, basestring):
+        if site_rules not in _loaded_site_rules:
+            _loaded_site_rules[site_rules] = load_site_rules(site_rules)
+        site_rules = _loaded_site_rules[site_rules]
+    return site_rules.for_url(options['url'])
@@ -0,0 +1,93 @@
+from regexes import REGEXES
+from rules import *
+import json
+import logging
+import os
+import sys
+import tempfile
+import unittest
+
+REGEX_NAMES = {
+        'unlikelyCandidates': 'unlikelyCandidatesRe',
+        'okMaybeItsACandidate': 'okMaybeItsACandidateRe',
+        'positive': 'positiveRe',
+        'negative': 'negativeRe',
+        'extraneous': 'extraneous',
+        }
+
+class TestRuleSet(unittest.TestCase):
+
+    def _regex_mask(self, s):
+        mask = 0
+        for category in CATEGORIES:
+            if REGEXES[REGEX_NAMES[category]].search(s):
+                mask |= CATEGORY_BITS[category]
+        return mask
+
+    def test_matches_regexes(self):
+        for s in [
+                '', 'article-body', 'comment', 'sidebar-main', 'ShareBox',
+                'post entry', 'headline', 'x-email', 'e-mail footer',
+                'mainstream', 'blog-combx', 'HENTRY', 'ad-break']:
+            self.assertEqual(self._regex_mask(s), DEFAULT_RULES.match(s), s)
+
+    def test_prefix_keywords(self):
+        # 'page' is positive and 'pager' unlikely, so a match on the longer
+        # keyword must include the shorter one's categories.
+        self.assertEqual(POSITIVE | UNLIKELY, DEFAULT_RULES.match('pager'))
+        self.assertEqual(self._regex_mask('footer'), DEFAULT_RULES.match('footer'))
+
+    def test_override(self):
+        rules = DEFAULT_RULES.override({
+            'positive': {'add': ['story-body']},
+            'negative': {'remove': ['comment']},
+            })
+        self.assertTrue(rules.match('story-body') & POSITIVE)
+        self.assertFalse(rules.match('comment') & NEGATIVE)
+        self.assertTrue(DEFAULT_RULES.match('comment') & NEGATIVE)
+
+    def test_unknown_category(self):
+        self.assertRaises(
+                ValueError,
+                DEFAULT_RULES.override,
+                {'bogus': {'add': ['x']}}
+                )
+
+class TestSiteRules(unittest.TestCase):
+
+    def setUp(self):
+        self.site_rules = SiteRules({
+            'example.com': {'positive': {'add': ['story-body']}},
+            })
+
+    def test_parent_domain(self):
+        rules = self.site_rules.for_url('http://www.example.com/a/b')
+        self.assertTrue(rules.match('story-body') & POSITIVE)
+
+    def test_other_host(self):
+        self.assertTrue(
+                self.site_rules.for_url('http://example.org/') is DEFAULT_RULES)
+        self.assertTrue(self.site_rules.for_url(None) is DEFAULT_RULES)
+
+    def test_load(self):
+        fd, path = tempfile.mkstemp(suffix = '.json')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'example.com': {'negative': {'add': ['promo']}}}, f)
+            options = {'site_rules': path, 'url': 'http://example.com/'}
+            self.assertTrue(get_rules(options).match('promo') & NEGATIVE)
+            options['url'] = 'http://example.org/'
+            self.assertTrue(get_rules(options) is DEFAULT_RULES)
+        finally:
+            os.remove(path)
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--debug':
+        del sys.argv[1]
+        logging.basicConfig(level = logging.DEBUG)
+    else:
+        logging.basicConfig(level = logging.INFO)
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
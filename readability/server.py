@@ -0,0 +1,399 @@
+"""
+This module implements a long-lived local extraction server.
+
+The server keeps a pool of worker processes, each of which extracts one page
+at a time.  Workers are forked from a parent that has already imported
+everything and run a warm-up extraction, so no request pays for imports or
+first-use setup.  A worker retires after 'max_tasks' extractions, or once
+its resident memory passes 'max_rss' bytes, and is replaced by a fresh one.
+That bounds the memory that lxml trees and heap fragmentation would
+otherwise keep piling up over millions of pages.
+
+Every request has a deadline.  It is passed on as the 'time_limit' option,
+so extraction normally stops early and returns a truncated Summary (see
+limits.py); if the worker still hasn't answered KILL_GRACE seconds later,
+it is killed and replaced, and the request fails.
+
+Requests are HTTP, over localhost TCP or a Unix socket:
+
+    $ python readability/server.py --port 8000
+    $ python readability/server.py --socket /tmp/readability.sock
+
+    POST /summary?url=<page url>&output=<html|text|markdown>&deadline=<s>
+
+The body is the page.  The response is a JSON object with the Summary's
+confidence, html, text and truncated fields.  The status is 413 if the body
+is longer than 'max_body' bytes, 422 if the page could not be extracted and
+504 if the deadline was missed.
+
+The pool can also be used directly:
+
+    pool = WorkerPool(4, max_tasks = 1000)
+    summary = pool.extract(url, page, deadline = 5)
+"""
+
+from capture import current_rss
+from readability import Document, Unparseable
+from templates import close_template_caches
+import BaseHTTPServer
+import Queue
+import SocketServer
+import argparse
+import gc
+import json
+import logging
+import multiprocessing
+import os
+import urlparse
+
+DEFAULT_DEADLINE = 10.0
+
+# The longest request body that is read, in bytes.
+DEFAULT_MAX_BODY = 16 * 1024 * 1024
+
+# How long past its deadline a worker may take before it is killed.
+KILL_GRACE = 1.0
+
+WARM_UP_PAGE = '''<html><head><title>Warm up</title></head><body>
+<div id="article"><h2>Warm up</h2>
+<p>This page is extracted once before the workers start, so that they begin
+with every module imported and every expression compiled.</p>
+<p>Its paragraphs are long enough, and have enough commas, to be scored as
+an article, which exercises the same code as real pages.</p>
+</div></body></html>'''
+
+class DeadlineExceeded(Exception):
+    pass
+
+def warm_up():
+    '''
+    Runs the extraction code once, for each output, so that processes
+    forked afterwards don't have to import or compile anything.
+    '''
+    for output in ['html', 'text', 'markdown']:
+        Document(WARM_UP_PAGE, url = 'http://localhost/').summary(output)
+    # Collect now, so that the forked workers share the heap without it
+    # being rewritten by a collection.
+    gc.collect()
+
+def worker_main(conn, max_tasks, max_rss):
+    try:
+        run_worker(conn, max_tasks, max_rss)
+    finally:
+        # Worker processes exit without running atexit handlers.
+        close_template_caches()
+
+def run_worker(conn, max_tasks, max_rss):
+    tasks = 0
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        url, page, output, options = task
+        try:
+            summary = Document(page, url = url, **options).summary(output)
+            result = (True, summary)
+        except Exception as e:
+            logging.exception('could not extract %s' % url)
+            result = (False, str(e))
+        tasks += 1
+        retire = ((max_tasks is not None and tasks >= max_tasks) or
+                (max_rss is not None and current_rss() > max_rss))
+        conn.send((result, retire))
+        if retire:
+            return
+
+class Worker(object):
+
+    def __init__(self, max_tasks, max_rss):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+                target = worker_main,
+                args = (child_conn, max_tasks, max_rss)
+                )
+        self.process.daemon = True
+        self.process.start()
+        child_conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except IOError:
+            pass
+        self.process.join()
+        self.conn.close()
+
+    def kill(self):
+        self.process.terminate()
+        self.process.join()
+        self.conn.close()
+
+class WorkerPool(object):
+    '''
+    A pool of size warm worker processes.  extract may be called from any
+    number of threads; each call waits for an idle worker.
+    '''
+
+    def __init__(self, size = None, max_tasks = None, max_rss = None,
+            **options):
+        self.size = size or multiprocessing.cpu_count()
+        self.max_tasks = max_tasks
+        self.max_rss = max_rss
+        # Passed to every Document, under the options given to extract.
+        self.options = options
+        warm_up()
+        self._idle = Queue.Queue()
+        for i in range(self.size):
+            self._idle.put(self._start())
+
+    def _start(self):
+        return Worker(self.max_tasks, self.max_rss)
+
+    def extract(self, url, page, output = 'html', deadline = DEFAULT_DEADLINE,
+            **options):
+        '''
+        Returns the Summary of page.  Raises Unparseable if it can't be
+        extracted, or DeadlineExceeded if the worker didn't answer in time.
+        '''
+        task_options = dict(self.options)
+        task_options.update(options)
+        if deadline is not None and task_options.get('time_limit') is None:
+            task_options['time_limit'] = deadline
+        worker = self._idle.get()
+        try:
+            try:
+                worker.conn.send((url, page, output, task_options))
+                answered = worker.conn.poll(
+                        None if deadline is None else deadline + KILL_GRACE)
+                if answered:
+                    (ok, value), retire = worker.conn.recv()
+            except (EOFError, IOError):
+                logging.warning('worker %d died' % worker.process.pid)
+                worker.kill()
+                worker = self._start()
+                raise Unparseable('worker died extracting %s' % url)
+            if not answered:
+                logging.warning('killing worker %d: deadline exceeded' %
+                        worker.process.pid)
+                worker.kill()
+                worker = self._start()
+                raise DeadlineExceeded(
+                        'no summary of %s within %s seconds' % (url, deadline))
+            if retire:
+                logging.debug('recycling worker %d' % worker.process.pid)
+                worker.stop()
+                worker = self._start()
+        finally:
+            self._idle.put(worker)
+        if not ok:
+            raise Unparseable(value)
+        return value
+
+    def close(self):
+        for i in range(self.size):
+            self._idle.get().stop()
+
+def summary_to_dict(summary):
+    return {
+            'confidence': summary.confidence,
+            'html': summary.html,
+            'text': summary.text,
+            'truncated': summary.truncated
+            }
+
+class ExtractionHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def address_string(self):
+        if isinstance(self.client_address, tuple):
+            return self.client_address[0]
+        # Unix sockets have no client address.
+        return 'local'
+
+    def log_message(self, format, *args):
+        logging.info('%s %s' % (self.address_string(), format % args))
+
+    def send_json(self, code, data):
+        body = json.dumps(data)
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        parts = urlparse.urlsplit(self.path)
+        if parts.path != '/summary':
+            self.send_error(404)
+            return
+        params = dict(urlparse.parse_qsl(parts.query))
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            deadline = float(params.get('deadline', self.server.deadline))
+        except ValueError:
+            self.send_error(400)
+            return
+        if length < 0:
+            self.send_error(400)
+            return
+        if length > self.server.max_body:
+            # The body is never read, so the connection can't be reused.
+            self.close_connection = 1
+            self.send_json(413, {'error': 'the page is longer than %d bytes' %
+                self.server.max_body})
+            return
+        page = self.rfile.read(length)
+        try:
+            summary = self.server.pool.extract(
+                    params.get('url'),
+                    page,
+                    params.get('output', 'html'),
+                    deadline
+                    )
+        except DeadlineExceeded as e:
+            self.send_json(504, {'error': str(e)})
+            return
+        except Unparseable as e:
+            self.send_json(422, {'error': str(e)})
+            return
+        self.send_json(200, summary_to_dict(summary))
+
+class HTTPExtractionServer(SocketServer.ThreadingMixIn,
+        BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+class UnixExtractionServer(SocketServer.ThreadingMixIn,
+        SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+def make_server(pool, port = None, socket_path = None,
+        deadline = DEFAULT_DEADLINE, max_body = DEFAULT_MAX_BODY):
+    '''
+    Returns a server that extracts with pool, listening on socket_path if
+    it is given and on localhost:port otherwise.  Requests with bodies
+    longer than max_body bytes are refused.
+    '''
+    if socket_path is not None:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = UnixExtractionServer(socket_path, ExtractionHandler)
+    else:
+        server = HTTPExtractionServer(('127.0.0.1', port), ExtractionHandler)
+    server.pool = pool
+    server.deadline = deadline
+    server.max_body = max_body
+    return server
+
+DESCRIPTION = 'Serve article extraction requests from warm worker processes.'
+
+def main():
+    parser = argparse.ArgumentParser(description = DESCRIPTION)
+    parser.add_argument(
+            '--port',
+            type = int,
+            default = 8000,
+            help = 'the localhost port to listen on (default: %(default)s)'
+            )
+    parser.add_argument(
+            '--socket',
+            help = 'a Unix socket to listen on instead of a port'
+            )
+    parser.add_argument(
+            '--workers',
+            type = int,
+            help = 'the number of worker processes (default: one per CPU)'
+            )
+    parser.add_argument(
+            '--max-tasks',
+            type = int,
+            help = 'recycle a worker after this many extractions'
+            )
+    parser.add_argument(
+            '--max-rss',
+            type = int,
+            help = 'recycle a worker once it uses this many megabytes'
+            )
+    parser.add_argument(
+            '--deadline',
+            type = float,
+            default = DEFAULT_DEADLINE,
+            help = 'the default per-request deadline in seconds '
+                '(default: %(default)s)'
+            )
+    parser.add_argument(
+            '--max-body',
+            type = int,
+            default = DEFAULT_MAX_BODY // (1024 * 1024),
+            help = 'refuse pages longer than this many megabytes '
+                '(default: %(default)s)'
+            )
+    parser.add_argument(
+            '--site-rules',
+            help = 'a site rules file (see rules.py)'
+            )
+    parser.add_argument(
+            '--template-cache',
+            help = 'a template cache file (see templates.py)'
+            )
+    parser.add_argument(
+            '--capture-dir',
+            help = 'save slow pages as regression test cases here '
+                '(see capture.py)'
+            )
+    parser.add_argument(
+            '--capture-time',
+            type = float,
+            help = 'capture pages that take longer than this many seconds'
+            )
+    parser.add_argument(
+            '--capture-rss',
+            type = int,
+            help = 'capture pages that grow a worker by this many megabytes'
+            )
+    parser.add_argument(
+            '-v',
+            '--verbose',
+            action = 'store_true',
+            help = 'log debugging messages'
+            )
+    args = parser.parse_args()
+    if args.verbose:
+        logging.basicConfig(level = logging.DEBUG)
+    else:
+        logging.basicConfig(level = logging.INFO)
+    options = {}
+    if args.site_rules:
+        options['site_rules'] = args.site_rules
+    if args.template_cache:
+        options['template_cache'] = args.template_cache
+    if args.capture_dir:
+        options['capture_dir'] = args.capture_dir
+        options['capture_time'] = args.capture_time
+        if args.capture_rss:
+            options['capture_rss'] = args.capture_rss * 1024 * 1024
+    pool = WorkerPool(
+            args.workers,
+            args.max_tasks,
+            args.max_rss and args.max_rss * 1024 * 1024,
+            **options
+            )
+    server = make_server(
+            pool,
+            args.port,
+            args.socket,
+            args.deadline,
+            args.max_body * 1024 * 1024
+            )
+    logging.info('serving on %s' % (args.socket or 'localhost:%d' % args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pool.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+from batch_test import make_page
+from readability import Document, Unparseable
+from server import *
+import httplib
+import json
+import logging
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+class SlowTemplates(object):
+    '''
+    A template cache that takes delay seconds to look anything up.
+    '''
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    def get(self, host):
+        time.sleep(self.delay)
+        return None
+
+class UnixHTTPConnection(httplib.HTTPConnection):
+
+    def __init__(self, path):
+        httplib.HTTPConnection.__init__(self, 'localhost')
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+
+class TestWorkerPool(unittest.TestCase):
+
+    def setUp(self):
+        self.page = make_page('served')
+        self.pool = None
+
+    def tearDown(self):
+        if self.pool is not None:
+            self.pool.close()
+
+    def _pids(self):
+        pids = []
+        for i in range(self.pool.size):
+            worker = self.pool._idle.get()
+            pids.append(worker.process.pid)
+            self.pool._idle.put(worker)
+        return pids
+
+    def test_extract(self):
+        self.pool = WorkerPool(2)
+        url = 'http://example.com/'
+        for output in ['html', 'text']:
+            expected = Document(self.page, url = url).summary(output)
+            actual = self.pool.extract(url, self.page, output)
+            self.assertEqual(expected.html, actual.html)
+            self.assertEqual(expected.text, actual.text)
+        self.assertRaises(Unparseable, self.pool.extract, url, '')
+
+    def test_max_tasks(self):
+        self.pool = WorkerPool(1, max_tasks = 2)
+        first = self._pids()
+        self.pool.extract(None, self.page)
+        self.assertEqual(first, self._pids())
+        self.pool.extract(None, self.page)
+        self.assertNotEqual(first, self._pids())
+
+    def test_max_rss(self):
+        self.pool = WorkerPool(1, max_rss = 1)
+        first = self._pids()
+        self.pool.extract(None, self.page)
+        self.assertNotEqual(first, self._pids())
+
+    def test_deadline(self):
+        self.pool = WorkerPool(1, template_cache = SlowTemplates(10))
+        first = self._pids()
+        self.assertRaises(
+                DeadlineExceeded,
+                self.pool.extract,
+                'http://example.com/',
+                self.page,
+                deadline = 0.1
+                )
+        self.assertNotEqual(first, self._pids())
+        # The replacement worker still extracts.
+        summary = self.pool.extract(None, self.page)
+        self.assertTrue(summary.html)
+
+class TestServer(unittest.TestCase):
+
+    def setUp(self):
+        self.page = make_page('served')
+        self.pool = WorkerPool(1)
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.pool.close()
+        shutil.rmtree(self.dir)
+
+    def _serve(self, server):
+        thread = threading.Thread(target = server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def _post(self, conn, path, body):
+        conn.request('POST', path, body)
+        response = conn.getresponse()
+        return response.status, json.loads(response.read())
+
+    def _check(self, conn):
+        url = 'http://example.com/a'
+        status, data = self._post(
+                conn,
+                '/summary?url=%s&output=text' % url,
+                self.page
+                )
+        self.assertEqual(200, status)
+        expected = Document(self.page, url = url).summary('text')
+        self.assertEqual(expected.text, data['text'])
+        self.assertEqual(expected.confidence, data['confidence'])
+        self.assertEqual(False, data['truncated'])
+        status, data = self._post(conn, '/summary', '')
+        self.assertEqual(422, status)
+
+    def test_http(self):
+        server = make_server(self.pool, port = 0)
+        thread = self._serve(server)
+        try:
+            self._check(httplib.HTTPConnection('127.0.0.1', server.server_port))
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+    def test_unix_socket(self):
+        path = os.path.join(self.dir, 'socket')
+        server = make_server(self.pool, socket_path = path)
+        thread = self._serve(server)
+        try:
+            self._check(UnixHTTPConnection(path))
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+    def test_max_body(self):
+        server = make_server(self.pool, port = 0, max_body = 100)
+        thread = self._serve(server)
+        try:
+            conn = httplib.HTTPConnection('127.0.0.1', server.server_port)
+            status, data = self._post(conn, '/summary', self.page)
+            self.assertEqual(413, status)
+            status, data = self._post(conn, '/summary', ' ' * 100)
+            self.assertEqual(422, status)
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--debug':
+        del sys.argv[1]
+        logging.basicConfig(level = logging.DEBUG)
+    else:
+        logging.basicConfig(level = logging.INFO)
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""
+This module saves parsed documents as compact snapshots.
+
+Parsing a page means detecting its encoding, building the tree and cleaning
+it (see htmls.parse).  A snapshot holds the result of all that, so that
+extraction can be rerun, for instance with different options, without
+parsing the page again:
+
+    snapshot = make_snapshot(page, url)
+    Document.from_snapshot(snapshot).summary()
+
+Snapshots are only loaded through Document.from_snapshot, never detected
+in Document's input, since pages come from untrusted clients.  A snapshot
+is JSON, compressed, and is never decompressed past MAX_SNAPSHOT_SIZE
+bytes.  It is stored in one of two forms.  If the parsed
+tree, serialized as UTF-8 HTML, parses back into exactly the same tree, the
+snapshot holds that HTML, which lxml reloads very quickly.  Otherwise it
+holds a table of the tree's nodes, which is rebuilt node by node.  Either
+way, the loaded tree is identical to the one parse returns.
+"""
+
+from htmls import parse, utf8_parser
+from lxml import etree
+import json
+import lxml.html
+import zlib
+
+SNAPSHOT_MAGIC = 'readability-snapshot\x00'
+SNAPSHOT_VERSION = 2
+
+# The largest snapshot, decompressed, that is loaded.
+MAX_SNAPSHOT_SIZE = 64 << 20
+
+HTML_FORM = 'html'
+TABLE_FORM = 'table'
+
+def node_signature(doc):
+    return [
+            (e.tag, e.attrib.items(), e.text, e.tail)
+            for e in doc.iter()
+            ]
+
+def node_table(doc):
+    '''
+    Returns the tree rooted at doc as parallel lists of tags, attributes,
+    texts, tails and child counts, in pre-order.
+    '''
+    tags = []
+    attrs = []
+    texts = []
+    tails = []
+    counts = []
+    for e in doc.iter():
+        tags.append(e.tag)
+        attrs.append(tuple(e.attrib.items()) or None)
+        texts.append(e.text)
+        tails.append(e.tail)
+        counts.append(len(e))
+    return tags, attrs, texts, tails, counts
+
+def set_attributes(elem, attrs):
+    # Set one at a time to keep their order.
+    if attrs:
+        for name, value in attrs:
+            elem.set(name, value)
+
+def build_from_table(table):
+    tags, attrs, texts, tails, counts = table
+    root = utf8_parser().makeelement(tags[0])
+    set_attributes(root, attrs[0])
+    root.text = texts[0]
+    # Each entry holds an element and the number of its children still to
+    # be added.
+    stack = [[root, counts[0]]]
+    for i in xrange(1, len(tags)):
+        top = stack[-1]
+        e = etree.SubElement(top[0], tags[i])
+        set_attributes(e, attrs[i])
+        if texts[i] is not None:
+            e.text = texts[i]
+        if tails[i] is not None:
+            e.tail = tails[i]
+        top[1] -= 1
+        if counts[i]:
+            stack.append([e, counts[i]])
+        else:
+            while stack and not stack[-1][1]:
+                stack.pop()
+    return root
+
+def snapshot_doc(doc, url = None):
+    '''
+    Returns a snapshot of doc, which must be a tree returned by
+    htmls.parse.  url is stored with it as the default for Document's 'url'
+    option.
+    '''
+    html = etree.tostring(doc, encoding = 'utf-8', method = 'html')
+    reloaded = lxml.html.document_fromstring(html, parser = utf8_parser())
+    if node_signature(reloaded) == node_signature(doc):
+        form, data = HTML_FORM, html
+    else:
+        form, data = TABLE_FORM, node_table(doc)
+    if form == HTML_FORM:
+        data = data.decode('utf-8')
+    payload = json.dumps({
+            'version': SNAPSHOT_VERSION,
+            'url': url,
+            'form': form,
+            'data': data
+            })
+    return SNAPSHOT_MAGIC + zlib.compress(payload)
+
+def make_snapshot(input, url = None):
+    '''
+    Parses input as Document would and returns a snapshot of the result.
+    '''
+    return snapshot_doc(parse(input, url), url)
+
+def decompress(data, max_size):
+    decompressor = zlib.decompressobj()
+    payload = decompressor.decompress(data, max_size)
+    if decompressor.unconsumed_tail:
+        raise ValueError('snapshot larger than %d bytes' % max_size)
+    return payload + decompressor.flush()
+
+def read_snapshot(snapshot, max_size = MAX_SNAPSHOT_SIZE):
+    '''
+    Returns the URL, form and data held by snapshot.  Raises ValueError if
+    it isn't a snapshot of this version, or decompresses to more than
+    max_size bytes.
+    '''
+    if not isinstance(snapshot, str) or not snapshot.startswith(SNAPSHOT_MAGIC):
+        raise ValueError('not a snapshot')
+    payload = decompress(snapshot[len(SNAPSHOT_MAGIC):], max_size)
+    fields = json.loads(payload)
+    if not isinstance(fields, dict) or fields.get('version') != SNAPSHOT_VERSION:
+        raise ValueError('unsupported snapshot version')
+    form = fields.get('form')
+    if form not in (HTML_FORM, TABLE_FORM):
+        raise ValueError('unknown snapshot form: %r' % form)
+    return fields.get('url'), form, fields.get('data')
+
+def snapshot_url(snapshot):
+    return read_snapshot(snapshot)[0]
+
+def load_snapshot(snapshot):
+    '''
+    Returns the parsed document held by snapshot.
+    '''
+    url, form, data = read_snapshot(snapshot)
+    if form == HTML_FORM:
+        doc = lxml.html.document_fromstring(
+                data.encode('utf-8'),
+                parser = utf8_parser()
+                )
+    else:
+        doc = build_from_table(data)
+    if url:
+        # As htmls.parse does, so that links are made absolute against it.
+        doc.getroottree().docinfo.URL = url
+    return doc
@@ -0,0 +1,88 @@
+from lxml.html import builder as B
+from lxml.html import tostring
+from readability import Document
+from snapshot import *
+import json
+import logging
+import sys
+import unittest
+import zlib
+
+PARAGRAPH = ('Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed '
+        'do eiusmod tempor incididunt ut labore et dolore magna aliqua. ')
+
+PAGE = tostring(B.HTML(
+    B.HEAD(B.TITLE('Snapshot test page')),
+    B.BODY(
+        B.DIV(B.A('home', href = 'home.html'), {'id': 'nav'}),
+        B.DIV(
+            B.P(PARAGRAPH * 3, {'class': 'first', 'id': 'p1'}),
+            B.P(PARAGRAPH * 2),
+            {'id': 'article'}
+            )
+        )
+    ))
+
+class TestSnapshot(unittest.TestCase):
+
+    def _form(self, snapshot):
+        return read_snapshot(snapshot)[1]
+
+    def test_html_form(self):
+        doc = parse(PAGE, 'http://example.com/a/')
+        snapshot = snapshot_doc(doc)
+        self.assertEqual(HTML_FORM, self._form(snapshot))
+        self.assertEqual(node_signature(doc), node_signature(load_snapshot(snapshot)))
+
+    def test_table_form(self):
+        # Text after </body> is moved into the body when the HTML is parsed
+        # again.
+        doc = B.HTML(
+                B.BODY(B.P('one', B.SPAN('two', {'b': '1', 'a': '2'}), 'three')),
+                'four'
+                )
+        snapshot = snapshot_doc(doc)
+        self.assertEqual(TABLE_FORM, self._form(snapshot))
+        self.assertEqual(node_signature(doc), node_signature(load_snapshot(snapshot)))
+
+    def test_document(self):
+        url = 'http://example.com/a/'
+        snapshot = make_snapshot(PAGE, url)
+        expected = Document(PAGE, url = url)
+        doc = Document.from_snapshot(snapshot)
+        self.assertEqual(url, doc.options['url'])
+        self.assertEqual(expected.summary().html, doc.summary().html)
+        self.assertEqual(expected.title(), doc.title())
+        self.assertTrue('http://example.com/a/home.html' in doc.content())
+
+    def test_input_not_detected(self):
+        # Input that looks like a snapshot is still taken for a page.
+        doc = Document(make_snapshot(PAGE, 'http://example.com/a/'))
+        self.assertEqual(None, doc.options['url'])
+        self.assertEqual('', doc.title())
+
+    def test_version(self):
+        payload = json.dumps({
+                'version': SNAPSHOT_VERSION + 1,
+                'url': None,
+                'form': HTML_FORM,
+                'data': ''
+                })
+        snapshot = SNAPSHOT_MAGIC + zlib.compress(payload)
+        self.assertRaises(ValueError, load_snapshot, snapshot)
+        self.assertRaises(ValueError, load_snapshot, PAGE)
+
+    def test_size_limit(self):
+        snapshot = SNAPSHOT_MAGIC + zlib.compress(' ' * 1000)
+        self.assertRaises(ValueError, read_snapshot, snapshot, 100)
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--debug':
+        del sys.argv[1]
+        logging.basicConfig(level = logging.DEBUG)
+    else:
+        logging.basicConfig(level = logging.INFO)
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+"""
+This module implements per-site extraction templates.
+
+Many sites put every article in the same container, such as
+<div id="articleBody">.  After a page from such a site has been scored, a
+Template records where the winning candidate was: its path in the
+preprocessed document and its tag, class and id.  Later pages from the same
+host look for an element with that path and signature first, and if it holds
+enough text, it is used as the best candidate and only the tree under its
+parent is scored.  Otherwise the whole page is scored as usual and the
+template is replaced.
+
+Templates are kept in a TemplateCache, which is saved as a JSON file so that
+it lasts across restarts.  Pass the file's path, or a TemplateCache, as the
+'template_cache' option; templates are only used for documents with a 'url'.
+
+Changes are saved at most every SAVE_INTERVAL seconds, and when the cache is
+closed, which happens at exit.  Processes that exit without running atexit
+handlers, such as multiprocessing workers, should call
+close_template_caches() first.
+"""
+
+from htmls import clean_length
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import urlparse
+
+# A template only matches if its element has at least this fraction of the
+# text it had when the template was learned.
+MIN_TEXT_RATIO = 0.2
+
+# The least time between two saves of a cache, in seconds.
+SAVE_INTERVAL = 10.0
+
+class Template(object):
+
+    def __init__(self, path, tag, class_, id, text_length):
+        self.path = path
+        self.tag = tag
+        self.class_ = class_
+        self.id = id
+        self.text_length = text_length
+
+    def to_dict(self):
+        return {
+            'path': self.path,
+            'tag': self.tag,
+            'class': self.class_,
+            'id': self.id,
+            'text_length': self.text_length,
+            }
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(
+                d['path'],
+                d['tag'],
+                d['class'],
+                d['id'],
+                d['text_length']
+                )
+
+    def matches(self, elem):
+        return (elem.tag == self.tag and
+                elem.get('class') == self.class_ and
+                elem.get('id') == self.id)
+
+    def find(self, doc, min_length):
+        '''
+        Returns the element of doc that this template points to, or None if
+        there is none or it holds too little text.
+        '''
+        elems = doc.xpath(self.path)
+        if not elems and self.id is not None:
+            # The container may have moved, but ids rarely change.
+            elems = doc.xpath('//*[@id=$id]', id = self.id)
+        for elem in elems:
+            if not self.matches(elem):
+                continue
+            length = clean_length(elem.text_content())
+            if length >= min_length and length >= self.text_length * MIN_TEXT_RATIO:
+                return elem
+        return None
+
+def make_template(elem):
+    return Template(
+            elem.getroottree().getpath(elem),
+            elem.tag,
+            elem.get('class'),
+            elem.get('id'),
+            clean_length(elem.text_content())
+            )
+
+class TemplateCache(object):
+    '''
+    Holds a Template for each host.  If path is given, templates are loaded
+    from it, and changes are saved back to it at most every save_interval
+    seconds, and by close().
+    '''
+
+    def __init__(self, path = None, save_interval = SAVE_INTERVAL):
+        self.path = path
+        self.save_interval = save_interval
+        self.templates = {}
+        self._changed = False
+        self._last_save = time.time()
+        # Held while saving, so that concurrent saves from several threads
+        # are written in turn and the last one holds every template.
+        self._save_lock = threading.Lock()
+        if path is not None:
+            if os.path.exists(path):
+                with open(path, 'r') as f:
+                    data = json.load(f)
+                for host, d in data.items():
+                    self.templates[host] = Template.from_dict(d)
+            atexit.register(self.close)
+
+    def get(self, host):
+        return self.templates.get(host)
+
+    def record(self, host, template):
+        old = self.templates.get(host)
+        if old is not None and old.to_dict() == template.to_dict():
+            return
+        logging.debug('learned template for %s: %s' % (host, template.path))
+        self.templates[host] = template
+        self.changed()
+
+    def discard(self, host):
+        if self.templates.pop(host, None) is not None:
+            logging.debug('discarded template for %s' % host)
+            self.changed()
+
+    def changed(self):
+        '''
+        Saves the templates if the last save was long enough ago.  Extraction
+        never waits for a save from another thread.
+        '''
+        self._changed = True
+        if self.path is None:
+            return
+        if time.time() - self._last_save < self.save_interval:
+            return
+        if not self._save_lock.acquire(False):
+            return
+        try:
+            self._write()
+        finally:
+            self._save_lock.release()
+
+    def save(self):
+        if self.path is None:
+            return
+        with self._save_lock:
+            self._write()
+
+    def close(self):
+        '''
+        Saves any changes that haven't been saved yet.
+        '''
+        if self._changed:
+            self.save()
+
+    def _write(self):
+        import tempfile
+        # Cleared first, so that changes made while writing are saved next
+        # time.
+        self._changed = False
+        self._last_save = time.time()
+        data = dict(
+                (host, t.to_dict())
+                for host, t in self.templates.items()
+                )
+        # Write to a temporary file first so that a crash never leaves a
+        # partly written cache behind.
+        fd, tmp_path = tempfile.mkstemp(
+                dir = os.path.dirname(os.path.abspath(self.path)))
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.rename(tmp_path, self.path)
+
+_loaded_template_caches = {}
+_loaded_template_caches_lock = threading.Lock()
+
+def get_template_cache(options):
+    '''
+    Returns the TemplateCache given by the options, or None.
+    '''
+    cache = options['template_cache']
+    if isinstance(cache, basestring):
+        # Threads must share one TemplateCache per file, or they would
+        # overwrite each other's templates when saving.
+        with _loaded_template_caches_lock:
+            if cache not in _loaded_template_caches:
+                _loaded_template_caches[cache] = TemplateCache(cache)
+            cache = _loaded_template_caches[cache]
+    return cache
+
+def close_template_caches():
+    '''
+    Closes the TemplateCaches that get_template_cache loaded.
+    '''
+    with _loaded_template_caches_lock:
+        caches = _loaded_template_caches.values()
+    for cache in caches:
+        cache.close()
+
+def url_host(url):
+    if url is None:
+        return None
+    return urlparse.urlsplit(url).hostname
@@ -0,0 +1,109 @@
+from lxml.html import builder as B
+from lxml.html import tostring
+from readability import Document
+from templates import *
+import logging
+import readability
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+PARAGRAPH = ('Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed '
+        'do eiusmod tempor incididunt ut labore et dolore magna aliqua. ')
+
+def make_page(heading, container_id = 'articleBody'):
+    return tostring(B.HTML(B.BODY(
+        B.DIV(B.A('home', href = '/'), B.A('about', href = '/about'),
+            {'id': 'nav'}),
+        B.DIV(
+            B.H2(heading),
+            B.P(heading + ', ' + PARAGRAPH * 3),
+            B.P(PARAGRAPH * 2),
+            B.P(PARAGRAPH * 4),
+            {'id': container_id}
+            )
+        )))
+
+class TestTemplates(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'templates.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _summary(self, page, url, cache):
+        return Document(page, url = url, template_cache = cache).summary()
+
+    def test_learn_and_reuse(self):
+        cache = TemplateCache()
+        first = make_page('first')
+        self._summary(first, 'http://www.example.com/1', cache)
+        template = cache.get('www.example.com')
+        self.assertEqual('articleBody', template.id)
+
+        second = make_page('second')
+        expected = Document(second, url = 'http://www.example.com/2').summary()
+        # With the template, only the tree under the container's parent is
+        # scored.
+        scored = []
+        score_paragraphs = readability.score_paragraphs
+        def spy(elem, options, budget):
+            scored.append(elem.tag)
+            return score_paragraphs(elem, options, budget)
+        readability.score_paragraphs = spy
+        try:
+            summary = self._summary(second, 'http://www.example.com/2', cache)
+        finally:
+            readability.score_paragraphs = score_paragraphs
+        self.assertEqual(['body'], scored)
+        self.assertEqual(expected.html, summary.html)
+        self.assertEqual(expected.confidence, summary.confidence)
+
+    def test_mismatch(self):
+        cache = TemplateCache()
+        self._summary(make_page('first'), 'http://example.com/1', cache)
+        summary = self._summary(
+                make_page('second', 'story'),
+                'http://example.com/2',
+                cache
+                )
+        self.assertTrue('second' in summary.html)
+        self.assertEqual('story', cache.get('example.com').id)
+
+    def test_persist(self):
+        cache = TemplateCache(self.path)
+        self._summary(make_page('first'), 'http://example.com/1', cache)
+        # Not saved yet, since the cache was only just loaded.
+        self.assertFalse(os.path.exists(self.path))
+        cache.close()
+        reloaded = TemplateCache(self.path)
+        self.assertEqual(
+                cache.get('example.com').to_dict(),
+                reloaded.get('example.com').to_dict()
+                )
+
+    def test_save_interval(self):
+        cache = TemplateCache(self.path, save_interval = 0)
+        self._summary(make_page('first'), 'http://example.com/1', cache)
+        reloaded = TemplateCache(self.path)
+        self.assertEqual('articleBody', reloaded.get('example.com').id)
+
+    def test_no_url(self):
+        cache = TemplateCache()
+        Document(make_page('first'), template_cache = cache).summary()
+        self.assertEqual({}, cache.templates)
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--debug':
+        del sys.argv[1]
+        logging.basicConfig(level = logging.DEBUG)
+    else:
+        logging.basicConfig(level = logging.INFO)
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,41 @@
+import hashlib
 import logging
 import os.path
+import posixpath
 import re
-import subprocess
 import sys
-import urllib2
+import urllib
 import urlparse
-import wget_parser
 
 HTML_RE = re.compile(r'\.[Hh][Tt][Mm][Ll]?$')
 
+# The number of requisites that LocalCopyUrlFetch fetches at once, and how
+# long it waits for each, in seconds.
+FETCH_THREADS = 8
+FETCH_TIMEOUT = 30
+
+# Longer file names are shortened (see shorten_name), since most file systems
+# reject names over 255 bytes.
+MAX_NAME_LENGTH = 200
+
+# The directory for resources whose URLs have no host.
+NO_HOST = 'no-host'
+
+HTML_TYPES = ['text/html', 'application/xhtml+xml']
+CSS_TYPE = 'text/css'
+
+# The elements whose src is a requisite.  Frames are fetched too, along
+# with their own requisites.
+REQUISITE_SRC_TAGS = [
+        'audio', 'embed', 'frame', 'iframe', 'img', 'input', 'script',
+        'source', 'video'
+        ]
+
+CSS_URL_RE = re.compile(
+        r'''url\(\s*['"]?([^'")\s]+)['"]?\s*\)|@import\s+['"]([^'"]+)['"]''',
+        re.I
+        )
+
 class UrlFetch():
     """
     A class for fetching URLs.  This provides a layer of abstraction that can
@@ -16,6 +43,7 @@ class UrlFetch():
     """
 
     def urlread(self, url):
+        import urllib2
         return urllib2.urlopen(url).read()
 
 class MockUrlFetch(UrlFetch):
@@ -30,35 +58,74 @@ class MockUrlFetch(UrlFetch):
             return f.read()
 
 class LocalCopyUrlFetch(UrlFetch):
+    """
+    Fetches pages along with their requisites, the images, scripts and
+    style sheets needed to display them, and saves them all under base_path.
+    Files are laid out as wget --page-requisites --adjust-extension would
+    lay them out (see local_path), and url_map is updated to map each URL
+    fetched to its file.  Requisites are fetched concurrently, by up to
+    threads threads.
+    """
 
-    def __init__(self, base_path, url_map):
+    def __init__(self, base_path, url_map, threads = FETCH_THREADS,
+            timeout = FETCH_TIMEOUT):
         self._base_path = base_path
         self._url_map = url_map
+        self._threads = threads
+        self._timeout = timeout
+
+    def _fetch(self, url):
+        import urllib2
+        try:
+            response = urllib2.urlopen(url, timeout = self._timeout)
+            try:
+                return response.geturl(), response.info().gettype(), response.read()
+            finally:
+                response.close()
+        except Exception as e:
+            logging.warning('could not fetch %s: %s' % (url, e))
+            return None
+
+    def _save(self, url, final_url, content_type, data):
+        rel_path = local_path(final_url, content_type)
+        path = os.path.join(self._base_path, rel_path)
+        try:
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'wb') as f:
+                f.write(data)
+        except (IOError, OSError) as e:
+            logging.warning('could not save %s: %s' % (url, e))
+            return False
+        self._url_map[url] = rel_path
+        self._url_map[final_url] = rel_path
+        return True
 
     def urlread(self, url):
-        if subprocess.call('which wget', shell = True) != 0:
-            raise Exception('wget required but not found on PATH')
-
-        argv = [
-                'wget',
-                '--adjust-extension',
-                '--span-hosts',
-                '--page-requisites',
-                url
-                ]
+        from multiprocessing.pool import ThreadPool
+        seen = set([url])
+        pending = [url]
+        pool = ThreadPool(self._threads)
         try:
-            output = subprocess.check_output(
-                    argv,
-                    cwd = self._base_path,
-                    stderr = subprocess.STDOUT
-                    )
-        except subprocess.CalledProcessError as e:
-            # TODO: Log this instead of just printing it.
-            output = e.output
-            print('wget exited with non-zero code: %d' % e.returncode)
-
-        parser = wget_parser.WgetParser(self._url_map)
-        parser.parse(output)
+            # Each round fetches what the previous one found, such as the
+            # images named by a style sheet that the page links to.
+            while pending:
+                results = pool.map(self._fetch, pending)
+                found = []
+                for pending_url, result in zip(pending, results):
+                    if result is None:
+                        continue
+                    final_url, content_type, data = result
+                    if not self._save(pending_url, final_url, content_type, data):
+                        continue
+                    for requisite in find_requisites(final_url, content_type, data):
+                        if requisite not in seen and requisite not in self._url_map:
+                            seen.add(requisite)
+                            found.append(requisite)
+                pending = found
+        finally:
+            pool.close()
+            pool.join()
 
         if url not in self._url_map:
             raise Exception('%s was not successfully fetched' % url)
@@ -67,6 +134,89 @@ class LocalCopyUrlFetch(UrlFetch):
         with open(path, 'r') as f:
             return f.read()
 
+def shorten_name(name):
+    '''
+    Shortens names too long for most file systems, keeping them unique.
+    '''
+    if len(name) <= MAX_NAME_LENGTH:
+        return name
+    digest = hashlib.md5(name).hexdigest()[:8]
+    return name[:MAX_NAME_LENGTH - len(digest) - 1] + '-' + digest
+
+def local_path(url, content_type = None):
+    '''
+    Returns the path, relative to the base path, where the resource at url
+    is saved: its host, then its unquoted path and query.  A path ending in
+    / gets index.html, and HTML and CSS get an .html or .css extension if
+    they have none.  The path never leads outside the base path, whatever
+    the host or path.
+    '''
+    if isinstance(url, unicode):
+        url = url.encode('utf-8')
+    parts = urlparse.urlsplit(url)
+    host = (parts.hostname or '').lower()
+    # Keep the host a single directory inside the base path.
+    host = host.replace('/', '%2F').replace('\\', '%5C')
+    if not host.strip('.'):
+        host = host.replace('.', '%2E') or NO_HOST
+    if parts.port is not None:
+        host += ':%d' % parts.port
+    path = urllib.unquote(parts.path)
+    if not path or path.endswith('/'):
+        path += 'index.html'
+    # Keep the file inside its host's directory.
+    path = posixpath.normpath('/' + path).lstrip('/')
+    if parts.query:
+        path += '?' + urllib.unquote(parts.query).replace('/', '%2F')
+    rel_path = '/'.join(shorten_name(name) for name in [host] + path.split('/'))
+    if content_type in HTML_TYPES:
+        rel_path = adjust_extension(rel_path)
+    elif content_type == CSS_TYPE and not rel_path.endswith('.css'):
+        rel_path += '.css'
+    return rel_path
+
+def is_requisite(elem, attrib):
+    if attrib is None or attrib in ['style', 'background']:
+        # Links in CSS, and background images.
+        return True
+    if attrib == 'src':
+        return elem.tag in REQUISITE_SRC_TAGS
+    if attrib == 'href' and elem.tag == 'link':
+        rel = (elem.get('rel') or '').lower().split()
+        return 'stylesheet' in rel or 'icon' in rel
+    return False
+
+def find_requisites(url, content_type, data):
+    '''
+    Returns the URLs of the requisites of the page or style sheet at url.
+    '''
+    if content_type in HTML_TYPES:
+        from htmls import build_doc
+        try:
+            doc = build_doc(data)
+        except Exception as e:
+            logging.warning('could not parse %s: %s' % (url, e))
+            return []
+        doc.make_links_absolute(url, resolve_base_href = True)
+        links = [
+                link
+                for elem, attrib, link, pos in doc.iterlinks()
+                if is_requisite(elem, attrib)
+                ]
+    elif content_type == CSS_TYPE:
+        links = [
+                urlparse.urljoin(url, m.group(1) or m.group(2))
+                for m in CSS_URL_RE.finditer(data)
+                ]
+    else:
+        return []
+    requisites = []
+    for link in links:
+        link = urlparse.urldefrag(link)[0]
+        if urlparse.urlsplit(link).scheme in ['http', 'https']:
+            requisites.append(link)
+    return requisites
+
 def adjust_extension(path):
     if not HTML_RE.search(path):
         return path + '.html'
@@ -0,0 +1,158 @@
+from urlfetch import *
+import BaseHTTPServer
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+PAGE = '''<html><head>
+<link rel="stylesheet" href="/css/site.css">
+<link rel="alternate" href="/feed">
+<script src="app.js"></script>
+<style>@import "print.css";</style>
+</head><body>
+<img src="images/a.png"><img src="images/a.png#again">
+<div style="background: url('/images/bg.png')">
+<a href="/other.html">not a requisite</a>
+<img src="/missing.png">
+</div></body></html>'''
+
+# Each path served, with its content type and body.  Paths whose body is
+# None redirect to the path given as the content type.
+RESOURCES = {
+        '/articles/story': ('text/html', PAGE),
+        '/articles/app.js': ('application/javascript', 'var x;'),
+        '/articles/print.css': ('text/css', 'p {}'),
+        '/articles/images/a.png': ('image/png', 'PNG a'),
+        '/css/site.css': ('text/css', 'body { background: url(../images/c.png) }'),
+        '/images/bg.png': ('image/png', 'PNG bg'),
+        '/images/moved.png': ('image/png', 'PNG moved'),
+        '/images/c.png': ('/images/moved.png', None),
+        }
+
+class ResourceHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path not in RESOURCES:
+            self.send_error(404)
+            return
+        content_type, body = RESOURCES[self.path]
+        if body is None:
+            self.send_response(302)
+            self.send_header('Location', content_type)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class TestLocalPath(unittest.TestCase):
+
+    def test_paths(self):
+        self.assertEqual(
+                'example.com/a/b.png',
+                local_path('http://Example.com/a/b.png', 'image/png'))
+        self.assertEqual(
+                'example.com:8080/index.html',
+                local_path('http://example.com:8080', 'text/html'))
+        self.assertEqual(
+                'example.com/a/index.html',
+                local_path('http://example.com/a/', 'text/html'))
+        self.assertEqual(
+                'example.com/story.html',
+                local_path('http://example.com/story', 'text/html'))
+        self.assertEqual(
+                'example.com/s.css?v=1.css',
+                local_path('http://example.com/s.css?v=1', 'text/css'))
+        self.assertEqual(
+                'example.com/b c.gif?x=a%2Fb',
+                local_path('http://example.com/b%20c.gif?x=a/b', 'image/gif'))
+        self.assertEqual(
+                'example.com/etc/passwd',
+                local_path('http://example.com/../../etc/passwd'))
+
+    def test_hosts_kept_inside(self):
+        base_path = '/base'
+        for url, expected in [
+                ('http://../x.css', '%2E%2E/x.css'),
+                ('http://./x.css', '%2E/x.css'),
+                ('http:///x.css', NO_HOST + '/x.css'),
+                ('http://a\\..\\b/x.css', 'a%5C..%5Cb/x.css')
+                ]:
+            path = local_path(url)
+            self.assertEqual(expected, path)
+            full_path = os.path.normpath(os.path.join(base_path, path))
+            self.assertTrue(full_path.startswith(base_path + '/'), url)
+
+    def test_long_names(self):
+        url = 'http://example.com/dir/' + 'x' * 300 + '.png'
+        path = local_path(url)
+        names = path.split('/')
+        self.assertEqual(['example.com', 'dir'], names[:2])
+        self.assertEqual(MAX_NAME_LENGTH, len(names[2]))
+        self.assertNotEqual(path, local_path(url + '?2'))
+
+class TestLocalCopyUrlFetch(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), ResourceHandler)
+        self.thread = threading.Thread(target = self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.host = '127.0.0.1:%d' % self.server.server_port
+        self.root = 'http://%s' % self.host
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        shutil.rmtree(self.dir)
+
+    def test_requisites(self):
+        url_map = {}
+        fetcher = LocalCopyUrlFetch(self.dir, url_map, threads = 4)
+        url = self.root + '/articles/story'
+        self.assertEqual(PAGE, fetcher.urlread(url))
+        expected = {
+                url: 'articles/story.html',
+                self.root + '/articles/app.js': 'articles/app.js',
+                self.root + '/articles/print.css': 'articles/print.css',
+                self.root + '/articles/images/a.png': 'articles/images/a.png',
+                self.root + '/css/site.css': 'css/site.css',
+                self.root + '/images/bg.png': 'images/bg.png',
+                self.root + '/images/c.png': 'images/moved.png',
+                self.root + '/images/moved.png': 'images/moved.png',
+                }
+        self.assertEqual(
+                dict((u, self.host + '/' + p) for u, p in expected.items()),
+                url_map
+                )
+        with open(os.path.join(self.dir, url_map[url]), 'rb') as f:
+            self.assertEqual(PAGE, f.read())
+        moved = url_map[self.root + '/images/c.png']
+        with open(os.path.join(self.dir, moved), 'rb') as f:
+            self.assertEqual('PNG moved', f.read())
+
+    def test_missing_page(self):
+        fetcher = LocalCopyUrlFetch(self.dir, {})
+        self.assertRaises(Exception, fetcher.urlread, self.root + '/nothing')
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--debug':
+        del sys.argv[1]
+        logging.basicConfig(level = logging.DEBUG)
+    else:
+        logging.basicConfig(level = logging.INFO)
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
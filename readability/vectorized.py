@@ -0,0 +1,168 @@
+"""
+This module implements candidate scoring over a flattened copy of the DOM.
+
+The document is flattened into arrays indexed by pre-order position (see
+htmls.node_keys): the index of each node's parent and a code for its tag.
+Paragraph scores are then scatter-added into their parents and grandparents,
+and link lengths into every ancestor of each link, so that each paragraph and
+each link is measured exactly once.  The result is the same candidates
+mapping, with the same scores, as readability.score_paragraphs.
+
+This requires NumPy, and is enabled with the 'scoring_engine' option:
+
+    Document(html, scoring_engine = 'numpy')
+"""
+
+from htmls import clean, node_keys
+from limits import out_of_time
+from rules import get_rules
+from readability import get_link_density, score_node, text_length
+import numpy as np
+
+PARAGRAPH_TAGS = ['p', 'pre', 'td']
+LINK_CODE = len(PARAGRAPH_TAGS)
+TAG_CODES = dict((tag, i) for i, tag in enumerate(PARAGRAPH_TAGS + ['a']))
+
+class FlatDoc():
+    '''
+    A flattened view of the tree rooted at doc.  nodes lists the nodes in
+    pre-order, parents holds the index of each node's parent (-1 if it is not
+    part of the tree) and tags holds each node's tag code (-1 if it is not one
+    of the tags used in scoring).  If doc has a parent, it is appended as the
+    last node so that it can still be scored as a grandparent.
+    '''
+
+    def __init__(self, doc):
+        keys = node_keys(doc)
+        nodes = [None] * len(keys)
+        for node, key in keys.items():
+            nodes[key] = node
+        outer = doc.getparent()
+        if outer is not None:
+            keys[outer] = len(nodes)
+            nodes.append(outer)
+        self.nodes = nodes
+        self.outer = outer
+        self.parents = np.array(
+                [keys.get(node.getparent(), -1) for node in nodes],
+                dtype = np.intp
+                )
+        self.parents[0] = keys.get(outer, -1)
+        if outer is not None:
+            self.parents[-1] = -1
+        self.tags = np.array(
+                [TAG_CODES.get(node.tag, -1) for node in nodes],
+                dtype = np.intp
+                )
+
+def paragraph_indexes(flat):
+    # tags() yields all the <p>s, then the <pre>s, then the <td>s, each in
+    # document order, and never the root itself.
+    indexes = np.flatnonzero(
+            (flat.tags >= 0) & (flat.tags < LINK_CODE))
+    indexes = indexes[indexes != 0]
+    if flat.outer is not None:
+        indexes = indexes[indexes != len(flat.nodes) - 1]
+    return indexes[np.lexsort((indexes, flat.tags[indexes]))]
+
+def measure_paragraphs(flat, indexes, min_text_len):
+    lengths = []
+    commas = []
+    kept = []
+    for i in indexes:
+        inner_text = clean(flat.nodes[i].text_content() or "")
+        inner_text_len = len(inner_text)
+        if inner_text_len < min_text_len:
+            continue
+        kept.append(i)
+        lengths.append(inner_text_len)
+        commas.append(inner_text.count(',') + 1)
+    return (
+            np.array(kept, dtype = np.intp),
+            np.array(lengths, dtype = np.int64),
+            np.array(commas, dtype = np.int64)
+            )
+
+def ordered_candidates(parent_idx, grand_idx):
+    # Candidates are created in the order score_paragraphs first sees them:
+    # each paragraph's parent, then its grandparent.
+    seen = np.empty(parent_idx.size * 2, dtype = np.intp)
+    seen[0::2] = parent_idx
+    seen[1::2] = grand_idx
+    seen = seen[seen >= 0]
+    unique, first = np.unique(seen, return_index = True)
+    return unique[np.argsort(first)]
+
+def link_lengths(flat):
+    '''
+    Returns an array holding, for each node, the summed text length of all of
+    the links below it, counting nested links once for each enclosing link.
+    '''
+    totals = np.zeros(len(flat.nodes))
+    links = np.flatnonzero(flat.tags == LINK_CODE)
+    values = np.array(
+            [text_length(flat.nodes[i]) for i in links],
+            dtype = np.float64
+            )
+    current = flat.parents[links]
+    while current.size:
+        has_parent = current >= 0
+        current = current[has_parent]
+        values = values[has_parent]
+        np.add.at(totals, current, values)
+        current = flat.parents[current]
+    return totals
+
+def score_paragraphs(doc, options, budget = None):
+    '''
+    Returns the same candidates as readability.score_paragraphs.  Scoring
+    runs in a few vectorized steps, so the budget is only checked before it
+    starts; if the time limit has already passed, no paragraphs are scored.
+    '''
+    if out_of_time(budget):
+        return {}
+    flat = FlatDoc(doc)
+
+    # A missing min_text_len keeps every paragraph, as it does in
+    # readability.score_paragraphs.
+    min_text_len = options['min_text_len']
+    if min_text_len is None:
+        min_text_len = -1
+
+    indexes, lengths, commas = measure_paragraphs(
+            flat,
+            paragraph_indexes(flat),
+            min_text_len
+            )
+    if not indexes.size:
+        return {}
+
+    parent_idx = flat.parents[indexes]
+    grand_idx = np.where(parent_idx >= 0, flat.parents[parent_idx], -1)
+    scores = 1 + commas + np.minimum(lengths // 100, 3)
+
+    totals = np.zeros(len(flat.nodes))
+    np.add.at(totals, parent_idx, scores)
+    has_grand = grand_idx >= 0
+    np.add.at(totals, grand_idx[has_grand], scores[has_grand] / 2.0)
+
+    ordered = ordered_candidates(parent_idx, grand_idx)
+    links = link_lengths(flat)
+
+    rules = get_rules(options)
+    candidates = {}
+    for i, total, link_length in zip(
+            ordered.tolist(),
+            totals[ordered].tolist(),
+            links[ordered].tolist()):
+        elem = flat.nodes[i]
+        candidate = score_node(elem, rules)
+        candidate.content_score += total
+        if elem is flat.outer:
+            # The parent of doc also has links outside of doc.
+            ld = get_link_density(elem)
+        else:
+            ld = link_length / max(text_length(elem), 1)
+        candidate.content_score *= (1 - ld)
+        candidates[elem] = candidate
+    return candidates
@@ -0,0 +1,186 @@
+"""
+This module packs the regression test data into a corpus that the regression
+test can stream through with bounded memory.
+
+A corpus is made of two files.  The blob file (corpus.blob) holds every file
+recorded for every test case, one after another: the original pages, the
+benchmark results and anything else in their URL maps.  The index file
+(corpus.index) holds one JSON line per test case, with its YAML spec and the
+offset and length of each of its files in the blob.  The blob is memory
+mapped, so reading a case only touches that case's files, and cases are read
+from the index one at a time.
+
+
+Packing a corpus
+----------------
+
+To pack the test cases in regression_test_data/ into corpus.index and
+corpus.blob:
+
+    $ python regression_corpus.py corpus
+
+Use --case to pack only some of the cases.
+
+
+Running the regression test on a corpus
+---------------------------------------
+
+    $ python regression_test.py --corpus corpus
+
+The output is the same as when running on regression_test_data/, except that
+resources like images are not copied into the output directory.
+"""
+from readability.urlfetch import UrlFetch
+from regression_test import (
+        READABLE_SUFFIX,
+        TEST_DATA_PATH,
+        ReadabilityTestData,
+        iter_readability_tests,
+        make_readability_test
+        )
+import argparse
+import json
+import logging
+import mmap
+import os
+import os.path
+
+INDEX_SUFFIX = '.index'
+BLOB_SUFFIX = '.blob'
+
+def test_spec(test):
+    return {
+            'enabled': test.enabled,
+            'url': test.url,
+            'test_description': test.desc,
+            'notes': test.notes,
+            'url_map': test.url_map
+            }
+
+def test_files(test):
+    '''
+    Returns the paths, relative to the test's directory, of the files to
+    pack for test.
+    '''
+    if not test.enabled:
+        return []
+    paths = set(test.url_map.values())
+    paths.add(test.url_map[test.url] + READABLE_SUFFIX)
+    return sorted(paths)
+
+def pack_corpus(corpus_path, cases = None, data_path = TEST_DATA_PATH):
+    with open(corpus_path + BLOB_SUFFIX, 'wb') as blob:
+        with open(corpus_path + INDEX_SUFFIX, 'w') as index:
+            names = os.listdir(data_path)
+            for test in iter_readability_tests(data_path, names, cases):
+                files = {}
+                for rel_path in test_files(test):
+                    path = os.path.join(data_path, test.name, rel_path)
+                    if not os.path.isfile(path):
+                        logging.debug('not packing missing file: %s' % path)
+                        continue
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                    files[rel_path] = (blob.tell(), len(data))
+                    blob.write(data)
+                entry = {
+                        'name': test.name,
+                        'spec': test_spec(test),
+                        'files': files
+                        }
+                index.write(json.dumps(entry) + '\n')
+                logging.info('packed %s' % test.name)
+
+def to_str(value):
+    '''
+    Converts the unicode strings that JSON loads back into the byte strings
+    that YAML gives for ASCII text.
+    '''
+    if isinstance(value, unicode):
+        try:
+            return value.encode('ascii')
+        except UnicodeEncodeError:
+            return value
+    if isinstance(value, dict):
+        return dict((to_str(k), to_str(v)) for k, v in value.items())
+    return value
+
+class CorpusUrlFetch(UrlFetch):
+
+    def __init__(self, case):
+        self._case = case
+
+    def urlread(self, url):
+        return self._case.read(self._case.test.url_map[url])
+
+class CorpusCase:
+
+    def __init__(self, corpus, entry):
+        self.corpus = corpus
+        self.test = make_readability_test(
+                None,
+                to_str(entry['name']),
+                to_str(entry['spec'])
+                )
+        self.files = to_str(entry['files'])
+
+    def read(self, rel_path):
+        if rel_path not in self.files:
+            raise IOError('not in corpus: %s/%s' % (self.test.name, rel_path))
+        offset, length = self.files[rel_path]
+        return self.corpus.blob[offset:offset + length]
+
+    def test_data(self):
+        test = self.test
+        if not test.enabled:
+            return None
+        rel_path = test.url_map[test.url]
+        return ReadabilityTestData(
+                test,
+                self.read(rel_path),
+                self.read(rel_path + READABLE_SUFFIX)
+                )
+
+    def fetcher(self):
+        return CorpusUrlFetch(self)
+
+class Corpus:
+
+    def __init__(self, corpus_path):
+        self.index_path = corpus_path + INDEX_SUFFIX
+        with open(corpus_path + BLOB_SUFFIX, 'rb') as f:
+            if os.fstat(f.fileno()).st_size:
+                self.blob = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+            else:
+                # Empty files can't be mapped.
+                self.blob = ''
+
+    def cases(self, names = None):
+        '''
+        Yields the corpus's cases one at a time, or just those in names.
+        '''
+        with open(self.index_path, 'r') as f:
+            for line in f:
+                case = CorpusCase(self, json.loads(line))
+                if names is None or case.test.name in names:
+                    yield case
+
+DESCRIPTION = 'Pack the regression test data into a corpus.'
+
+def main():
+    parser = argparse.ArgumentParser(description = DESCRIPTION)
+    parser.add_argument(
+            'corpus',
+            help = 'the corpus to write, without the file suffixes'
+            )
+    parser.add_argument(
+            '--case',
+            action = 'append',
+            help = 'a test case to pack'
+            )
+    args = parser.parse_args()
+    logging.basicConfig(level = logging.INFO)
+    pack_corpus(args.corpus, args.case)
+
+if __name__ == '__main__':
+    main()
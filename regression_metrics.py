@@ -0,0 +1,123 @@
+"""
+This module compares a readability result with its benchmark by text.
+
+Both are split into blocks, the text of each paragraph, heading, list item
+and so on, and the two sequences of blocks are aligned by their hashes.
+Blocks that differ are then compared word by word, so that changing one
+word of a paragraph doesn't count as deleting and inserting all of it.
+Lengths are counted in the characters of words, leaving out whitespace.
+
+This is much faster than lxml.html.diff.htmldiff, which the regression test
+now only runs to write the HTML diff of its report.
+"""
+from lxml import etree
+import difflib
+import lxml.html
+
+# The elements that start a new block of text.
+BLOCK_TAGS = frozenset([
+        'address', 'article', 'aside', 'blockquote', 'body', 'caption',
+        'dd', 'div', 'dl', 'dt', 'figcaption', 'figure', 'footer', 'form',
+        'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'li', 'ol', 'p',
+        'pre', 'section', 'table', 'td', 'th', 'tr', 'ul', 'br'
+        ])
+
+def text_blocks(html):
+    '''
+    Returns the words of each block of text in html, in document order.
+    '''
+    if not html or not html.strip():
+        return []
+    doc = lxml.html.document_fromstring(html)
+    blocks = []
+    current = []
+    def flush():
+        words = ' '.join(current).split()
+        if words:
+            blocks.append(words)
+        del current[:]
+    for event, elem in etree.iterwalk(doc, events = ('start', 'end')):
+        is_block = elem.tag in BLOCK_TAGS
+        if event == 'start':
+            if is_block:
+                flush()
+            if elem.text and isinstance(elem.tag, basestring):
+                current.append(elem.text)
+        else:
+            if is_block:
+                flush()
+            if elem.tail:
+                current.append(elem.tail)
+    flush()
+    return blocks
+
+def words_length(words):
+    return sum(len(w) for w in words)
+
+def matched_length(a, b):
+    '''
+    Returns the length of the words that a and b have in common.
+    '''
+    matcher = difflib.SequenceMatcher(None, a, b, autojunk = False)
+    return sum(
+            words_length(a[i:i + size])
+            for i, j, size in matcher.get_matching_blocks()
+            )
+
+class TextDiff(object):
+    '''
+    The differences between the text of a benchmark and a result:
+    characters and blocks deleted from the benchmark and inserted in the
+    result, and the precision and recall of the result's text.
+    '''
+
+    def __init__(self, benchmark_html, result_html):
+        a = text_blocks(benchmark_html)
+        b = text_blocks(result_html)
+        self.benchmark_length = sum(words_length(w) for w in a)
+        self.result_length = sum(words_length(w) for w in b)
+        self.deletion_blocks = 0
+        self.insertion_blocks = 0
+        matched = 0
+        matcher = difflib.SequenceMatcher(
+                None,
+                [hash(tuple(words)) for words in a],
+                [hash(tuple(words)) for words in b],
+                autojunk = False
+                )
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == 'equal':
+                matched += sum(words_length(w) for w in a[i1:i2])
+                continue
+            self.deletion_blocks += i2 - i1
+            self.insertion_blocks += j2 - j1
+            if tag == 'replace':
+                matched += matched_length(
+                        [word for words in a[i1:i2] for word in words],
+                        [word for words in b[j1:j2] for word in words]
+                        )
+        self.matched_length = matched
+        self.deletions = self.benchmark_length - matched
+        self.insertions = self.result_length - matched
+
+    @property
+    def precision(self):
+        if not self.result_length:
+            return 1.0
+        return float(self.matched_length) / self.result_length
+
+    @property
+    def recall(self):
+        if not self.benchmark_length:
+            return 1.0
+        return float(self.matched_length) / self.benchmark_length
+
+    @property
+    def score(self):
+        '''
+        The F1 score: the harmonic mean of the precision and recall.
+        '''
+        total = self.precision + self.recall
+        if not total:
+            return 0.0
+        return 2 * self.precision * self.recall / total
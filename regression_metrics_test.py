@@ -0,0 +1,95 @@
+from regression_metrics import *
+import logging
+import sys
+import unittest
+
+ARTICLE = ('<div><h1>The title</h1>'
+        '<p>The first paragraph has some words in it.</p>'
+        '<p>The second paragraph has a few more.</p></div>')
+
+class TestTextBlocks(unittest.TestCase):
+
+    def test_blocks(self):
+        self.assertEqual(
+                [
+                    ['The', 'title'],
+                    ['The', 'first', 'paragraph', 'has', 'some', 'words',
+                        'in', 'it.'],
+                    ['The', 'second', 'paragraph', 'has', 'a', 'few', 'more.']
+                    ],
+                text_blocks(ARTICLE)
+                )
+
+    def test_inline_and_breaks(self):
+        self.assertEqual(
+                [['one', 'two', 'three'], ['four']],
+                text_blocks('<p>one <b>two</b> three<br>four</p>')
+                )
+
+    def test_empty(self):
+        self.assertEqual([], text_blocks(None))
+        self.assertEqual([], text_blocks(''))
+        self.assertEqual([], text_blocks('  \n'))
+
+class TestTextDiff(unittest.TestCase):
+
+    def _check(self, diff, insertions, insertion_blocks, deletions,
+            deletion_blocks):
+        self.assertEqual(
+                (insertions, insertion_blocks, deletions, deletion_blocks),
+                (diff.insertions, diff.insertion_blocks, diff.deletions,
+                    diff.deletion_blocks)
+                )
+
+    def test_identical(self):
+        diff = TextDiff(ARTICLE, ARTICLE)
+        self._check(diff, 0, 0, 0, 0)
+        self.assertEqual(diff.benchmark_length, diff.matched_length)
+        self.assertEqual(1.0, diff.precision)
+        self.assertEqual(1.0, diff.recall)
+        self.assertEqual(1.0, diff.score)
+
+    def test_changed_word(self):
+        result = ARTICLE.replace('some words', 'some letters')
+        diff = TextDiff(ARTICLE, result)
+        # Only the word differs, although the whole block is replaced.
+        self._check(diff, len('letters'), 1, len('words'), 1)
+        self.assertTrue(0.9 < diff.precision < 1.0)
+        self.assertTrue(0.9 < diff.recall < 1.0)
+
+    def test_added_block(self):
+        result = ARTICLE.replace('</div>', '<p>Another one.</p></div>')
+        diff = TextDiff(ARTICLE, result)
+        self._check(diff, len('Anotherone.'), 1, 0, 0)
+        self.assertEqual(1.0, diff.recall)
+        self.assertTrue(diff.precision < 1.0)
+
+    def test_removed_block(self):
+        result = ARTICLE.replace('<h1>The title</h1>', '')
+        diff = TextDiff(ARTICLE, result)
+        self._check(diff, 0, 0, len('Thetitle'), 1)
+        self.assertEqual(1.0, diff.precision)
+        self.assertTrue(diff.recall < 1.0)
+
+    def test_empty_results(self):
+        diff = TextDiff(ARTICLE, '')
+        self._check(diff, 0, 0, diff.benchmark_length, 3)
+        self.assertEqual(0.0, diff.recall)
+        self.assertEqual(0.0, diff.score)
+        diff = TextDiff('', ARTICLE)
+        self.assertEqual(0.0, diff.precision)
+        self.assertEqual(1.0, diff.recall)
+        diff = TextDiff(None, None)
+        self._check(diff, 0, 0, 0, 0)
+        self.assertEqual(1.0, diff.score)
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--debug':
+        del sys.argv[1]
+        logging.basicConfig(level = logging.DEBUG)
+    else:
+        logging.basicConfig(level = logging.INFO)
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -31,6 +31,28 @@ This invocation will only run the arstechnica-000 and slate-000 test cases.
 This is handy for speeding up your testing cycle if you are working on specific
 improvements.
 
+Each result is compared with its benchmark by text (see regression_metrics.py):
+the characters and blocks of text inserted and deleted, and the precision and
+recall of the result.  To just print these, without writing the HTML report or
+computing its much slower HTML diffs:
+
+    $ python regression_test.py --no-report
+
+Test cases are loaded and run one at a time.  To run a large set of cases
+with bounded memory, pack them into a memory-mapped corpus with
+regression_corpus.py, and use the '--corpus' option:
+
+    $ python regression_test.py --corpus corpus
+
+Use the '--data' option to run the test cases in another directory, such as
+slow pages captured in production (see readability/capture.py):
+
+    $ python regression_test.py --data captures --no-report
+
+A test case whose spec has an 'expected_error', such as a page whose
+extraction failed when it was captured, must raise that error.  Any test that
+doesn't is listed at the end.
+
 
 Generating a new test case
 --------------------------
@@ -92,6 +114,8 @@ Here is an example workflow for working on the readability algorithm:
     5.  Regenerate the benchmarks as necessary with your improved algorithm.
 """
 from lxml.html import builder as B
+from readability.capture import describe_error
+from regression_metrics import TextDiff
 from regression_test_css import SUMMARY_CSS, READABILITY_CSS
 import argparse
 import logging
@@ -127,7 +151,8 @@ class ReadabilityTest:
             url,
             desc,
             notes,
-            url_map
+            url_map,
+            expected_error = None
             ):
         self.dir_path = dir_path
         self.enabled = enabled
@@ -136,6 +161,8 @@ class ReadabilityTest:
         self.desc = desc
         self.notes = notes
         self.url_map = url_map
+        # The description of the error that extraction raises, if it fails.
+        self.expected_error = expected_error
 
 class ReadabilityTestData:
 
@@ -146,10 +173,11 @@ class ReadabilityTestData:
 
 class ReadabilityTestResult:
 
-    def __init__(self, test_data, result_html, diff_html):
+    def __init__(self, test_data, result_html, diff_html, error = None):
         self.test_data = test_data
         self.result_html = result_html
         self.diff_html = diff_html
+        self.error = error
 
 def read_yaml(path):
     with open(path, 'r') as f:
@@ -166,13 +194,14 @@ def make_readability_test(dir_path, name, spec_dict):
             spec_dict['url'],
             spec_dict['test_description'],
             notes,
-            url_map
+            url_map,
+            spec_dict.get('expected_error')
             )
 
 def load_test_data(test):
     def read_data(suffix):
         rel_path = test.url_map[test.url] + suffix
-        path = os.path.join(TEST_DATA_PATH, test.name, rel_path)
+        path = os.path.join(test.dir_path, test.name, rel_path)
         return open(path, 'r').read()
 
     if test.enabled:
@@ -182,69 +211,78 @@ def load_test_data(test):
     else:
         return None
 
-def load_readability_tests(dir_path, files, cases):
-    yaml_files = [f for f in files if f.endswith(YAML_EXTENSION)]
-    yaml_paths = [os.path.join(dir_path, f) for f in yaml_files]
-    names = [re.sub('.yaml$', '', f) for f in yaml_files]
-    spec_dicts = [read_yaml(p) for p in yaml_paths]
-    return [
-            make_readability_test(dir_path, name, spec_dict)
-            for (name, spec_dict) in zip(names, spec_dicts)
-            if cases is None or name in cases
-            ]
+def iter_readability_tests(dir_path, files, cases):
+    '''
+    Yields the tests whose specs are among files, reading each spec only
+    when its test is reached.
+    '''
+    for f in files:
+        if not f.endswith(YAML_EXTENSION):
+            continue
+        name = re.sub('.yaml$', '', f)
+        if cases is None or name in cases:
+            spec_dict = read_yaml(os.path.join(dir_path, f))
+            yield make_readability_test(dir_path, name, spec_dict)
 
-def execute_test(test_data):
+def load_readability_tests(dir_path, files, cases):
+    return list(iter_readability_tests(dir_path, files, cases))
+
+def execute_test(test_data, fetcher = None, diff = True):
+    '''
+    Runs readability on a test's page.  The HTML diff against the benchmark
+    is only computed if diff is True, since it is slow and only needed for
+    the report.  If the test expects an error, the error raised is returned
+    in the result instead.
+    '''
     if test_data is None:
         return None
     else:
-        base_path = os.path.join(TEST_DATA_PATH, test_data.test.name)
-        fetcher = urlfetch.MockUrlFetch(base_path, test_data.test.url_map)
+        if fetcher is None:
+            test = test_data.test
+            base_path = os.path.join(test.dir_path, test.name)
+            fetcher = urlfetch.MockUrlFetch(base_path, test.url_map)
         doc = readability.Document(
                 test_data.orig_html,
                 url = test_data.test.url,
                 urlfetch = fetcher
                 )
-        summary = doc.summary()
-        diff = lxml.html.diff.htmldiff(test_data.rdbl_html, summary.html)
-        return ReadabilityTestResult(test_data, summary.html, diff)
-
-def element_string_lengths(elems):
-    return [len(e.xpath('string()')) for e in elems]
-
-class ResultSummary():
-
-    def __init__(self, result):
-        # logging.debug('diff: %s' % result.diff_html)
-        doc = lxml.html.document_fromstring(
-                '<html><body>' + result.diff_html + '</body></html>')
-
-        insertions = doc.xpath('//ins')
-        insertion_lengths = element_string_lengths(insertions)
-        self.insertions = sum(insertion_lengths)
-        self.insertion_blocks = len(insertions)
-
-        deletions = doc.xpath('//del')
-        deletion_lengths = element_string_lengths(deletions)
-        self.deletions = sum(deletion_lengths)
-        self.deletion_blocks = len(deletions)
+        try:
+            summary = doc.summary()
+        except Exception as e:
+            if test_data.test.expected_error is None:
+                raise
+            return ReadabilityTestResult(
+                    test_data,
+                    None,
+                    None,
+                    describe_error(e)
+                    )
+        if diff:
+            # Either may be empty if no article was found.
+            diff_html = lxml.html.diff.htmldiff(
+                    test_data.rdbl_html or '',
+                    summary.html or ''
+                    )
+        else:
+            diff_html = None
+        return ReadabilityTestResult(test_data, summary.html, diff_html)
 
-        # doc = lxml.html.fragment_fromstring('<div></div>')
-        # self.insertions = 0
-        # self.insertion_blocks = 0
-        # self.deletions = 0
-        # self.deletion_blocks = 0
+def result_metrics(result):
+    return TextDiff(result.test_data.rdbl_html, result.result_html)
 
-def make_summary_row(test, result):
+def make_summary_row(test, metrics):
     def output(suffix):
         rel_path = test.url_map[test.url]
         return urllib.quote(os.path.join(test.name, rel_path) + suffix)
 
     if test.enabled:
-        s = ResultSummary(result)
+        s = metrics
         return B.TR(
                 B.TD(test.name),
                 B.TD('%d (%d)' % (s.insertions, s.insertion_blocks)),
                 B.TD('%d (%d)' % (s.deletions, s.deletion_blocks)),
+                B.TD('%.3f' % s.precision),
+                B.TD('%.3f' % s.recall),
                 B.TD(
                     B.A('original', href = output('')),
                     ' ',
@@ -263,21 +301,24 @@ def make_summary_row(test, result):
                 B.TD('N/A'),
                 B.TD('N/A'),
                 B.TD('N/A'),
+                B.TD('N/A'),
+                B.TD('N/A'),
                 B.TD(test.notes)
                 )
 
-def make_summary_doc(tests_w_results):
+def make_summary_doc(rows):
     tbody = B.TBODY(
             B.TR(
                 B.TH('Test Name'),
                 B.TH('Inserted (in # of blocks)'),
                 B.TH('Deleted (in # of blocks)'),
+                B.TH('Precision'),
+                B.TH('Recall'),
                 B.TH('Links'),
                 B.TH('Notes')
                 )
             )
-    for (test, result) in tests_w_results:
-        row = make_summary_row(test, result)
+    for row in rows:
         tbody.append(row)
     return B.HTML(
             B.HEAD(
@@ -291,8 +332,8 @@ def make_summary_doc(tests_w_results):
                 )
             )
 
-def write_summary(path, tests_w_results):
-    doc = make_summary_doc(tests_w_results)
+def write_summary(path, rows):
+    doc = make_summary_doc(rows)
     with open(path, 'w') as f:
         f.write(lxml.html.tostring(doc))
 
@@ -339,15 +380,17 @@ def write_output_html(url_map, url, html, path, should_add_css):
         f.write(html)
 
 def write_result(output_dir_path, result):
-    test_name = result.test_data.test.name
+    test = result.test_data.test
+    test_name = test.name
 
     # Copy the base_path to output_base_path so that the result has access to
     # any images it needs to display properly.  This will also copy the
     # original page and benchmark readability result.
-    base_path = os.path.join(TEST_DATA_PATH, test_name)
+    base_path = os.path.join(test.dir_path or TEST_DATA_PATH, test_name)
     output_base_path = os.path.join(TEST_OUTPUT_PATH, test_name)
     shutil.rmtree(output_base_path, ignore_errors = True)
-    shutil.copytree(base_path, output_base_path)
+    if os.path.isdir(base_path):
+        shutil.copytree(base_path, output_base_path)
 
     # Write pretty versions of the benchmark, result, and diffs into the
     # output.  Note that this will overwrite the original and benchmark that we
@@ -359,10 +402,15 @@ def write_result(output_dir_path, result):
             (result.diff_html, DIFF_SUFFIX, True)
             ]
     for (html, suffix, add_css) in specs:
+        if not html or html.isspace():
+            # Nothing was extracted, or the test expects an error.
+            continue
         url = result.test_data.test.url
         url_map = result.test_data.test.url_map
         url_path = url_map[url]
         path = os.path.join(output_dir_path, test_name, url_path) + suffix
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
         write_output_html(url_map, url, html, path, add_css)
 
 def print_test_info(test):
@@ -373,16 +421,91 @@ def print_test_info(test):
         skipped = ' (SKIPPED)'
     print('%20s: %s%s' % (name_string, test.desc, skipped))
 
-def run_readability_tests(cases):
-    files = os.listdir(TEST_DATA_PATH)
-    tests = load_readability_tests(TEST_DATA_PATH, files, cases)
-    test_datas = [load_test_data(t) for t in tests]
-    results = [execute_test(t) for t in test_datas]
-    for (test, result) in zip(tests, results):
+def iter_test_cases(cases, data_path = TEST_DATA_PATH):
+    '''
+    Yields a (test, test data, fetcher) triple for each test in data_path,
+    loading each test's data only when it is reached.
+    '''
+    files = os.listdir(data_path)
+    for test in iter_readability_tests(data_path, files, cases):
+        yield test, load_test_data(test), None
+
+def iter_corpus_cases(corpus_path, cases):
+    import regression_corpus
+    corpus = regression_corpus.Corpus(corpus_path)
+    for case in corpus.cases(cases):
+        yield case.test, case.test_data(), case.fetcher()
+
+def print_metrics(metrics):
+    print('%20s  inserted %d (%d), deleted %d (%d), precision %.3f, '
+            'recall %.3f, F1 %.3f' % (
+                '',
+                metrics.insertions,
+                metrics.insertion_blocks,
+                metrics.deletions,
+                metrics.deletion_blocks,
+                metrics.precision,
+                metrics.recall,
+                metrics.score
+                ))
+
+def print_averages(scores):
+    '''
+    Prints the mean precision, recall and F1 score of the tests.
+    '''
+    if not scores:
+        return
+    means = [sum(values) / len(scores) for values in zip(*scores)]
+    print('%d tests: mean precision %.3f, recall %.3f, F1 %.3f' % tuple(
+        [len(scores)] + means))
+
+def print_unexpected(tests):
+    '''
+    Prints the tests whose extraction didn't raise their expected error, as
+    (test, result) pairs.
+    '''
+    for test, result in tests:
+        print('%s: expected %s, got %s' % (
+            test.name,
+            test.expected_error or 'no error',
+            result.error or 'no error'
+            ))
+
+def run_readability_tests(cases, corpus_path = None, report = True,
+        data_path = TEST_DATA_PATH):
+    '''
+    Runs the tests, and writes the HTML report if report is True or prints
+    each test's metrics otherwise.  Either way, the mean metrics, and the
+    tests that didn't raise their expected errors, are printed at the end.
+    '''
+    if corpus_path is None:
+        test_cases = iter_test_cases(cases, data_path)
+    else:
+        test_cases = iter_corpus_cases(corpus_path, cases)
+    # Only the summary rows are kept, so that memory use doesn't grow with
+    # the number of tests.
+    rows = []
+    scores = []
+    unexpected = []
+    for (test, test_data, fetcher) in test_cases:
+        result = execute_test(test_data, fetcher, report)
         print_test_info(test)
+        metrics = None
         if result:
-            write_result(TEST_OUTPUT_PATH, result)
-    write_summary(TEST_SUMMARY_PATH, zip(tests, results))
+            if result.error != test.expected_error:
+                unexpected.append((test, result))
+            metrics = result_metrics(result)
+            scores.append((metrics.precision, metrics.recall, metrics.score))
+            if report:
+                write_result(TEST_OUTPUT_PATH, result)
+            else:
+                print_metrics(metrics)
+        if report:
+            rows.append(make_summary_row(test, metrics))
+    if report:
+        write_summary(TEST_SUMMARY_PATH, rows)
+    print_averages(scores)
+    print_unexpected(unexpected)
 
 DESCRIPTION = 'Run the readability regression test suite.'
 
@@ -401,11 +524,27 @@ def main():
             action = 'append',
             help = 'a test case to run'
             )
+    parser.add_argument(
+            '--corpus',
+            help = 'run the tests in a corpus packed by regression_corpus.py'
+            )
+    parser.add_argument(
+            '--data',
+            default = TEST_DATA_PATH,
+            help = 'run the tests in this directory, such as pages captured '
+                'by readability/capture.py (default: %(default)s)'
+            )
+    parser.add_argument(
+            '--no-report',
+            dest = 'report',
+            action = 'store_false',
+            help = 'print the metrics instead of writing the HTML report'
+            )
 
     args = parser.parse_args()
     level = logging.DEBUG if args.debug else logging.INFO
     logging.basicConfig(level = level)
-    run_readability_tests(args.case)
+    run_readability_tests(args.case, args.corpus, args.report, args.data)
 
 if __name__ == '__main__':
     main()
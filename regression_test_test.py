@@ -0,0 +1,63 @@
+from readability import Document
+from regression_test import *
+import logging
+import shutil
+import sys
+import tempfile
+import unittest
+
+PARAGRAPH = ('Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed '
+        'do eiusmod tempor incididunt ut labore et dolore magna aliqua. ')
+
+PAGE = '<html><body><div><p>%s</p><p>%s</p></div></body></html>' % (
+        PARAGRAPH * 3, PARAGRAPH * 2)
+
+URL = 'http://example.com/a/story'
+
+class TestExpectedError(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _capture(self, page):
+        doc = Document(page, url = URL, capture_dir = self.dir,
+                capture_time = 0)
+        try:
+            doc.summary()
+        except Exception:
+            pass
+        return list(iter_test_cases(None, self.dir))
+
+    def test_failed_capture(self):
+        # An empty page can't be parsed.
+        [(test, test_data, fetcher)] = self._capture(' \n')
+        self.assertEqual('ParserError: Document is empty', test.expected_error)
+        result = execute_test(test_data, fetcher, False)
+        self.assertEqual(test.expected_error, result.error)
+        self.assertEqual(None, result.result_html)
+
+    def test_unexpected_error(self):
+        [(test, test_data, fetcher)] = self._capture(' \n')
+        test.expected_error = None
+        self.assertRaises(Exception, execute_test, test_data, fetcher, False)
+
+    def test_no_error(self):
+        [(test, test_data, fetcher)] = self._capture(PAGE)
+        self.assertEqual(None, test.expected_error)
+        result = execute_test(test_data, fetcher, False)
+        self.assertEqual(None, result.error)
+        self.assertEqual(test_data.rdbl_html, result.result_html)
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--debug':
+        del sys.argv[1]
+        logging.basicConfig(level = logging.DEBUG)
+    else:
+        logging.basicConfig(level = logging.INFO)
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
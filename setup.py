@@ -14,6 +14,9 @@ setup(
     install_requires=[
         "chardet"
         ],
+    extras_require={
+        "numpy": ["numpy"],
+        },
     classifiers=[
         "Environment :: Web Environment",
         "Intended Audience :: Developers",